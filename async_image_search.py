@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+import argparse
+import asyncio
+import os
+import sys
+import threading
+
+import aiohttp
+
+import bing_stand_in
+import request_utils
+import result_dedup
+from image_search_session import BING_SEARCH_ENDPOINT, MissingSearchKeyError
+
+
+class ImageResult:
+    """
+    bing image result exposing the same attributes as the py_ms_cognitive results of ImageSearchSession
+    """
+
+    def __init__(self, json):
+        self.json = json
+        self.name = json.get("name")
+        self.image_id = json.get("imageId")
+        self.content_url = json.get("contentUrl")
+        self.thumbnail_url = json.get("thumbnailUrl")
+        self.host_page_url = json.get("hostPageUrl")
+        self.width = json.get("width")
+        self.height = json.get("height")
+
+
+class AsyncImageFetcher:
+    """
+    Fetches images over one reused aiohttp connection pool, at most max_concurrent at a time.
+
+    The downloaded bytes are decoded by request_utils.decode_image on the executor (the loop's default thread
+    pool if None, cv2 releases the GIL while decoding), so the event loop never runs the decoder. Other cpu bound
+    work on the images, like hashing thumbnails, goes through run_in_executor as well.
+    """
+
+    def __init__(self, session=None, max_concurrent=8, executor=None, timeout=30.0):
+        self._session = session
+        self._owns_session = session is None
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._executor = executor
+        self._timeout = timeout
+        self._max_concurrent = max_concurrent
+
+    @property
+    def session(self):
+        # created on first use, inside the running loop
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                headers=request_utils.HEADERS,
+                connector=aiohttp.TCPConnector(limit=self._max_concurrent),
+                timeout=aiohttp.ClientTimeout(total=self._timeout),
+            )
+        return self._session
+
+    async def fetch_bytes(self, url):
+        """
+        :return: response body or None if the request failed
+        """
+        async with self._semaphore:
+            try:
+                async with self.session.get(url) as response:
+                    if response.status != 200:
+                        sys.stderr.write("Image not found")
+                        return None
+                    return await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                sys.stderr.write(f"Error as here: {e}")
+                return None
+
+    async def fetch_image(self, url):
+        """
+        async counterpart of request_utils.getcvImageFromUrl
+        :return: image array or None
+        """
+        data = await self.fetch_bytes(url)
+        if data is None:
+            return None
+        return await self.run_in_executor(request_utils.decode_image, data)
+
+    async def run_in_executor(self, func, *args):
+        """
+        runs func(*args) on the executor of the fetcher
+        :return: return value of func
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def fetch_images(self, urls):
+        """
+        fetches the urls concurrently, None urls give None
+        :return: list of image arrays or None, in the order of the urls
+        """
+        return await asyncio.gather(
+            *[self.fetch_image(url) if url else _none() for url in urls]
+        )
+
+    async def close(self):
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+async def _none():
+    return None
+
+
+class AsyncImageSearchSession:
+    """
+    asyncio counterpart of ImageSearchSession, with the same properties, paging and duplicate filtering. The
+    endpoint is taken from BING_SEARCH_ENDPOINT like the sync session, e.g. to run against bing_stand_in
+    """
+
+    def __init__(self, fetcher=None):
+        self.verbose = False
+        self.dedup = True
+        self.nearDuplicateDistance = 6
+        self._fetcher = fetcher or AsyncImageFetcher()
+        self._owns_fetcher = fetcher is None
+        self._dedupState = result_dedup.DedupState()
+        self._numDuplicatesSkipped = 0
+        self._query = ""
+        self._results = []
+        self._offset = 0
+        self._numResultsRequested = 0
+        self._numResultsReceived = 0
+        self._numResultsAvailable = 0
+        self._nextOffset = 0
+        self._searchError = None
+
+    @property
+    def fetcher(self):
+        return self._fetcher
+
+    @property
+    def query(self):
+        return self._query
+
+    @property
+    def numResultsRequested(self):
+        return self._numResultsRequested
+
+    @property
+    def numResultsReceived(self):
+        return self._numResultsReceived
+
+    @property
+    def numResultsAvailable(self):
+        return self._numResultsAvailable
+
+    @property
+    def numDuplicatesSkipped(self):
+        return self._numDuplicatesSkipped
+
+    @property
+    def results(self):
+        return self._results
+
+    @property
+    def nextOffset(self):
+        return self._nextOffset
+
+    @property
+    def searchError(self):
+        return self._searchError
+
+    async def search_next(self):
+        if self._offset + self._numResultsRequested >= self._numResultsAvailable:
+            return
+
+        offset = self._offset + self._numResultsRequested
+        await self.search(self._query, self._numResultsRequested, offset)
+
+    async def search(self, query, numResultsRequested=50, offset=0):
+        request_utils.load_environment()
+        bing_key = os.environ.get("BING_SEARCH_KEY")
+        if not bing_key:
+            sys.stderr.write("""undefined bing key""")
+            self._searchError = MissingSearchKeyError("BING_SEARCH_KEY is not set")
+            return
+
+        self._query = query
+        self._numResultsRequested = numResultsRequested
+        self._offset = offset
+        params = {
+            "q": query,
+            "count": str(numResultsRequested),
+            "offset": str(offset),
+            "color": "ColorOnly",
+            "imageType": "Photo",
+        }
+        endpoint = os.environ.get("BING_SEARCH_ENDPOINT", BING_SEARCH_ENDPOINT)
+        headers = {"Ocp-Apim-Subscription-Key": bing_key}
+
+        try:
+            async with self._fetcher.session.get(
+                endpoint, params=params, headers=headers
+            ) as response:
+                response.raise_for_status()
+                json = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            sys.stderr.write(f"Error as here: {e}")
+
+            self._searchError = e
+            self._offset = 0
+            self._numResultsReceived = 0
+            return
+        self._searchError = None
+
+        self._results = [ImageResult(value) for value in json.get("value", [])]
+
+        # paging follows the raw result count, the dedup only shrinks what is fetched and classified
+        numResultsRaw = len(self._results)
+        if self._numResultsRequested < numResultsRaw:
+            self._numResultsRequested = numResultsRaw
+
+        self._numDuplicatesSkipped = 0
+        if self.dedup:
+            if offset == 0:
+                self._dedupState = result_dedup.DedupState()
+            self._results = await self._dedup(self._results)
+            self._numDuplicatesSkipped = numResultsRaw - len(self._results)
+        self._numResultsReceived = len(self._results)
+
+        self._numResultsAvailable = int(json["totalEstimatedMatches"])
+        self._nextOffset = int(json.get("nextOffset", offset + numResultsRaw))
+
+        if self.verbose:
+            print(f'Received {numResultsRaw} results of Bing image search for "{query}"')
+            if self.dedup:
+                print(f"Skipped {self._numDuplicatesSkipped} duplicate results")
+
+    async def _dedup(self, results):
+        unique = result_dedup.dedup_exact(results, self._dedupState)
+        max_distance = self.nearDuplicateDistance
+        if max_distance is not None and max_distance >= 0 and unique:
+            thumbnails = await self._fetcher.fetch_images(
+                [result.thumbnail_url for result in unique]
+            )
+            # hashing the thumbnails is cpu bound, it runs on the executor instead of blocking the loop
+            unique = await self._fetcher.run_in_executor(
+                result_dedup.dedup_near, unique, thumbnails, self._dedupState, max_distance
+            )
+        return unique
+
+    async def get_cv_image_and_url(self, index, useThumbnail=False):
+        """
+        async counterpart of ImageSearchSession.get_cv_image_and_url
+        :return: (image array, url)
+        """
+        if index >= self._numResultsReceived:
+            return None, None
+        result = self._results[index]
+        if useThumbnail:
+            url = result.thumbnail_url
+        else:
+            url = result.content_url
+        return await self._fetcher.fetch_image(url), url
+
+    async def close(self):
+        if self._owns_fetcher:
+            await self._fetcher.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+async def _run(query, pages):
+    async with AsyncImageSearchSession() as session:
+        session.verbose = True
+        await session.search(query)
+        for page in range(pages):
+            if session.numResultsReceived == 0:
+                break
+            images = await session.fetcher.fetch_images(
+                [result.content_url for result in session.results]
+            )
+            decoded = sum(image is not None for image in images)
+            print(f"page {page}: {decoded}/{len(images)} images decoded")
+            await session.search_next()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="page an image query with the asyncio search session")
+    parser.add_argument("--query", default="luxury condo sales")
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument(
+        "--stand-in", action="store_true", help="search a local bing_stand_in server instead of bing"
+    )
+    args = parser.parse_args()
+
+    server = None
+    if args.stand_in:
+        server = bing_stand_in.create_server()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["BING_SEARCH_ENDPOINT"] = server.search_url
+        os.environ.setdefault("BING_SEARCH_KEY", "stand-in")
+
+    try:
+        asyncio.run(_run(args.query, args.pages))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
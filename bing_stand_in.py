@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+import argparse
+import copy
+import hashlib
+import json
+import mimetypes
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SEARCH_PATH = "/v7.0/images/search"
+IMAGE_EXTENSIONS = {".bmp", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp"}
+
+
+def load_fixtures(directory):
+    """
+    reads the image files served in place of the search results, they are cycled through
+    :return: list of (content type, bytes)
+    """
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        with open(os.path.join(directory, name), "rb") as file:
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            fixtures.append((content_type, file.read()))
+    return fixtures
+
+
+class BingStandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves bing image search responses shaped like data.json and the images they reference.
+
+    GET /v7.0/images/search?q=...&count=...&offset=... pages through totalEstimatedMatches results whose
+    contentUrl and thumbnailUrl point to /images/<n> and /thumbnails/<n> on this server. The template values
+    are cycled through, the ids, urls and content size of result n are derived from n, so results of later
+    pages are not exact duplicates of the first page.
+    """
+
+    template = None
+    fixtures = None
+    total_matches = 878
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    error_status = 500
+    counters = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        delay = self.latency + random.uniform(0.0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if random.random() < self.error_rate:
+            self._count("errors")
+            self._send(self.error_status, "application/json", b'{"error": "injected"}')
+            return
+
+        if url.path == SEARCH_PATH:
+            self._search(parse_qs(url.query))
+        elif url.path.startswith("/images/") or url.path.startswith("/thumbnails/"):
+            self._image(url.path.rsplit("/", 1)[-1])
+        else:
+            self._send(404, "application/json", b'{"error": "not found"}')
+
+    def _search(self, params):
+        if not self.headers.get("Ocp-Apim-Subscription-Key"):
+            self._send(401, "application/json", b'{"error": "missing subscription key"}')
+            return
+        query = params.get("q", [""])[0]
+        count = int(params.get("count", ["35"])[0])
+        offset = int(params.get("offset", ["0"])[0])
+        self._count("searches")
+
+        base = f"http://{self.headers.get('Host')}"
+        values = []
+        for index in range(offset, min(offset + count, self.total_matches)):
+            cycle, position = divmod(index, len(self.template["value"]))
+            value = copy.deepcopy(self.template["value"][position])
+            image_id = hashlib.sha1(f"{query}:{index}".encode("utf-8")).hexdigest().upper()
+            value["contentUrl"] = f"{base}/images/{index}.jpg"
+            value["thumbnailUrl"] = f"{base}/thumbnails/{index}.jpg"
+            value["hostPageUrl"] = f"{base}/pages/{index}.html"
+            value["webSearchUrl"] = f"{base}/images/search?id={image_id}"
+            value["imageId"] = image_id
+            value.pop("imageInsightsToken", None)
+            if cycle and "contentSize" in value:
+                # same "<bytes> B" format, a different size on every pass through the template
+                size = int(value["contentSize"].split()[0])
+                value["contentSize"] = f"{size + cycle * 1009} B"
+            values.append(value)
+
+        response = copy.deepcopy({k: v for k, v in self.template.items() if k != "value"})
+        response.setdefault("queryContext", {})["originalQuery"] = query
+        response["totalEstimatedMatches"] = self.total_matches
+        response["currentOffset"] = offset
+        response["nextOffset"] = offset + len(values)
+        response["value"] = values
+        self._send(200, "application/json", json.dumps(response).encode("utf-8"))
+
+    def _image(self, name):
+        try:
+            index = int(name.split(".")[0])
+        except ValueError:
+            self._send(404, "application/json", b'{"error": "not found"}')
+            return
+        self._count("images")
+        content_type, data = self.fixtures[index % len(self.fixtures)]
+        self._send(200, content_type, data)
+
+    def _count(self, name):
+        with self.counters["lock"]:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_server(
+    host="127.0.0.1",
+    port=0,
+    template_path="data.json",
+    fixtures_dir=".",
+    total_matches=None,
+    latency=0.0,
+    jitter=0.0,
+    error_rate=0.0,
+    error_status=500,
+):
+    """
+    creates the stand-in server, port 0 picks a free port. Set BING_SEARCH_ENDPOINT to server.search_url to
+    point ImageSearchSession at it
+    """
+    with open(template_path) as file:
+        template = json.load(file)
+    fixtures = load_fixtures(fixtures_dir)
+    if not fixtures:
+        raise ValueError(f"no image fixtures found in {fixtures_dir}")
+
+    handler = type(
+        "BoundBingStandInHandler",
+        (BingStandInHandler,),
+        {
+            "template": template,
+            "fixtures": fixtures,
+            "total_matches": total_matches or int(template["totalEstimatedMatches"]),
+            "latency": latency,
+            "jitter": jitter,
+            "error_rate": error_rate,
+            "error_status": error_status,
+            "counters": {"lock": threading.Lock()},
+        },
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.search_url = f"http://{host}:{server.server_address[1]}{SEARCH_PATH}"
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="local stand-in for the bing image search api")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--template", default="data.json", help="response captured from bing")
+    parser.add_argument("--fixtures", default=".", help="folder with the images served as results")
+    parser.add_argument("--total-matches", type=int)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    args = parser.parse_args()
+
+    server = create_server(
+        args.host,
+        args.port,
+        args.template,
+        args.fixtures,
+        args.total_matches,
+        args.latency_ms / 1000.0,
+        args.jitter_ms / 1000.0,
+        args.error_rate,
+        args.error_status,
+    )
+    print(f"BING_SEARCH_ENDPOINT={server.search_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
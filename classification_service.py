@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import request_utils
+from histogram_classifier import HistogramClassifier
+from latency_stats import LatencyRecorder
+
+
+class _PendingRequest:
+    def __init__(self, image):
+        self.image = image
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # set when the client gave up waiting, the request is then dropped instead of classified
+        self.cancelled = False
+
+
+class MicroBatcher:
+    """
+    Groups concurrent classification requests into batches for HistogramClassifier.classify_batch.
+
+    A batch is closed when it holds max_batch_size images or max_wait seconds after its first image arrived.
+    At most max_queue images wait for a batch, submit raises queue.Full beyond that so callers can push back.
+    Requests cancelled while they wait are dropped when the batch is built, so they take no batch slot.
+    """
+
+    def __init__(self, classifier, max_batch_size=8, max_wait=0.01, max_queue=64):
+        self._classifier = classifier
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._batched_requests = 0
+        self._rejected = 0
+        self._dropped = 0
+        self.latency = LatencyRecorder()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        """
+        queues the image without blocking
+        :return: pending request, wait on its done event for result/error
+        :raises queue.Full: when max_queue images are already waiting
+        """
+        request = _PendingRequest(image)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise
+        return request
+
+    def cancel(self, request):
+        """
+        drops the request if it still waits for a batch, e.g. after its client timed out
+        """
+        request.cancelled = True
+
+    def _keep(self, request):
+        if request.cancelled:
+            with self._lock:
+                self._dropped += 1
+            return False
+        return True
+
+    def _next_batch(self):
+        batch = []
+        while not batch:
+            request = self._queue.get()
+            if self._keep(request):
+                batch.append(request)
+        deadline = time.perf_counter() + self._max_wait
+        while len(batch) < self._max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if self._keep(request):
+                batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self._classifier.classify_batch([r.image for r in batch])
+            except Exception as e:
+                results = None
+                sys.stderr.write(f"Classification failed: {e}\n")
+                for request in batch:
+                    request.error = str(e)
+
+            now = time.perf_counter()
+            for i, request in enumerate(batch):
+                if results is not None:
+                    request.result = results[i]
+                self.latency.record(now - request.enqueued)
+                request.done.set()
+
+            with self._lock:
+                self._batches += 1
+                self._batched_requests += len(batch)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "max_batch_size": self._max_batch_size,
+                "max_wait_ms": 1000.0 * self._max_wait,
+                "batches": self._batches,
+                "requests": self._batched_requests,
+                "rejected": self._rejected,
+                "dropped": self._dropped,
+                "mean_batch_size": self._batched_requests / self._batches
+                if self._batches
+                else 0.0,
+            }
+        stats["latency"] = self.latency.percentiles()
+        return stats
+
+
+class ClassificationRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /classify with the image bytes as body, or a json body {"url": "..."}
+    GET /stats for the queue depth, batch sizes and latency percentiles
+    """
+
+    batcher = None
+    request_timeout = 30.0
+    fetch_timeout = 10.0
+    max_body_size = 32 * 1024 * 1024
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/stats":
+            self._send_json(404, {"error": "not found"})
+            return
+        stats = self.batcher.stats()
+        stats["http_latency"] = self.server.http_latency.percentiles()
+        self._send_json(200, stats)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/classify":
+            self._send_json(404, {"error": "not found"})
+            return
+        start = time.perf_counter()
+
+        length = int(self.headers.get("Content-Length", 0))
+        if length <= 0 or length > self.max_body_size:
+            self._send_json(400, {"error": "missing or too large body"})
+            return
+        body = self.rfile.read(length)
+
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            try:
+                url = json.loads(body)["url"]
+            except (ValueError, KeyError, TypeError):
+                self._send_json(400, {"error": 'expected {"url": "..."}'})
+                return
+            import requests
+
+            try:
+                image = request_utils.getcvImageFromUrl(url, timeout=self.fetch_timeout)
+            except (
+                requests.exceptions.MissingSchema,
+                requests.exceptions.InvalidSchema,
+                requests.exceptions.InvalidURL,
+            ) as e:
+                self._send_json(400, {"error": f"bad url: {e}"})
+                return
+            except requests.RequestException as e:
+                self._send_json(502, {"error": f"could not fetch the image: {e}"})
+                return
+        else:
+            image = request_utils.decode_image(body)
+        if image is None:
+            self._send_json(400, {"error": "could not read the image"})
+            return
+
+        try:
+            request = self.batcher.submit(image)
+        except queue.Full:
+            self._send_json(503, {"error": "overloaded"}, {"Retry-After": "1"})
+            return
+
+        if not request.done.wait(self.request_timeout):
+            self.batcher.cancel(request)
+            self._send_json(504, {"error": "timed out"})
+            return
+        if request.error is not None:
+            self._send_json(500, {"error": request.error})
+            return
+
+        label, scores = request.result
+        self._send_json(200, {"label": label, "scores": scores})
+        self.server.http_latency.record(time.perf_counter() - start)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # requests are counted in /stats, keep stderr for errors
+        pass
+
+
+def create_server(classifier, host="127.0.0.1", port=8765, max_batch_size=8, max_wait=0.01, max_queue=64):
+    """
+    creates the http server, call serve_forever on it to start serving
+    """
+    handler = type(
+        "BoundClassificationRequestHandler",
+        (ClassificationRequestHandler,),
+        {"batcher": MicroBatcher(classifier, max_batch_size, max_wait, max_queue)},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.http_latency = LatencyRecorder()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="local http service classifying images in micro batches")
+    parser.add_argument("model", help="classifier .mat file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--max-queue", type=int, default=64)
+    args = parser.parse_args()
+
+    classifier = HistogramClassifier()
+    classifier.deserialize(args.model)
+    server = create_server(
+        classifier,
+        args.host,
+        args.port,
+        args.max_batch_size,
+        args.max_wait_ms / 1000.0,
+        args.max_queue,
+    )
+    print(f"serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
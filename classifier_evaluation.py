@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+import argparse
+import json
+import random
+import sys
+import time
+
+from histogram_classifier import HistogramClassifier
+from latency_stats import LatencyRecorder
+from reference_compaction import load_validation_images
+
+# configurations compared when no --configs file is given, keys missing from a configuration keep the
+# HistogramClassifier defaults
+DEFAULT_CONFIGS = [
+    {"name": "baseline"},
+    {"name": "64 bins", "bins_per_channel": 64},
+    {"name": "32 bins", "bins_per_channel": 32},
+    {"name": "16 bins", "bins_per_channel": 16},
+    {"name": "subsample 2", "subsample": 2},
+    {"name": "subsample 4", "subsample": 4},
+    {"name": "32 bins subsample 2", "bins_per_channel": 32, "subsample": 2},
+    {"name": "compact 4", "compact": 4},
+    {"name": "float16 weights", "weight_dtype": "float16"},
+    {"name": "threshold 0.05", "min_similarity": 0.05},
+    {"name": "threshold 0.1", "min_similarity": 0.1},
+]
+
+
+def stratified_folds(images, k, seed=0):
+    """
+    splits the labelled images into k folds, dealing the images of every label round robin so each fold holds
+    about the same share of each label
+    :param images: list of (label, image)
+    :return: list of k lists of indices into images
+    """
+    by_label = {}
+    for index, (label, _) in enumerate(images):
+        by_label.setdefault(label, []).append(index)
+
+    rng = random.Random(seed)
+    folds = [[] for _ in range(k)]
+    position = 0
+    for label in sorted(by_label):
+        indices = by_label[label]
+        rng.shuffle(indices)
+        for index in indices:
+            folds[position % k].append(index)
+            position += 1
+    return folds
+
+
+def build_classifier(config, references):
+    """
+    :param config: dict with the optional keys bins_per_channel, subsample, weight_dtype, compact and min_similarity
+    :param references: list of (label, image) to train on
+    :return: HistogramClassifier
+    """
+    classifier = HistogramClassifier(config.get("bins_per_channel", 256))
+    classifier.subsample = config.get("subsample", 1)
+    classifier.weight_dtype = config.get("weight_dtype", classifier.weight_dtype)
+    if "min_similarity" in config:
+        classifier.min_similarity_for_positive_label = config["min_similarity"]
+    for label, image in references:
+        classifier.add_reference(image, label)
+    if config.get("compact"):
+        classifier.compact(config["compact"])
+    return classifier
+
+
+def evaluate(config, images, folds):
+    """
+    k-fold cross-validation of one configuration, each fold is classified by a model trained on the others
+    :return: dict with the accuracy, Unknown rate, mean model bytes, classify latency percentiles and train time
+    """
+    correct = 0
+    unknown = 0
+    total = 0
+    model_bytes = []
+    train_seconds = 0.0
+    latency = LatencyRecorder(max_samples=len(images))
+
+    for fold in folds:
+        held_out = set(fold)
+        references = [item for index, item in enumerate(images) if index not in held_out]
+
+        start = time.perf_counter()
+        classifier = build_classifier(config, references)
+        train_seconds += time.perf_counter() - start
+        model_bytes.append(
+            sum(usage["bytes"] for usage in classifier.memory_usage().values())
+        )
+
+        for index in fold:
+            label, image = images[index]
+            start = time.perf_counter()
+            predicted = classifier.classify(image)
+            latency.record(time.perf_counter() - start)
+            total += 1
+            if predicted == label:
+                correct += 1
+            elif predicted == "Unknown":
+                unknown += 1
+
+    result = {
+        "name": config.get("name", json.dumps(config, sort_keys=True)),
+        "config": config,
+        "images": total,
+        "accuracy": correct / total if total else 0.0,
+        "unknown_rate": unknown / total if total else 0.0,
+        "model_bytes": sum(model_bytes) / len(model_bytes) if model_bytes else 0,
+        "train_seconds": train_seconds,
+    }
+    result.update(latency.percentiles((50, 99)))
+    return result
+
+
+def print_table(results):
+    name_width = max([len("config")] + [len(result["name"]) for result in results])
+    print(
+        f"{'config':<{name_width}}  {'accuracy':>8}  {'unknown':>8}  {'model KiB':>10}  "
+        f"{'p50 ms':>8}  {'p99 ms':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['name']:<{name_width}}  {result['accuracy']:>8.1%}  {result['unknown_rate']:>8.1%}  "
+            f"{result['model_bytes'] / 1024.0:>10.1f}  {result['p50_ms'] or 0.0:>8.2f}  "
+            f"{result['p99_ms'] or 0.0:>8.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="compare the accuracy and speed of classifier configurations by k-fold cross-validation"
+    )
+    parser.add_argument("directory", help="folder of labelled images")
+    parser.add_argument("--label-from", choices=("filename", "folder"), default="folder")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the fold assignment")
+    parser.add_argument(
+        "--configs",
+        help="json file with a list of configurations, see DEFAULT_CONFIGS for the keys",
+    )
+    parser.add_argument("--json", help="write the results to this json file")
+    args = parser.parse_args()
+
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs) as file:
+            configs = json.load(file)
+
+    images = [
+        (label, image)
+        for label, image in load_validation_images(args.directory, args.label_from)
+        if label is not None
+    ]
+    if len(images) < args.folds or args.folds < 2:
+        sys.stderr.write(
+            f"need at least 2 folds and as many images, found {len(images)} images\n"
+        )
+        return 1
+    folds = stratified_folds(images, args.folds, args.seed)
+
+    results = []
+    for config in configs:
+        results.append(evaluate(config, images, folds))
+        sys.stderr.write(f"\rconfigurations: {len(results)}/{len(configs)}")
+    sys.stderr.write("\n")
+
+    print(f"{len(images)} images, {args.folds} folds")
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(
+                {"images": len(images), "folds": args.folds, "results": results},
+                file,
+                indent=2,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
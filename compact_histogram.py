@@ -0,0 +1,220 @@
+import sys
+
+import numpy
+
+WEIGHT_DTYPES = ("uint16", "float16", "float32")
+
+
+def narrowest_uint(max_value):
+    """
+    utility method to get the smallest unsigned integer type which can hold max_value
+    """
+    for dtype in (numpy.uint8, numpy.uint16, numpy.uint32):
+        if max_value <= numpy.iinfo(dtype).max:
+            return dtype
+    return numpy.uint64
+
+
+class CompactHistogram:
+    """
+    Reference histogram stored as the ids of its non empty bins plus quantized weights.
+
+    Weights are kept either as uint16 fixed point (weight = value * scale) or as float16/float32 and are
+    dequantized on the fly while scoring. The intersection with a query histogram only depends on the
+    non empty bins of the reference, so scoring is exact up to the quantization:
+    |intersection - exact intersection| <= error, where error is the summed absolute quantization error of the
+    weights, computed when the histogram is built. Averaged label similarities therefore move by at most the
+    mean error of the label's references, which HistogramClassifier.memory_usage reports per label.
+
+    With 256 bins per channel (16,777,216 bins) the ids need uint32, so a stored bin takes 6 bytes against 12 in
+    the float64 csc matrices of older models: memory_usage reports 2.0 times less (276,860 against 553,624
+    bytes for image.png at display size, 46,130 non empty bins). Ten times less is out of reach in this bin
+    space, the ids of the sparse bins alone carry about 8 bits each. It takes fewer bins per channel, e.g.
+    HistogramClassifier(bins_per_channel=32) stores the same image in 14,064 bytes (39 times less), which
+    changes the classification beyond the quantization error (see classifier_evaluation).
+    """
+
+    __slots__ = ("ids", "weights", "scale", "error", "num_bins", "reference_weight")
+
+    def __init__(self, ids, weights, scale, error, num_bins, reference_weight=1.0):
+        self.ids = ids
+        self.weights = weights
+        self.scale = scale
+        self.error = error
+        self.num_bins = num_bins
+        # weight of this reference in the label average, compacted references stand for several originals
+        self.reference_weight = reference_weight
+
+    @classmethod
+    def from_dense(cls, hist, weight_dtype="uint16"):
+        """
+        builds the compact histogram from a dense normalized histogram
+        :param hist: dense histogram of any shape, it is flattened
+        :param weight_dtype: one of WEIGHT_DTYPES
+        """
+        hist = numpy.asarray(hist).reshape(-1)
+        ids = numpy.flatnonzero(hist)
+        return cls.from_values(ids, hist[ids], hist.size, weight_dtype)
+
+    @classmethod
+    def from_sparse(cls, matrix, weight_dtype="uint16"):
+        """
+        builds the compact histogram from the (num_bins, 1) scipy sparse matrix used by older models
+        """
+        import scipy.sparse
+
+        matrix = scipy.sparse.csc_matrix(matrix)
+        matrix.eliminate_zeros()
+        matrix.sort_indices()
+        num_bins = max(matrix.shape)
+        ids = matrix.indices if matrix.shape[1] == 1 else matrix.tocsr().indices
+        return cls.from_values(ids, matrix.data, num_bins, weight_dtype)
+
+    @classmethod
+    def from_values(cls, ids, values, num_bins, weight_dtype="uint16"):
+        """
+        :param ids: sorted ids of the non empty bins
+        :param values: weights of those bins
+        :param num_bins: total number of bins of the histogram
+        :param weight_dtype: one of WEIGHT_DTYPES
+        """
+        values = numpy.asarray(values, numpy.float64)
+        if weight_dtype == "uint16":
+            scale = float(values.max()) / 65535.0 if len(values) else 1.0
+            weights = numpy.rint(values / scale).astype(numpy.uint16)
+        elif weight_dtype in WEIGHT_DTYPES:
+            scale = 1.0
+            weights = values.astype(weight_dtype)
+        else:
+            raise ValueError(f"unsupported weight dtype: {weight_dtype}")
+
+        error = float(numpy.abs(values - weights.astype(numpy.float64) * scale).sum())
+
+        # bins quantized to zero never contribute to an intersection
+        kept = weights != 0
+        ids = numpy.asarray(ids)[kept].astype(narrowest_uint(max(num_bins - 1, 0)))
+        return cls(ids, weights[kept], scale, error, num_bins)
+
+    def dequantized(self):
+        return self.weights.astype(numpy.float32) * numpy.float32(self.scale)
+
+    def intersection(self, query_hist):
+        """
+        histogram intersection (cv2.HISTCMP_INTERSECT) with a dense query histogram
+        :param query_hist: flat dense histogram with num_bins values
+        """
+        return float(
+            numpy.minimum(self.dequantized(), query_hist[self.ids]).sum(
+                dtype=numpy.float64
+            )
+        )
+
+    def intersection_batch(self, queries):
+        """
+        histogram intersection with several sparse query histograms at once, only the reference bins which are
+        non empty in at least one query are gathered
+        :param queries: QueryBatch
+        :return: float64 array of shape (n,)
+        """
+        if len(queries.ids) == 0 or len(self.ids) == 0:
+            return numpy.zeros(queries.size)
+        positions = numpy.minimum(numpy.searchsorted(queries.ids, self.ids), len(queries.ids) - 1)
+        found = queries.ids[positions] == self.ids
+        gathered = queries.matrix[:, positions[found]]
+        weights = self.dequantized()[found]
+        # column of every stored value of the gathered csc matrix
+        columns = numpy.repeat(numpy.arange(gathered.shape[1]), numpy.diff(gathered.indptr))
+        return numpy.bincount(
+            gathered.indices,
+            weights=numpy.minimum(gathered.data, weights[columns]),
+            minlength=queries.size,
+        )
+
+    def intersection_with(self, other):
+        """
+        histogram intersection with another compact histogram, only their common bins contribute
+        """
+        _, own, others = numpy.intersect1d(
+            self.ids, other.ids, assume_unique=True, return_indices=True
+        )
+        return float(
+            numpy.minimum(
+                self.weights[own].astype(numpy.float32) * numpy.float32(self.scale),
+                other.weights[others].astype(numpy.float32) * numpy.float32(other.scale),
+            ).sum(dtype=numpy.float64)
+        )
+
+    def to_sparse(self):
+        """
+        converts back to the (num_bins, 1) scipy sparse matrix stored in model files
+        """
+        import scipy.sparse
+
+        indptr = numpy.array([0, len(self.ids)], numpy.int64)
+        return scipy.sparse.csc_matrix(
+            (self.dequantized().astype(numpy.float64), self.ids.astype(numpy.int64), indptr),
+            shape=(self.num_bins, 1),
+        )
+
+    @property
+    def nbytes(self):
+        """
+        memory held by this histogram, including the object itself
+        """
+        return sys.getsizeof(self) + self.ids.nbytes + self.weights.nbytes
+
+
+class QueryBatch:
+    """
+    Query histograms kept sparse for CompactHistogram.intersection_batch: the sorted union of their non empty
+    bins and a float32 scipy csc matrix of shape (n, len(ids)), so memory grows with the non empty bins only.
+    """
+
+    def __init__(self, id_lists, value_lists):
+        """
+        :param id_lists: sorted ids of the non empty bins of each query
+        :param value_lists: values of those bins
+        """
+        import scipy.sparse
+
+        self.size = len(id_lists)
+        if self.size == 0:
+            self.ids = numpy.zeros(0, numpy.int64)
+            self.matrix = scipy.sparse.csc_matrix((0, 0), dtype=numpy.float32)
+            return
+        all_ids = numpy.concatenate(id_lists)
+        self.ids = numpy.unique(all_ids)
+        rows = numpy.repeat(numpy.arange(self.size), [len(ids) for ids in id_lists])
+        columns = numpy.searchsorted(self.ids, all_ids)
+        self.matrix = scipy.sparse.csc_matrix(
+            (numpy.concatenate(value_lists).astype(numpy.float32), (rows, columns)),
+            shape=(self.size, len(self.ids)),
+        )
+
+    @classmethod
+    def from_dense(cls, hists):
+        """
+        :param hists: iterable of flat dense histograms, each is only needed while its non empty bins are copied
+        """
+        id_lists = []
+        value_lists = []
+        for hist in hists:
+            hist = numpy.asarray(hist).reshape(-1)
+            ids = numpy.flatnonzero(hist)
+            id_lists.append(ids)
+            value_lists.append(hist[ids])
+        return cls(id_lists, value_lists)
+
+
+def sparse_nbytes(hist):
+    """
+    memory the same histogram takes as the float64 scipy.sparse.csc_matrix used by older models, which stored
+    int32 indices (to_sparse builds int64 ones)
+    """
+    matrix = hist.to_sparse()
+    return (
+        sys.getsizeof(matrix)
+        + matrix.data.nbytes
+        + matrix.indices.astype(numpy.int32).nbytes
+        + matrix.indptr.astype(numpy.int32).nbytes
+    )
@@ -0,0 +1,103 @@
+import concurrent.futures
+import math
+
+import cv2
+import numpy
+
+import request_utils
+
+BACKGROUND = (232, 232, 232)  # same grey as the window background
+LABEL_COLOR = (255, 255, 255)
+LABEL_BACKGROUND = (40, 40, 40)
+
+
+def fetch_images(urls, max_workers=16, timeout=10.0):
+    """
+    fetches the images concurrently, so a page takes about the time of its slowest image
+    :param urls: image urls, None gives None
+    :param timeout: seconds to wait for the connection and for each read of an image
+    :return: list of images in opencv format or None (also for images which failed to load), in the order of
+        the urls
+    """
+    if not urls:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(min(max_workers, len(urls))) as executor:
+        return list(
+            executor.map(lambda url: request_utils.tryGetcvImageFromUrl(url, timeout), urls)
+        )
+
+
+def grid_shape(count, width, label_height=16):
+    """
+    :return: (columns, rows, cell size in pixels) of a grid of square cells count images fit in, width pixels wide
+    """
+    columns = max(1, int(math.ceil(math.sqrt(count))))
+    rows = max(1, int(math.ceil(count / float(columns))))
+    cell = max(label_height + 1, width // columns)
+    return columns, rows, cell
+
+
+def _fit(image, size):
+    # scale the image to fit a size x size square, keeping the aspect ratio
+    h, w = image.shape[:2]
+    scale = size / float(max(h, w))
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+    return cv2.resize(
+        image,
+        (max(1, int(round(w * scale))), max(1, int(round(h * scale)))),
+        interpolation=interpolation,
+    )
+
+
+def build_contact_sheet(images, labels, width, label_height=16, padding=2):
+    """
+    draws the images into one grid image, each cell captioned with its label
+    :param images: images in opencv format, None leaves the cell empty
+    :param labels: caption of each cell
+    :param width: width of the sheet in pixels
+    :return: (sheet image, layout) where layout is (columns, rows, cell size) as used by cell_at
+    """
+    columns, rows, cell = grid_shape(len(images), width, label_height)
+    sheet = numpy.empty((rows * cell, columns * cell, 3), numpy.uint8)
+    sheet[:] = BACKGROUND
+
+    image_size = cell - label_height - 2 * padding
+    for index, (image, label) in enumerate(zip(images, labels)):
+        x0 = (index % columns) * cell
+        y0 = (index // columns) * cell
+        if image is not None and image_size > 0:
+            thumbnail = _fit(image, image_size)
+            h, w = thumbnail.shape[:2]
+            x = x0 + padding + (image_size - w) // 2
+            y = y0 + padding + (image_size - h) // 2
+            sheet[y : y + h, x : x + w] = thumbnail
+
+        # caption strip below the image
+        strip_top = y0 + cell - label_height
+        sheet[strip_top : y0 + cell, x0 : x0 + cell] = LABEL_BACKGROUND
+        cv2.putText(
+            sheet,
+            label,
+            (x0 + 3, y0 + cell - 4),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.35,
+            LABEL_COLOR,
+            1,
+            cv2.LINE_AA,
+        )
+    return sheet, (columns, rows, cell)
+
+
+def cell_at(layout, count, x, y):
+    """
+    :param layout: layout returned by build_contact_sheet
+    :param count: number of images on the sheet
+    :param x, y: position on the sheet in pixels
+    :return: index of the image at the position or None
+    """
+    columns, rows, cell = layout
+    column, row = x // cell, y // cell
+    if x < 0 or y < 0 or column >= columns or row >= rows:
+        return None
+    index = row * columns + column
+    return index if index < count else None
@@ -25,6 +25,7 @@ def resize_image(
             interpolation = up_interpolation
 
         w = int(max_size * w / float(h))
+        h = max_size
 
     f_img = cv2.resize(src, (w, h), interpolation=interpolation)
     return f_img
@@ -1,46 +1,109 @@
 #!/usr/bin/ env python
+import multiprocessing
 import os
+import sys
 
 import cv2
 import numpy
-import scipy.io
-import scipy.sparse
+
+from compact_histogram import CompactHistogram, QueryBatch, sparse_nbytes
+from shared_reference_model import SharedReferenceModel
+
+IMAGE_EXTENSIONS = {".bmp", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp"}
+
+# model files store the weights of compacted references next to the label as "<label>__weights"
+WEIGHTS_SUFFIX = "__weights"
+
+
+def _normalized_hist(image, channels, histsize, ranges, sparse, subsample=1):
+    # Histogram only every subsample-th pixel of each row and column
+    if subsample > 1:
+        image = image[::subsample, ::subsample]
+
+    # Create histogram
+    hist = cv2.calcHist([image], channels, None, histsize, ranges)
+
+    # Normalize histogram
+    hist[:] = hist * (1.0 / numpy.sum(hist))
+
+    # Convert to one Dimension for efficient storage
+    hist = hist.reshape(-1, 1)
+
+    if sparse:
+        import scipy.sparse
+
+        hist = scipy.sparse.csc_matrix(hist)
+
+    return hist
+
+
+def _load_reference_hist(task):
+    """
+    process pool worker, reads one reference image and builds its compact histogram
+    :param task: (path, label, channels, histsize, ranges, subsample, weight_dtype)
+    :return: (path, label, CompactHistogram or None if the image is unreadable)
+    """
+    path, label, channels, histsize, ranges, subsample, weight_dtype = task
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return path, label, None
+    hist = _normalized_hist(image, channels, histsize, ranges, False, subsample)
+    return path, label, CompactHistogram.from_dense(hist, weight_dtype)
+
+
+def label_from_path(path, root, label_from="filename"):
+    """
+    infers the reference label of an image file
+    :param path: image path
+    :param root: directory the references are read from
+    :param label_from: "filename" strips the extension from the file name (as main() does),
+        "folder" uses the name of the top level sub folder below root
+    :return: label or None if it cannot be inferred
+    """
+    if label_from == "folder":
+        parts = os.path.relpath(path, root).split(os.sep)
+        return parts[0] if len(parts) > 1 else None
+    file = os.path.basename(path)
+    return "".join(file.split(".")[:-1]) or None
 
 
 class HistogramClassifier:
-    def __init__(self):
+    def __init__(self, bins_per_channel=256):
         self.verbose = False
         self.min_similarity_for_positive_label = 0.075
         self._channels = range(3)
-        self._histsize = [256] * 3  # each color has 8 bit i.e. 256 values
+        # each color has 8 bit i.e. 256 values, fewer bins merge neighbouring values into one bin
+        self._histsize = [bins_per_channel] * 3
         self._ranges = [0, 255] * 3
-        self._references = {}  # maps the strings as keys to referenced histograms
+        # histogram only every subsample-th pixel of each row and column, 1 uses every pixel
+        self.subsample = 1
+        # storage type of the reference weights, see CompactHistogram for the accuracy of each
+        self.weight_dtype = "uint16"
+        self._references = {}  # maps the strings as keys to lists of CompactHistogram
+        self._shared_model = None  # set while the references are mapped from a SharedReferenceModel
+
+    @property
+    def bins_per_channel(self):
+        return self._histsize[0]
 
     # convert into histogram using opncv and optionally convert into sparse matrix
     def _create_normalized_hist(self, image, sparse):
+        return _normalized_hist(
+            image, self._channels, self._histsize, self._ranges, sparse, self.subsample
+        )
 
-        # Create histogram
-        hist = cv2.calcHist([image], self._channels, None, self._histsize, self._ranges)
-
-        # Normalize histogram
-        hist[:] = hist * (1.0 / numpy.sum(hist))
-
-        # Convert to one Dimension for efficient storage
-        hist = hist.reshape(16777216, 1)
-
-        if sparse:
-            hist = scipy.sparse.csc_matrix(hist)
-
-        return hist
-
-    # method to add the label "description" to the image (in sparse format) in push into list
+    # method to add the label "description" to the image (in compact sparse format) in push into list
     def add_reference(self, image, label):
-        _hist = self._create_normalized_hist(image, True)
+        _hist = self._create_normalized_hist(image, False)
+        self._add_reference_hist(
+            CompactHistogram.from_dense(_hist, self.weight_dtype), label
+        )
 
+    def _add_reference_hist(self, hist, label):
         if label not in self._references:
-            self._references[label] = [_hist]
+            self._references[label] = [hist]
         else:
-            self._references[label] += [_hist]
+            self._references[label] += [hist]
 
     # for the purpose of app ,  the image comes from filesystem, this method reads the image from the file-system
     # and is read in color scale and added into references list with label
@@ -49,12 +112,82 @@ class HistogramClassifier:
         image = cv2.imread(path, cv2.IMREAD_COLOR)
         self.add_reference(image, label)
 
+    def add_references_from_directory(
+        self,
+        directory,
+        label_from="filename",
+        processes=None,
+        output_path=None,
+        show_progress=True,
+    ):
+        """
+        bulk trainer, decodes and histograms every image below the directory in a process pool
+        :param directory: folder with the reference images
+        :param label_from: "filename" or "folder", see label_from_path
+        :param processes: pool size, defaults to the number of cores
+        :param output_path: if given, the model is serialized once after all references are added
+        :param show_progress: print the progress to stderr
+        :return: dict with the number of added references and the lists of skipped and unreadable files
+        """
+        tasks = []
+        skipped = []
+        for root, _, files in os.walk(directory):
+            for file in sorted(files):
+                path = os.path.join(root, file)
+                label = label_from_path(path, directory, label_from)
+                extension = os.path.splitext(file)[1].lower()
+                if extension not in IMAGE_EXTENSIONS or label is None:
+                    skipped.append(path)
+                    continue
+                tasks.append(
+                    (
+                        path,
+                        label,
+                        self._channels,
+                        self._histsize,
+                        self._ranges,
+                        self.subsample,
+                        self.weight_dtype,
+                    )
+                )
+
+        added = 0
+        unreadable = []
+        if tasks:
+            workers = processes or os.cpu_count() or 1
+            chunksize = max(1, min(64, len(tasks) // (4 * workers)))
+            with multiprocessing.Pool(processes) as pool:
+                results = pool.imap_unordered(_load_reference_hist, tasks, chunksize)
+                for done, (path, label, hist) in enumerate(results, 1):
+                    if hist is None:
+                        unreadable.append(path)
+                    else:
+                        self._add_reference_hist(hist, label)
+                        added += 1
+                    if show_progress and (done % 100 == 0 or done == len(tasks)):
+                        sys.stderr.write(f"\rreferences: {done}/{len(tasks)}")
+            if show_progress:
+                sys.stderr.write("\n")
+
+        if self.verbose:
+            print(
+                f"Added {added} references, skipped {len(skipped)} files, "
+                f"{len(unreadable)} unreadable"
+            )
+            for path in unreadable:
+                print(f"Unreadable : {path}")
+
+        if output_path:
+            self.serialize(output_path)
+
+        return {"added": added, "skipped": skipped, "unreadable": unreadable}
+
     def classify(self, query_image, query_image_name=None):
         """
         this method computes the similarity for the query histogram versus the avg. references histogram and compares
         if all the similarity images are below the threshold than it will return 'Unknown'
         """
-        query_hist = self._create_normalized_hist(query_image, False)
+        query_hist = self._create_normalized_hist(query_image, False).reshape(-1)
         b_label = "Unknown"
         b_similarity = self.min_similarity_for_positive_label
         if self.verbose:
@@ -63,23 +196,57 @@ class HistogramClassifier:
                 print(f"Query image name : {query_image_name}")
         for label, hist_list in self._references.items():
             similarity = 0.0
+            total_weight = 0.0
             for hist in hist_list:
-                similarity += cv2.compareHist(
-                    hist.todense(), query_hist, cv2.HISTCMP_INTERSECT
-                )
-            similarity /= len(hist_list)
+                similarity += hist.reference_weight * hist.intersection(query_hist)
+                total_weight += hist.reference_weight
+            similarity /= total_weight
             if self.verbose:
                 print(f"Similarity : {similarity} and label : {label}")
             if similarity > b_similarity:
                 b_label = label
                 b_similarity = similarity
-            print(similarity, label)
         if self.verbose:
             print(
                 "##########                  Classification ended here                ###############"
             )
         return b_label
 
+    def classify_batch(self, query_images):
+        """
+        classifies several images at once, each reference is scored against the whole batch in one vectorized
+        step, which amortizes the per reference cost over the batch. The query histograms are kept sparse (see
+        QueryBatch), only one dense histogram exists at a time
+        :param query_images: list of images in opencv format
+        :return: list of (label, dict of label -> similarity) in the order of the images
+        """
+        if not query_images:
+            return []
+        query_hists = QueryBatch.from_dense(
+            self._create_normalized_hist(image, False) for image in query_images
+        )
+
+        scores = {}
+        for label, hist_list in self._references.items():
+            similarity = numpy.zeros(len(query_images))
+            total_weight = 0.0
+            for hist in hist_list:
+                similarity += hist.reference_weight * hist.intersection_batch(query_hists)
+                total_weight += hist.reference_weight
+            scores[label] = similarity / total_weight
+
+        results = []
+        for i in range(len(query_images)):
+            image_scores = {label: float(similarity[i]) for label, similarity in scores.items()}
+            b_label = "Unknown"
+            b_similarity = self.min_similarity_for_positive_label
+            for label, similarity in image_scores.items():
+                if similarity > b_similarity:
+                    b_label = label
+                    b_similarity = similarity
+            results.append((b_label, image_scores))
+        return results
+
     def classify_from_file(self, image_path, image_label=None):
         """
         this public method is used to get the image from filesystem and classify the file
@@ -98,9 +265,18 @@ class HistogramClassifier:
         :param compressed:
         :return: None
         """
+        import scipy.io
 
-        file = open(path, "wb")
-        scipy.io.savemat(file, self._references, do_compression=compressed)
+        references = {
+            label: [hist.to_sparse() for hist in hist_list]
+            for label, hist_list in self._references.items()
+        }
+        for label, hist_list in self._references.items():
+            weights = [hist.reference_weight for hist in hist_list]
+            if any(weight != 1.0 for weight in weights):
+                references[label + WEIGHTS_SUFFIX] = numpy.array(weights, numpy.float64)
+        with open(path, "wb") as file:
+            scipy.io.savemat(file, references, do_compression=compressed)
 
     def deserialize(self, path):
         """
@@ -108,36 +284,120 @@ class HistogramClassifier:
         :param path: serialized data path
         :return: None
         """
-        file = open(path, "rb")
-        self._references = scipy.io.loadmat(file)
+        import scipy.io
+
+        with open(path, "rb") as file:
+            self._references = scipy.io.loadmat(file)
 
+        weights = {}
         for key in list(self._references.keys()):
             value = self._references[key]
             if not isinstance(value, numpy.ndarray):  # deleting the metadata
                 del self._references[key]
                 continue
-            self._references[key] = value[0]
+            if key.endswith(WEIGHTS_SUFFIX):
+                weights[key[: -len(WEIGHTS_SUFFIX)]] = value.reshape(-1)
+                del self._references[key]
+                continue
+            self._references[key] = [
+                CompactHistogram.from_sparse(hist, self.weight_dtype)
+                for hist in value[0]
+            ]
+
+        for label, label_weights in weights.items():
+            for hist, weight in zip(self._references.get(label, []), label_weights):
+                hist.reference_weight = float(weight)
+        self._match_reference_bins()
+
+    def _match_reference_bins(self):
+        # models built with fewer bins per channel store shorter histograms
+        for hist_list in self._references.values():
+            if hist_list:
+                bins = int(round(hist_list[0].num_bins ** (1.0 / len(self._channels))))
+                self._histsize = [bins] * len(self._channels)
+                return
+
+    def share_references(self, path=None):
+        """
+        packs the references into a read only shared file which worker processes can attach to with
+        attach_shared_references, this classifier then uses the shared copy as well
+        :param path: file to write, defaults to a new file in /dev/shm
+        :return: SharedReferenceModel owning the file, close it (or exit) to release it
+        """
+        model = SharedReferenceModel.create(self._references, path)
+        self._attach(model)
+        return model
+
+    def attach_shared_references(self, path):
+        """
+        classify against references shared by another process, without copying them
+        :param path: SharedReferenceModel.path of the owner
+        :return: None
+        """
+        self._attach(SharedReferenceModel.attach(path))
+
+    def detach_shared_references(self):
+        """
+        drops the shared references and unmaps them, the classifier has no references afterwards
+        :return: None
+        """
+        if self._shared_model is not None:
+            self._references = {}
+            self._shared_model.close()
+            self._shared_model = None
+
+    def _attach(self, model):
+        self.detach_shared_references()
+        self._shared_model = model
+        self._references = model.references
+        self._match_reference_bins()
+
+    def compact(self, max_references_per_label):
+        """
+        replaces the references of each label by at most max_references_per_label weighted medoids, see
+        reference_compaction.compact_references
+        :return: dict of label -> (references before, references after)
+        """
+        import reference_compaction
+
+        summary = {}
+        for label, hist_list in self._references.items():
+            compacted = reference_compaction.compact_references(
+                hist_list, max_references_per_label
+            )
+            summary[label] = (len(hist_list), len(compacted))
+            self._references[label] = compacted
+        return summary
+
+    def memory_usage(self):
+        """
+        reports the memory held by the references of each label
+        :return: dict of label -> dict with the number of references, bytes used, bytes the same references
+            take as float64 sparse matrices, and the max change of the label similarity due to quantization
+        """
+        usage = {}
+        for label, hist_list in self._references.items():
+            usage[label] = {
+                "references": len(hist_list),
+                "bytes": sum(hist.nbytes for hist in hist_list),
+                "sparse_bytes": sum(sparse_nbytes(hist) for hist in hist_list),
+                "max_similarity_error": sum(hist.error for hist in hist_list)
+                / len(hist_list),
+            }
+        return usage
 
 
 def main():
     classifier = HistogramClassifier()
     classifier.verbose = True
     path = r"C:\Users\himan\OneDrive\Desktop\OpenCV-4-for-Secret-Agents-Second-Edition\Chapter002\images"
-    list_files = os.listdir(path)
-    for file in list_files:
-        image_name = "".join(file.split(".")[:-1])
-        classifier.add_reference_from_file(os.path.join(path, file), image_name)
-        classifier.serialize("classifier.mat")
-        classifier.deserialize("classifier.mat")
-
-        print(
-            classifier.classify_from_file(os.path.join(path, "dubai_damac_heights.jpg"))
-        )
-        print(
-            classifier.classify_from_file(
-                os.path.join(path, "communal_apartments_01.jpg")
-            )
-        )
+    classifier.add_references_from_directory(path, output_path="classifier.mat")
+    classifier.deserialize("classifier.mat")
+
+    print(classifier.classify_from_file(os.path.join(path, "dubai_damac_heights.jpg")))
+    print(
+        classifier.classify_from_file(os.path.join(path, "communal_apartments_01.jpg"))
+    )
 
 
 if __name__ == "__main__":
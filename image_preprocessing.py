@@ -0,0 +1,84 @@
+import threading
+
+import cv2
+import numpy
+
+import cvResizeAspectFill
+
+# imdecode flags decoding at 1/n of the size, jpeg decodes these much faster and never holds the full image
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def decode_reduction(width, height, max_size):
+    """
+    largest decode reduction which still leaves the longer side at least max_size pixels
+    :param width: image width from the search result metadata, None if unknown
+    :param height: image height, None if unknown
+    :param max_size: longer side of the working image
+    :return: 1, 2, 4 or 8
+    """
+    if not width or not height or not max_size:
+        return 1
+    longer = max(int(width), int(height))
+    for reduction in (8, 4, 2):
+        if longer // reduction >= max_size:
+            return reduction
+    return 1
+
+
+def working_image(image, max_size):
+    """
+    the one bounded size image of a result, which is classified and then displayed
+    :param image: decoded image in opencv format
+    :param max_size: longer side in pixels
+    :return: image whose longer side is max_size (the image itself if it already is)
+    """
+    if max(image.shape[:2]) == max_size:
+        return image
+    return cvResizeAspectFill.resize_image(image, max_size)
+
+
+class InFlightMemory:
+    """
+    thread safe record of the image bytes held at once while a result is processed
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+        self._total = 0
+        self._peak = 0
+
+    def record(self, *images):
+        """
+        :param images: arrays alive at the same time, views of the same buffer are counted once
+        :return: bytes recorded
+        """
+        buffers = {}
+        for image in images:
+            if image is None:
+                continue
+            base = image.base if isinstance(image.base, numpy.ndarray) else image
+            buffers[id(base)] = base.nbytes
+        nbytes = sum(buffers.values())
+        with self._lock:
+            self._count += 1
+            self._total += nbytes
+            self._peak = max(self._peak, nbytes)
+        return nbytes
+
+    def stats(self):
+        """
+        :return: dict with the number of images, the peak and the mean bytes in flight
+        """
+        with self._lock:
+            return {
+                "images": self._count,
+                "peak_bytes": self._peak,
+                "mean_bytes": self._total / self._count if self._count else 0.0,
+            }
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+
+import result_dedup
+from image_search_session import ImageSearchSession, MissingSearchKeyError
+
+
+class TokenBucket:
+    """
+    thread safe rate limiter: acquire blocks until a token is available, tokens refill at rate per second up to
+    burst
+    """
+
+    def __init__(self, rate, burst=1):
+        self._rate = float(rate)
+        self._burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+def _write_json_atomically(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file, indent=1)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ImageSearchCrawler:
+    """
+    Pages many queries through ImageSearchSession concurrently and streams the result metadata to a JSON lines
+    file, one object per result.
+
+    Every search request of every worker passes one shared TokenBucket, so the total request rate stays below
+    requests_per_second however many workers run. After each page the progress of every query and the size of
+    the output file are checkpointed atomically. A resumed crawl truncates the output back to the checkpointed
+    size (dropping lines of a page whose checkpoint was never written) and continues each query from its next
+    offset, so every result is written exactly once. An output shorter than the checkpointed size (deleted or
+    cut short) is crawled again from the start.
+    """
+
+    def __init__(
+        self,
+        output_path,
+        checkpoint_path=None,
+        max_results_per_query=500,
+        page_size=50,
+        requests_per_second=3.0,
+        burst=3,
+        workers=4,
+        max_retries=3,
+        dedup=False,
+    ):
+        self._output_path = output_path
+        self._checkpoint_path = checkpoint_path or output_path + ".checkpoint.json"
+        self.max_results_per_query = max_results_per_query
+        self.page_size = page_size
+        self.workers = workers
+        self.max_retries = max_retries
+        # near duplicate detection fetches every thumbnail, which is off by default for bulk crawls
+        self.dedup = dedup
+        self._bucket = TokenBucket(requests_per_second, burst)
+        self._lock = threading.Lock()
+        self._progress = {}  # query -> {"offset", "written", "done", "failed"}
+        self._output = None
+        self.requests = 0
+        self.failed_requests = 0
+        self.pages = 0
+
+    @property
+    def progress(self):
+        return self._progress
+
+    def _load_checkpoint(self):
+        if not os.path.isfile(self._checkpoint_path):
+            return 0
+        with open(self._checkpoint_path) as file:
+            checkpoint = json.load(file)
+        self._progress = checkpoint["queries"]
+        return checkpoint["output_bytes"]
+
+    def _checkpoint(self):
+        # called with the lock held, right after a page was flushed
+        _write_json_atomically(
+            self._checkpoint_path,
+            {"output_bytes": self._output.tell(), "queries": self._progress},
+        )
+
+    def crawl(self, queries):
+        """
+        crawls the queries, resuming from the checkpoint if there is one
+        :param queries: list of query strings
+        :return: dict of query -> progress
+        """
+        output_bytes = self._load_checkpoint()
+        output_size = os.path.getsize(self._output_path) if os.path.isfile(self._output_path) else 0
+        if output_size < output_bytes:
+            # the output was deleted or cut short, truncating would pad it with NUL bytes instead
+            sys.stderr.write(
+                f"{self._output_path} has {output_size} of the {output_bytes} checkpointed bytes, "
+                "crawling from the start\n"
+            )
+            self._progress = {}
+            output_bytes = 0
+        for query in queries:
+            self._progress.setdefault(
+                query, {"offset": 0, "written": 0, "done": False, "failed": False}
+            )
+            # failed queries are retried by the next run
+            self._progress[query]["failed"] = False
+
+        mode = "r+b" if os.path.isfile(self._output_path) else "wb"
+        self._output = open(self._output_path, mode)
+        self._output.truncate(output_bytes)
+        self._output.seek(output_bytes)
+
+        pending = queue.Queue()
+        for query in queries:
+            if not self._progress[query]["done"]:
+                pending.put(query)
+
+        threads = [
+            threading.Thread(target=self._run_worker, args=(pending,), daemon=True)
+            for _ in range(min(self.workers, pending.qsize()))
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self._output.close()
+            self._output = None
+        return self._progress
+
+    def _run_worker(self, pending):
+        session = ImageSearchSession()
+        session.dedup = self.dedup
+        while True:
+            try:
+                query = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._crawl_query(session, query)
+            except Exception as e:
+                sys.stderr.write(f"crawling {query!r} failed: {e}\n")
+                with self._lock:
+                    self._progress[query]["failed"] = True
+
+    def _search(self, session, query, count, offset):
+        """
+        :return: True once the page was received
+        """
+        for attempt in range(self.max_retries + 1):
+            self._bucket.acquire()
+            session.search(query, count, offset)
+            with self._lock:
+                self.requests += 1
+                if session.searchError is None:
+                    return True
+                self.failed_requests += 1
+            # every other error (including the KeyError py_ms_cognitive raises for error bodies) is retried
+            if isinstance(session.searchError, MissingSearchKeyError):
+                return False
+            if attempt < self.max_retries:
+                time.sleep(min(30.0, 2.0**attempt))
+        return False
+
+    def _crawl_query(self, session, query):
+        state = self._progress[query]
+        while True:
+            remaining = self.max_results_per_query - state["written"]
+            if remaining <= 0:
+                break
+            offset = state["offset"]
+            if not self._search(session, query, min(self.page_size, remaining), offset):
+                with self._lock:
+                    state["failed"] = True
+                return
+
+            results = session.results[:remaining]
+            lines = []
+            for index, result in enumerate(results):
+                metadata = dict(result_dedup.result_json(result))
+                metadata["query"] = query
+                metadata["offset"] = offset
+                metadata["index"] = index
+                lines.append(json.dumps(metadata) + "\n")
+
+            finished = (
+                session.nextOffset <= offset or session.nextOffset >= session.numResultsAvailable
+            )
+            with self._lock:
+                self._output.write("".join(lines).encode("utf-8"))
+                self._output.flush()
+                state["offset"] = session.nextOffset
+                state["written"] += len(lines)
+                state["done"] = finished
+                self.pages += 1
+                self._checkpoint()
+            if finished:
+                return
+
+        with self._lock:
+            state["done"] = True
+            self._checkpoint()
+
+
+def read_queries(path):
+    with open(path) as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith("#")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="crawl every result page of many bing image queries into a json lines file"
+    )
+    parser.add_argument("queries", help="text file with one query per line")
+    parser.add_argument("output", help="json lines file receiving one object per result")
+    parser.add_argument("--checkpoint", help="progress file, defaults to <output>.checkpoint.json")
+    parser.add_argument("--max-results", type=int, default=500, help="results kept per query")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=3.0, help="search requests per second")
+    parser.add_argument("--burst", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--dedup", action="store_true", help="skip near duplicate results")
+    args = parser.parse_args()
+
+    crawler = ImageSearchCrawler(
+        args.output,
+        args.checkpoint,
+        args.max_results,
+        args.page_size,
+        args.rate,
+        args.burst,
+        args.workers,
+        dedup=args.dedup,
+    )
+    start = time.perf_counter()
+    progress = crawler.crawl(read_queries(args.queries))
+    elapsed = time.perf_counter() - start
+
+    failed = [query for query, state in progress.items() if state["failed"]]
+    print(
+        f"{sum(state['written'] for state in progress.values())} results, {crawler.pages} pages, "
+        f"{crawler.requests} requests ({crawler.failed_requests} failed) in {elapsed:.1f} s"
+    )
+    for query in failed:
+        sys.stderr.write(f"incomplete: {query}\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,64 @@
 #! /usr/bin/env python
 
-from py_ms_cognitive import PyMsCognitiveImageSearch
-
-PyMsCognitiveImageSearch.SEARCH_IMAGE_BASE = (
-    "https://api.bing.microsoft.com/v7.0/images/search"
-)
 import os
 import pprint
 import sys
 
 import cv2
 
+import image_preprocessing
 import request_utils
+import result_dedup
+
+BING_SEARCH_ENDPOINT = "https://api.bing.microsoft.com/v7.0/images/search"
+
+_search_class = None
+
+
+class MissingSearchKeyError(Exception):
+    """
+    searchError when BING_SEARCH_KEY is not set, retrying cannot help
+    """
+
+
+def _image_search_class():
+    """
+    imports py_ms_cognitive on the first search instead of at import, to keep app startup fast
+    :return: PyMsCognitiveImageSearch class pointed at the bing endpoint, BING_SEARCH_ENDPOINT in the
+        environment overrides it (e.g. with the local bing_stand_in server)
+    """
+    global _search_class
+    if _search_class is None:
+        from py_ms_cognitive import PyMsCognitiveImageSearch
+
+        _search_class = PyMsCognitiveImageSearch
+    _search_class.SEARCH_IMAGE_BASE = os.environ.get(
+        "BING_SEARCH_ENDPOINT", BING_SEARCH_ENDPOINT
+    )
+    return _search_class
 
 
 class ImageSearchSession:
     def __init__(self):
         self.verbose = False
+        # collapse duplicate results (same file, or near identical thumbnails) before they are fetched
+        self.dedup = True
+        # max hamming distance of near duplicate thumbnails, None or negative only collapses exact duplicates
+        self.nearDuplicateDistance = 6
+        self._dedupState = result_dedup.DedupState()
+        # offset -> deduplicated page of the current query, pages seen before are not searched again
+        self._dedupPages = {}
+        self._numDuplicatesSkipped = 0
         self._query = ""
         self._results = []
+        # decoded thumbnail of each result of the current page, None where the dedup did not fetch it
+        self._thumbnails = []
         self._offset = 0
         self._numResultsRequested = 0
         self._numResultsReceived = 0
         self._numResultsAvailable = 0
+        self._nextOffset = 0
+        self._searchError = None
 
     # Adding getter methods
 
@@ -42,11 +78,93 @@ class ImageSearchSession:
     def numResultsAvailable(self):
         return self._numResultsAvailable
 
+    @property
+    def numDuplicatesSkipped(self):
+        return self._numDuplicatesSkipped
+
+    @property
+    def dedupState(self):
+        return self._dedupState
+
+    def resetDedup(self):
+        # forgets the results seen so far, later pages are only deduplicated among themselves
+        self._dedupState = result_dedup.DedupState()
+        self._dedupPages = {}
+
+    @property
+    def results(self):
+        return self._results
+
+    @property
+    def thumbnails(self):
+        # aligned with results, a thumbnail fetched later can be stored in place
+        return self._thumbnails
+
+    @property
+    def thumbnailBytes(self):
+        return sum(image.nbytes for image in self._thumbnails if image is not None)
+
+    def dropThumbnails(self):
+        self._thumbnails = [None] * len(self._results)
+
+    def nextResult(self, index):
+        """
+        index of the result following the result at index of the current page, after the last result of the
+        page the next page is searched
+        :param index: index into results
+        :return: index into results, None if there is no following result
+        """
+        if index + 1 < self._numResultsReceived:
+            return index + 1
+        # pages whose results were all duplicates of earlier pages are skipped
+        while self._offset + self._numResultsRequested < self._numResultsAvailable:
+            self.searchNext()
+            if self._searchError is not None:
+                return None
+            if self._numResultsReceived > 0:
+                return 0
+        return None
+
+    def prevResult(self, index):
+        """
+        index of the result before the result at index of the current page, before the first result of the
+        page the previous page is searched
+        :param index: index into results
+        :return: index into results, None if there is no previous result
+        """
+        if index > 0:
+            return index - 1
+        while self._offset > 0:
+            self.searchPrev()
+            if self._searchError is not None:
+                return None
+            if self._numResultsReceived > 0:
+                return self._numResultsReceived - 1
+        return None
+
+    def hasNextResult(self, index):
+        return (
+            index + 1 < self._numResultsReceived
+            or self._offset + self._numResultsRequested < self._numResultsAvailable
+        )
+
+    def hasPrevResult(self, index):
+        return index > 0 or self._offset > 0
+
+    @property
+    def nextOffset(self):
+        return self._nextOffset
+
+    @property
+    def searchError(self):
+        # exception of the last search, None if it succeeded
+        return self._searchError
+
     def searchPrev(self):
         if self._offset == 0:
             return
-        offset = self._offset + self._numResultsRequested
-        self.search(self._query, offset)
+        offset = max(0, self._offset - self._numResultsRequested)
+        self.search(self._query, self._numResultsRequested, offset)
 
     def searchNext(self):
         if self._offset + self._numResultsRequested >= self._numResultsAvailable:
@@ -56,16 +174,38 @@ class ImageSearchSession:
         self.search(self._query, self._numResultsRequested, offset)
 
     def search(self, query, numResultsRequested=50, offset=0):
+        request_utils.load_environment()
         bing_key = os.environ.get("BING_SEARCH_KEY")
         if not bing_key:
             sys.stderr.write("""undefined bing key""")
+            self._searchError = MissingSearchKeyError("BING_SEARCH_KEY is not set")
+            return
+
+        if query != self._query:
+            self._dedupPages = {}
+        page = self._dedupPages.get(offset) if self.dedup and offset > 0 else None
+        if page is not None:
+            # searching a page again (e.g. with searchPrev) would skip all its results as already seen
+            self._query = query
+            self._offset = offset
+            self._searchError = None
+            (
+                self._results,
+                self._numResultsRequested,
+                self._numDuplicatesSkipped,
+                self._numResultsAvailable,
+                self._nextOffset,
+            ) = page
+            self._numResultsReceived = len(self._results)
+            # only the thumbnails of the current page are kept, a grid fetches them again
+            self._thumbnails = [None] * len(self._results)
             return
 
         self._query = query
         self._numResultsRequested = numResultsRequested
         self._offset = offset
         params = {"color": "ColorOnly", "imageType": "Photo"}
-        searchService = PyMsCognitiveImageSearch(bing_key, query, custom_params=params)
+        searchService = _image_search_class()(bing_key, query, custom_params=params)
         searchService.current_offset = offset
 
         try:
@@ -73,28 +213,53 @@ class ImageSearchSession:
         except Exception as e:
             sys.stderr.write(f"Error as here: {e}")
 
+            self._searchError = e
             self._offset = 0
             self._numResultsReceived = 0
             return
+        self._searchError = None
 
         __json = searchService.most_recent_json
 
+        # paging follows the raw result count, the dedup only shrinks what is fetched and classified
+        numResultsRaw = len(self._results)
+        if self._numResultsRequested < numResultsRaw:
+            self._numResultsRequested = numResultsRaw
+
+        self._numDuplicatesSkipped = 0
+        self._thumbnails = [None] * numResultsRaw
+        if self.dedup:
+            if offset == 0:
+                self.resetDedup()
+            self._results, self._numDuplicatesSkipped, self._thumbnails = result_dedup.dedup_results(
+                self._results, self._dedupState, self.nearDuplicateDistance
+            )
         self._numResultsReceived = len(self._results)
-        if self._numResultsRequested < self._numResultsReceived:
-            self._numResultsRequested = self._numResultsReceived
-        self._numResultsAvailable = self._numResultsReceived
 
         self._numResultsAvailable = int(__json["totalEstimatedMatches"])
+        self._nextOffset = int(__json.get("nextOffset", offset + numResultsRaw))
+        if self.dedup:
+            self._dedupPages[offset] = (
+                self._results,
+                self._numResultsRequested,
+                self._numDuplicatesSkipped,
+                self._numResultsAvailable,
+                self._nextOffset,
+            )
 
         if self.verbose:
             print("Received results of Bing image search for " '"%s":' % query)
             pprint.pprint(__json)
+            if self.dedup:
+                print(f"Skipped {self._numDuplicatesSkipped} duplicate results")
 
-    def get_cv_image_and_url(self, index, useThumbnail=False):
+    def get_cv_image_and_url(self, index, useThumbnail=False, reduceToSize=None):
         """
         extract the url from the bing api response and get the read the image as array
         :param index: the current index of the result
         :param useThumbnail:
+        :param reduceToSize: if given, large images are decoded at 1/2, 1/4 or 1/8 of their size as long as the
+        longer side stays at least reduceToSize pixels (using the size in the result metadata)
         :return: image array
         """
         if index >= self._numResultsReceived:
@@ -104,7 +269,13 @@ class ImageSearchSession:
             url = result.thumbnail_url
         else:
             url = result.content_url
-        return request_utils.getcvImageFromUrl(url), url
+        reduction = 1
+        if reduceToSize and not useThumbnail:
+            json = result_dedup.result_json(result)
+            reduction = image_preprocessing.decode_reduction(
+                json.get("width"), json.get("height"), reduceToSize
+            )
+        return request_utils.getcvImageFromUrl(url, reduction), url
 
 
 def main():
@@ -0,0 +1,38 @@
+import collections
+import threading
+
+
+class LatencyRecorder:
+    """
+    thread safe recorder of the most recent latencies, used to report percentiles
+    """
+
+    def __init__(self, max_samples=10000):
+        self._samples = collections.deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self._count = 0
+
+    @property
+    def count(self):
+        return self._count
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+
+    def percentiles(self, percents=(50, 90, 99)):
+        """
+        :param percents: percentiles to report
+        :return: dict like {"p50_ms": ..., "p99_ms": ...}, values are None before the first sample
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        report = {}
+        for percent in percents:
+            if samples:
+                index = min(len(samples) - 1, int(round(percent / 100.0 * (len(samples) - 1))))
+                report[f"p{percent}_ms"] = 1000.0 * samples[index]
+            else:
+                report[f"p{percent}_ms"] = None
+        return report
@@ -1,5 +1,11 @@
 #!/usr/bin/env python
+import time
 
+# taken before the other imports, so the startup timeline includes them
+_PROCESS_START = time.perf_counter()
+
+import argparse
+import concurrent.futures
 import os
 import threading
 
@@ -10,17 +16,125 @@ import sys
 import wx
 import traceback
 
-import cvResizeAspectFill
+import contact_sheet
+import image_preprocessing
+import memory_monitor
 import pyinstaller_utils
 import wx_utils
 from histogram_classifier import HistogramClassifier
 from image_search_session import ImageSearchSession
 
-def show_error():
-    message = ''.join(traceback.format_exception(*sys.exc_info()))
+def show_error(message=None):
+    if message is None:
+        message = ''.join(traceback.format_exception(*sys.exc_info()))
     dialog = wx.MessageDialog(None, message, 'Error!', wx.OK|wx.ICON_ERROR)
     dialog.ShowModal()
 
+
+class StartupTimeline:
+    """
+    records named startup milestones in ms since the process started, to track time to first paint
+    """
+
+    def __init__(self, start=_PROCESS_START):
+        self._start = start
+        self._marks = []
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        with self._lock:
+            self._marks.append((name, 1000.0 * (time.perf_counter() - self._start)))
+
+    def report(self):
+        with self._lock:
+            marks = sorted(self._marks, key=lambda mark: mark[1])
+        return "\n".join(f"{elapsed:9.1f} ms  {name}" for name, elapsed in marks)
+
+
+def load_and_classify(
+    session, classifier, index, max_image_size, classify_full_resolution=False, memory=None
+):
+    """
+    fetches the result at index of the current page and turns it into one working image of the display size,
+    which is classified and then displayed without further copies
+    :param classify_full_resolution: classify the full size image instead of the working image, large images are
+        then decoded at full size as well
+    :param memory: InFlightMemory recording the image bytes held at once
+    :return: (working image or None, label)
+    """
+    if session.numResultsReceived == 0:
+        return None, "No results found"
+
+    image, url = session.get_cv_image_and_url(
+        index,
+        reduceToSize=None if classify_full_resolution else max_image_size,
+    )
+    if image is None:
+        return None, "No image found"
+
+    # resize the image using autofill to display in an appropriate size
+    working = image_preprocessing.working_image(image, max_image_size)
+    if memory is not None:
+        memory.record(image, working)
+
+    # we received the image , now classify
+    label = classifier.classify(image if classify_full_resolution else working, url)
+    return working, label
+
+
+def load_and_classify_page(session, classifier, width, batch_size=8):
+    """
+    classifies the thumbnails of the current page in batches and draws them into one contact sheet. The
+    thumbnails the duplicate filter of the session decoded are reused, the missing ones are fetched
+    concurrently and kept on the session
+    :param batch_size: thumbnails classified per batch, bounds the memory of the query histograms
+    :return: (sheet image or None, layout, label)
+    """
+    results = session.results[: session.numResultsReceived]
+    if not results:
+        return None, None, "No results found"
+
+    thumbnails = session.thumbnails
+    missing = [index for index in range(len(results)) if thumbnails[index] is None]
+    if missing:
+        fetched = contact_sheet.fetch_images([results[index].thumbnail_url for index in missing])
+        for index, image in zip(missing, fetched):
+            thumbnails[index] = image
+    thumbnails = thumbnails[: len(results)]
+    fetched = [image for image in thumbnails if image is not None]
+    classified = []
+    for start in range(0, len(fetched), batch_size):
+        classified.extend(classifier.classify_batch(fetched[start : start + batch_size]))
+    classified = iter(classified)
+    labels = [
+        next(classified)[0] if image is not None else "No image found" for image in thumbnails
+    ]
+
+    sheet, layout = contact_sheet.build_contact_sheet(thumbnails, labels, width)
+    first = session._offset + 1
+    label = f"Results {first} - {first + len(results) - 1} of {session.numResultsAvailable}"
+    return sheet, layout, label
+
+
+def register_caches(monitor, session, classifier):
+    """
+    reports the bytes held by the classifier references, the duplicate filter and the thumbnails of the
+    search session. The duplicate filter can be shed (later pages then only skip duplicates among
+    themselves), and so can the thumbnails (a grid fetches them again)
+    """
+    monitor.register_cache(
+        "classifier_references",
+        lambda: sum(usage["bytes"] for usage in classifier.memory_usage().values()),
+    )
+
+    monitor.register_cache(
+        "search_dedup", lambda: session.dedupState.nbytes, shed=session.resetDedup
+    )
+    monitor.register_cache(
+        "search_thumbnails", lambda: session.thumbnailBytes, shed=session.dropThumbnails
+    )
+
+
 class Luxocator(wx.Frame):
     # Subclassing the wx.Frame class
 
@@ -30,13 +144,20 @@ class Luxocator(wx.Frame):
         max_image_size=768,
         verboseSearchSession=False,
         verboseClassifier=False,
+        timeline=None,
+        monitor=None,
+        classify_full_resolution=False,
     ):
         """
-        this class is subclass of wx.Frame
+        this class is subclass of wx.Frame, the window is built right away while the initial search and the
+        classifier are loaded in the background
         :param classifier_path: path for classfier format
         :param max_image_size:
         :param verboseSearchSession:
         :param verboseClassifier:
+        :param timeline: StartupTimeline to record the startup milestones in
+        :param monitor: MemoryMonitor the caches are registered with, None for no memory instrumentation
+        :param classify_full_resolution: classify the full size images instead of the display size ones
         """
         style = (
             wx.CLOSE_BOX
@@ -45,6 +166,9 @@ class Luxocator(wx.Frame):
             | wx.SYSTEM_MENU
             | wx.CLIP_CHILDREN
         )
+        self._timeline = timeline or StartupTimeline()
+        self._startupReported = False
+        self._painted = False
         wx.Frame.__init__(self, None, title="Luxocator", style=style)
         self.SetBackgroundColour(wx.Colour(232, 232, 232))
         self._maxImageSize = max_image_size
@@ -52,17 +176,31 @@ class Luxocator(wx.Frame):
         default_query_image = "luxury condo sales"
         self._index = 0
 
-        # Begin image search session object
+        # Begin image search session object, the search itself runs in the background
         self._session = ImageSearchSession()
         self._session.verbose = verboseSearchSession
-        self._session.search(default_query_image)
 
-        # image classifier object
+        # image classifier object, deserialized in the background
         self._classifier = HistogramClassifier()
         self._classifier.verbose = verboseClassifier
-        self._classifier.deserialize(classifier_path)
+        self._classifierPath = classifier_path
+        self._loaded = False
+
+        # grid mode shows the whole result page as one contact sheet, a click opens a result at full size
+        self._gridMode = False
+        self._gridLayout = None
+
+        # one worker loads the images, so repeated clicks queue up instead of starting a thread each
+        self._updateExecutor = concurrent.futures.ThreadPoolExecutor(1)
+        self._monitor = monitor
+        self._classifyFullResolution = classify_full_resolution
+        self._inFlightMemory = image_preprocessing.InFlightMemory()
+        if monitor is not None:
+            register_caches(monitor, self._session, self._classifier)
+            monitor.start()
 
         self.Bind(wx.EVT_CLOSE, self._onCloseWindow)
+        self.Bind(wx.EVT_PAINT, self._onPaint)
 
         quit_command = wx.NewId()
         self.Bind(wx.EVT_MENU, self._onQuitCommand, id=quit_command)
@@ -96,8 +234,13 @@ class Luxocator(wx.Frame):
         self._nextButton = wx.Button(self, label="Next")
         self._nextButton.Bind(wx.EVT_BUTTON, self._onNextButtonClicked)
 
+        # set grid toggle
+        self._gridToggle = wx.ToggleButton(self, label="Grid")
+        self._gridToggle.Bind(wx.EVT_TOGGLEBUTTON, self._onGridToggled)
+
         # bitmap
         self._staticBitmap = wx.StaticBitmap(self)
+        self._staticBitmap.Bind(wx.EVT_LEFT_UP, self._onBitmapClicked)
 
 
         # Defining horizontal layout for search control on the left - label in middle - prev + next on right
@@ -111,14 +254,23 @@ class Luxocator(wx.Frame):
         controls_sizer.Add(
             self._prevButton, 0, wx.ALIGN_CENTER_VERTICAL | wx.LEFT | wx.RIGHT, border
         )
-        controls_sizer.Add(self._nextButton, 0, wx.ALIGN_CENTER_VERTICAL)
+        controls_sizer.Add(
+            self._nextButton, 0, wx.ALIGN_CENTER_VERTICAL | wx.RIGHT, border
+        )
+        controls_sizer.Add(self._gridToggle, 0, wx.ALIGN_CENTER_VERTICAL)
 
         # Defining bitmap layout using another wx.BoxSizer instance
         self._rootSizer = wx.BoxSizer(wx.VERTICAL)
         self._rootSizer.Add(self._staticBitmap, 0, wx.Top | wx.LEFT | wx.RIGHT, border)
         self._rootSizer.Add(controls_sizer, 0, wx.EXPAND | wx.ALL, border)
+
+        # show a loading state until the initial search and the classifier are ready
+        self._staticBitmap.SetBitmap(
+            wx.Bitmap(self._maxImageSize, self._maxImageSize // 2)
+        )
         self.SetSizerAndFit(self._rootSizer)
-        self._updateImageAndControls()
+        self._timeline.mark("window created")
+        self._startLoading(default_query_image)
 
         # adding getter and setter property for verbose property of HistogramClassifier and ImageSearchSession class
 
@@ -138,9 +290,64 @@ class Luxocator(wx.Frame):
     def verbose_histogram_classifier(self, value):
         self._classifier.verbose = value
 
+    def _startLoading(self, query):
+        """
+        shows the loading state and loads the classifier and the first search in the background
+        :return:
+        """
+        self._labelStaticText.SetLabel("Loading...")
+        self._rootSizer.Fit(self)
+        self._disableControls()
+        threading.Thread(target=self._loadAsync, args=(query,), daemon=True).start()
+
+    def _loadAsync(self, query):
+        """
+        runs the initial search and the classifier deserialization in parallel, off the GUI thread
+        :return:
+        """
+        try:
+            with concurrent.futures.ThreadPoolExecutor(2) as executor:
+                search = executor.submit(self._session.search, query)
+                model = executor.submit(self._classifier.deserialize, self._classifierPath)
+                search.result()
+                self._timeline.mark("initial search done")
+                model.result()
+                self._timeline.mark("classifier loaded")
+        except Exception:
+            message = "".join(traceback.format_exception(*sys.exc_info()))
+            wx.CallAfter(self._onLoadFailed, message)
+            return
+        wx.CallAfter(self._onLoaded)
+
+    def _onLoaded(self):
+        self._loaded = True
+        self._updateImageAndControls()
+
+    def _onLoadFailed(self, message):
+        self._labelStaticText.SetLabel("Loading failed")
+        self._rootSizer.Fit(self)
+        # a new search retries the loading
+        self._searchCtrl.Enable()
+        show_error(message)
+
+    def _onPaint(self, event):
+        if not self._painted:
+            self._painted = True
+            self._timeline.mark("first paint")
+        event.Skip()
+
     # defining callbacks
     def _onCloseWindow(self, event):
         """cleans up the application"""
+        self._updateExecutor.shutdown(wait=False, cancel_futures=True)
+        if self._monitor is not None:
+            self._monitor.stop()
+        memory = self._inFlightMemory.stats()
+        if memory["images"]:
+            print(
+                f"image memory in flight: peak {memory['peak_bytes'] / 2**20:.1f} MiB, "
+                f"mean {memory['mean_bytes'] / 2**20:.1f} MiB over {memory['images']} images"
+            )
         self.Destroy()
 
     def _onQuitCommand(self, event):
@@ -158,6 +365,9 @@ class Luxocator(wx.Frame):
         query = event.GetString()
         if len(query) < 1:
             return
+        if not self._loaded:
+            self._startLoading(query)
+            return
 
         self._session.search(query)
         self._index = 0
@@ -176,19 +386,60 @@ class Luxocator(wx.Frame):
         callback method based on the next image is available or not
         :return:
         """
-        self._index += 1
-        if self._index < self._session._offset + self._session.numResultsReceived - 1:
+        if self._gridMode:
+            # page through the results
             self._session.searchNext()
+            self._index = 0
+            self._updateImageAndControls()
+            return
+        # _index is the index into the results of the current page, the session moves to the next page
+        index = self._session.nextResult(self._index)
+        if index is None:
+            return
+        self._index = index
         self._updateImageAndControls()
 
-    def _onPrevButtonClicked(self):
+    def _onPrevButtonClicked(self, event):
         """
         callback method
         :return:
         """
-        self._index -= 1
-        if self._index < self._session._offset:
-            self._session.searchNext()
+        if self._gridMode:
+            self._session.searchPrev()
+            self._index = 0
+            self._updateImageAndControls()
+            return
+        index = self._session.prevResult(self._index)
+        if index is None:
+            return
+        self._index = index
+        self._updateImageAndControls()
+
+    def _onGridToggled(self, event):
+        """
+        switches between the single image and the contact sheet of the current page
+        :return:
+        """
+        self._gridMode = self._gridToggle.GetValue()
+        self._updateImageAndControls()
+
+    def _onBitmapClicked(self, event):
+        """
+        in grid mode, opens the clicked result at full size
+        :return:
+        """
+        if not self._gridMode or self._gridLayout is None:
+            return
+        x, y = event.GetPosition()
+        index = contact_sheet.cell_at(
+            self._gridLayout, self._session.numResultsReceived, x, y
+        )
+        if index is None:
+            return
+        self._gridMode = False
+        self._gridToggle.SetValue(False)
+        # the cells are the results of the current page, like _index
+        self._index = index
         self._updateImageAndControls()
 
     def _disableControls(self):
@@ -199,6 +450,7 @@ class Luxocator(wx.Frame):
         self._searchCtrl.Disable()
         self._prevButton.Disable()
         self._nextButton.Disable()
+        self._gridToggle.Disable()
 
     def _enableControls(self):
         """
@@ -207,9 +459,16 @@ class Luxocator(wx.Frame):
         :return:
         """
         self._searchCtrl.Enable()
-        if self._index > 1:
+        self._gridToggle.Enable()
+        if self._gridMode:
+            if self._session._offset > 0:
+                self._prevButton.Enable()
+            if self._session.nextOffset < self._session.numResultsAvailable:
+                self._nextButton.Enable()
+            return
+        if self._session.hasPrevResult(self._index):
             self._prevButton.Enable()
-        if self._session.numResultsReceived - self._index > 1:
+        if self._session.hasNextResult(self._index):
             self._nextButton.Enable()
 
     def _updateImageAndControls(self):
@@ -223,8 +482,26 @@ class Luxocator(wx.Frame):
         # show busy cursor
         wx.BeginBusyCursor()
 
-        # run image in background thread
-        threading.Thread(target=self._updateImageAndControlsAsync).start()
+        # run image in the background worker
+        if self._gridMode:
+            self._updateExecutor.submit(self._updateGridAsync)
+        else:
+            self._updateExecutor.submit(self._updateImageAndControlsAsync)
+
+    def _updateGridAsync(self):
+        """
+        builds the contact sheet of the current page in the background worker
+        :return:
+        """
+        try:
+            sheet, layout, label = load_and_classify_page(
+                self._session, self._classifier, self._maxImageSize
+            )
+        except Exception:
+            sheet, layout, label = None, None, "Loading failed"
+            traceback.print_exc()
+
+        wx.CallAfter(self._updateImageAndControlsResync, sheet, label, layout)
 
 
     def _updateImageAndControlsAsync(self):
@@ -232,43 +509,40 @@ class Luxocator(wx.Frame):
 
         :return:
         """
-
-        if self._session.numResultsReceived == 0:
-            image = None
-            label = "No results found"
-        else:
-            image, url = self._session.get_cv_image_and_url(
-                self._index % self._session.numResultsRequested
+        try:
+            image, label = load_and_classify(
+                self._session,
+                self._classifier,
+                self._index,
+                self._maxImageSize,
+                self._classifyFullResolution,
+                self._inFlightMemory,
             )
-
-            if image is None:
-                label = "No image found"
-            else:
-                # we received the image , now classify
-                label = self._classifier.classify(image, url)
-
-                # resize the image using autofill to display in an appropriate size
-                image = cvResizeAspectFill.resize_image(image, self._maxImageSize)
+        except Exception:
+            image, label = None, "Loading failed"
+            traceback.print_exc()
 
         wx.CallAfter(self._updateImageAndControlsResync, image, label)
 
-    def _updateImageAndControlsResync(self, image, label):
+    def _updateImageAndControlsResync(self, image, label, grid_layout=None):
         """
         synchronous method to remove the busy cursor and create wxPython bitmap format
         :args
             image: opencv format image
             label:
+            grid_layout: layout of the contact sheet in grid mode
 
         :return:
         """
         # hide the busy cursor
-        wx.BusyCursor()
+        wx.EndBusyCursor()
+        self._gridLayout = grid_layout
         if image is None:
             # return the black background
             bitmap = wx.Bitmap(self._maxImageSize,self._maxImageSize//2)
         else:
-            # convert the image into pybitmap format
-            bitmap = wx_utils.convert_color_fromcv2_towx(image)
+            # convert the image into pybitmap format, the working image is not used afterwards
+            bitmap = wx_utils.convert_color_fromcv2_towx(image, in_place=True)
 
         # show the bitmap
         self._staticBitmap.SetBitmap(bitmap)
@@ -285,13 +559,118 @@ class Luxocator(wx.Frame):
         # Refresh
         self.Refresh()
 
+        if not self._startupReported:
+            self._startupReported = True
+            self._timeline.mark("first result shown")
+            print("Luxocator startup timeline:")
+            print(self._timeline.report())
+
+
+def run_soak(
+    classifier_path,
+    query,
+    duration,
+    max_growth,
+    monitor,
+    max_image_size=768,
+    classify_full_resolution=False,
+    memory=None,
+):
+    """
+    runs the search, fetch and classify loop of the window headless, paging through the results and starting
+    over at the end
+    :param memory: InFlightMemory recording the image bytes held per result
+    :return: soak test report, see memory_monitor.soak_test
+    """
+    session = ImageSearchSession()
+    classifier = HistogramClassifier()
+    classifier.deserialize(classifier_path)
+    register_caches(monitor, session, classifier)
+    session.search(query)
+    state = {"index": 0}
+
+    def step():
+        load_and_classify(
+            session,
+            classifier,
+            state["index"],
+            max_image_size,
+            classify_full_resolution,
+            memory,
+        )
+        index = session.nextResult(state["index"])
+        if index is None:
+            session.search(query)
+            index = 0
+        state["index"] = index
+
+    return memory_monitor.soak_test(
+        step, duration, max_growth, monitor=monitor, sample_interval=monitor.interval
+    )
+
 
 def main():
+    parser = argparse.ArgumentParser(description="classify image search results")
+    parser.add_argument("--memory-interval", type=float, help="log the memory every n seconds")
+    parser.add_argument(
+        "--memory-trace", type=int, default=0, help="frames traced per allocation, 0 disables tracemalloc"
+    )
+    parser.add_argument("--rss-budget-mb", type=float, help="shed the caches above this RSS")
+    parser.add_argument("--soak", type=float, help="run the loop headless for n seconds and check the RSS")
+    parser.add_argument("--soak-max-growth-mb", type=float, default=50.0)
+    parser.add_argument("--soak-query", default="luxury condo sales")
+    parser.add_argument(
+        "--classify-full-resolution",
+        action="store_true",
+        help="classify the full size images instead of the display size ones",
+    )
+    args = parser.parse_args()
+    if args.soak is not None and args.soak <= memory_monitor.SOAK_WARMUP:
+        parser.error(f"--soak must be longer than the {memory_monitor.SOAK_WARMUP:g} s warmup")
+    timeline = StartupTimeline()
+    timeline.mark("imports done")
+
+    classifier_path = pyinstaller_utils.resource_path_resolver("classifier.mat")
+    monitor = None
+    if args.memory_interval or args.soak:
+        monitor = memory_monitor.MemoryMonitor(
+            args.memory_interval or 10.0,
+            args.rss_budget_mb * 2**20 if args.rss_budget_mb else None,
+            "shed" if args.rss_budget_mb else "log",
+            args.memory_trace,
+        )
+
+    if args.soak:
+        max_growth = args.soak_max_growth_mb * 2**20
+        memory = image_preprocessing.InFlightMemory()
+        report = run_soak(
+            classifier_path,
+            args.soak_query,
+            args.soak,
+            max_growth,
+            monitor,
+            classify_full_resolution=args.classify_full_resolution,
+            memory=memory,
+        )
+        memory_monitor.print_soak_report(report, max_growth)
+        in_flight = memory.stats()
+        print(
+            f"image memory in flight: peak {in_flight['peak_bytes'] / 2**20:.1f} MiB, "
+            f"mean {in_flight['mean_bytes'] / 2**20:.1f} MiB over {in_flight['images']} images"
+        )
+        return 0 if report["passed"] else 1
+
     app = wx.App()
-    luxocator = Luxocator(pyinstaller_utils.resource_path_resolver("classifier.mat"))
+    luxocator = Luxocator(
+        classifier_path,
+        timeline=timeline,
+        monitor=monitor,
+        classify_full_resolution=args.classify_full_resolution,
+    )
     luxocator.Show()
     app.MainLoop()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
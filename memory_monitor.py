@@ -0,0 +1,248 @@
+# shared by luxocator.py and smart_alarm_training_for_identification/interactive_human_face_recognizer.py,
+# which adds the repository root to sys.path to import it
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+SOAK_WARMUP = 10.0  # seconds before the soak test takes its baseline rss
+
+
+def rss_bytes():
+    """
+    resident set size of this process, read from /proc/self/statm, the peak RSS where /proc is missing
+    :return: bytes
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryMonitor:
+    """
+    Samples the memory of a long running process: RSS, live threads, the bytes held by registered caches and,
+    with trace_frames > 0, the allocation sites which grew most since the monitor started (tracemalloc).
+
+    A cache is registered with a callable returning its size in bytes, and optionally a budget and a callable
+    shedding it. When the RSS budget or a cache budget is exceeded the sample is logged, and with
+    on_budget="shed" the caches over budget (all sheddable caches when the RSS budget is exceeded) are shed.
+    """
+
+    def __init__(
+        self,
+        interval=60.0,
+        rss_budget=None,
+        on_budget="log",
+        trace_frames=0,
+        top_sites=10,
+        max_samples=1440,
+        log=None,
+    ):
+        """
+        :param interval: seconds between the samples of the background thread
+        :param rss_budget: max RSS in bytes, None for no budget
+        :param on_budget: "log" or "shed"
+        :param trace_frames: frames stored per allocation by tracemalloc, 0 leaves tracemalloc off
+        :param top_sites: allocation sites reported per sample
+        :param max_samples: samples kept in memory
+        :param log: file the samples are written to, defaults to stderr
+        """
+        self.interval = interval
+        self.rss_budget = rss_budget
+        self.on_budget = on_budget
+        self.top_sites = top_sites
+        self._log = log or sys.stderr
+        self._caches = {}  # name -> (size callable, budget, shed callable)
+        self._samples = collections.deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sheds = 0
+
+        self._baseline_snapshot = None
+        if trace_frames > 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(trace_frames)
+            self._baseline_snapshot = tracemalloc.take_snapshot()
+
+    @property
+    def samples(self):
+        with self._lock:
+            return list(self._samples)
+
+    def register_cache(self, name, size, budget=None, shed=None):
+        """
+        :param name: name the cache is reported by
+        :param size: callable returning the bytes held by the cache
+        :param budget: max bytes, None for no budget
+        :param shed: callable emptying the cache, None if it cannot be shed
+        """
+        with self._lock:
+            self._caches[name] = (size, budget, shed)
+
+    def sample(self):
+        """
+        takes a sample now, logs it and applies the budgets
+        :return: dict with time, rss, threads, caches (name -> bytes), over_budget (names) and top_sites
+        """
+        with self._lock:
+            caches = dict(self._caches)
+        cache_bytes = {}
+        for name, (size, _, _) in caches.items():
+            try:
+                cache_bytes[name] = int(size())
+            except Exception as e:
+                sys.stderr.write(f"memory monitor: size of {name} failed: {e}\n")
+
+        rss = rss_bytes()
+        over_budget = [
+            name
+            for name, (_, budget, _) in caches.items()
+            if budget is not None and cache_bytes.get(name, 0) > budget
+        ]
+        if self.rss_budget is not None and rss > self.rss_budget:
+            over_budget.append("rss")
+
+        report = {
+            "time": time.time(),
+            "rss": rss,
+            "threads": threading.active_count(),
+            "caches": cache_bytes,
+            "over_budget": over_budget,
+            "top_sites": self._top_sites(),
+        }
+        with self._lock:
+            self._samples.append(report)
+
+        self._write(report)
+        if over_budget and self.on_budget == "shed":
+            self._shed(caches, over_budget)
+        return report
+
+    def _top_sites(self):
+        if self._baseline_snapshot is None or not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+        stats = snapshot.compare_to(self._baseline_snapshot, "lineno")
+        return [
+            (str(stat.traceback), stat.size_diff, stat.count_diff)
+            for stat in stats[: self.top_sites]
+        ]
+
+    def _shed(self, caches, over_budget):
+        names = list(caches) if "rss" in over_budget else over_budget
+        for name in names:
+            shed = caches[name][2]
+            if shed is not None:
+                shed()
+                self.sheds += 1
+                self._log.write(f"memory monitor: shed {name}\n")
+
+    def _write(self, report):
+        caches = ", ".join(
+            f"{name} {size / 2**20:.1f} MiB" for name, size in sorted(report["caches"].items())
+        )
+        self._log.write(
+            f"memory: rss {report['rss'] / 2**20:.1f} MiB, {report['threads']} threads"
+            + (f", {caches}" if caches else "")
+            + (f", over budget: {', '.join(report['over_budget'])}" if report["over_budget"] else "")
+            + "\n"
+        )
+        for site, size_diff, count_diff in report["top_sites"]:
+            self._log.write(f"  {size_diff / 1024.0:+10.1f} KiB {count_diff:+8d}  {site}\n")
+
+    def start(self):
+        """
+        samples every interval seconds on a daemon thread until stop
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+def soak_test(step, duration, max_growth, warmup=SOAK_WARMUP, monitor=None, sample_interval=10.0):
+    """
+    runs step repeatedly for duration seconds and fails if the RSS grows by more than max_growth bytes after the
+    warmup (caches filling up, lazy imports). The run is inconclusive (and does not pass) if no step ran after
+    the baseline was taken, e.g. a single step outlasting the warmup and the run
+    :param step: callable running one iteration of the loop under test
+    :param duration: seconds to run, including the warmup, must be longer than the warmup
+    :param max_growth: allowed RSS growth in bytes between the end of the warmup and the end of the run
+    :param warmup: seconds before the baseline RSS is taken
+    :param monitor: MemoryMonitor sampling during the run, a new one if None
+    :param sample_interval: seconds between the samples
+    :return: dict with passed, inconclusive, iterations, baseline_rss, final_rss, growth, peak_threads and the samples
+    """
+    if duration <= warmup:
+        raise ValueError(f"soak duration {duration} s is not longer than the {warmup} s warmup")
+    monitor = monitor or MemoryMonitor(sample_interval)
+    start = time.perf_counter()
+    next_sample = start + min(warmup, sample_interval)
+    baseline = None
+    baseline_iterations = 0
+    peak_threads = threading.active_count()
+    iterations = 0
+
+    while time.perf_counter() - start < duration:
+        step()
+        iterations += 1
+        now = time.perf_counter()
+        if baseline is None and now - start >= warmup:
+            baseline = monitor.sample()["rss"]
+            baseline_iterations = iterations
+            next_sample = now + sample_interval
+        elif now >= next_sample:
+            peak_threads = max(peak_threads, monitor.sample()["threads"])
+            next_sample = now + sample_interval
+
+    final = monitor.sample()["rss"]
+    inconclusive = baseline is None or iterations == baseline_iterations
+    if baseline is None:
+        baseline = final
+    growth = final - baseline
+    return {
+        "passed": not inconclusive and growth <= max_growth,
+        "inconclusive": inconclusive,
+        "iterations": iterations,
+        "baseline_rss": baseline,
+        "final_rss": final,
+        "growth": growth,
+        "peak_threads": peak_threads,
+        "samples": monitor.samples,
+    }
+
+
+def print_soak_report(report, max_growth):
+    if report["inconclusive"]:
+        print(
+            f"soak test INCONCLUSIVE: {report['iterations']} iterations, none ran after the baseline rss "
+            f"was taken, run longer than the warmup plus a step"
+        )
+        return
+    print(
+        f"soak test {'passed' if report['passed'] else 'FAILED'}: {report['iterations']} iterations, "
+        f"rss {report['baseline_rss'] / 2**20:.1f} -> {report['final_rss'] / 2**20:.1f} MiB "
+        f"({report['growth'] / 2**20:+.1f} MiB, allowed {max_growth / 2**20:.1f} MiB), "
+        f"peak {report['peak_threads']} threads"
+    )
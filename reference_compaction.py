@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy
+
+from compact_histogram import CompactHistogram
+from histogram_classifier import IMAGE_EXTENSIONS, HistogramClassifier, label_from_path
+
+
+def distance_matrix(hist_list):
+    """
+    pairwise distances (1 - histogram intersection) of the references of a label
+    """
+    count = len(hist_list)
+    distances = numpy.zeros((count, count))
+    for i in range(count):
+        for j in range(i + 1, count):
+            distances[i, j] = distances[j, i] = 1.0 - hist_list[i].intersection_with(
+                hist_list[j]
+            )
+    return distances
+
+
+def k_medoids(distances, weights, k, max_iterations=50):
+    """
+    weighted k-medoids clustering on a precomputed distance matrix
+    :param distances: array of shape (n, n)
+    :param weights: weight of each point
+    :param k: max number of clusters
+    :return: (distinct medoid indices, each with at least one point, cluster index of each point)
+    """
+    # start from the most central point, then repeatedly add the point farthest from the chosen medoids
+    medoids = [int(numpy.argmin(distances @ weights))]
+    while len(medoids) < k:
+        medoids.append(int(numpy.argmax(distances[:, medoids].min(axis=1))))
+
+    for _ in range(max_iterations):
+        assignment = numpy.argmin(distances[:, medoids], axis=1)
+        new_medoids = []
+        for cluster in range(k):
+            members = numpy.flatnonzero(assignment == cluster)
+            if len(members) == 0:
+                # a medoid identical to an earlier one loses all its points
+                new_medoids.append(medoids[cluster])
+                continue
+            costs = distances[numpy.ix_(members, members)] @ weights[members]
+            new_medoids.append(int(members[numpy.argmin(costs)]))
+        if new_medoids == medoids:
+            break
+        medoids = new_medoids
+
+    # identical points can leave two clusters with the same medoid, or a cluster without points
+    medoids = list(dict.fromkeys(medoids))
+    assignment = numpy.argmin(distances[:, medoids], axis=1)
+    medoids = [medoid for cluster, medoid in enumerate(medoids) if numpy.any(assignment == cluster)]
+    return medoids, numpy.argmin(distances[:, medoids], axis=1)
+
+
+def compact_references(hist_list, k):
+    """
+    clusters the references of a label and keeps one medoid per cluster, weighted by the total weight of its
+    cluster, so that the weighted mean similarity of the medoids approximates the mean over every reference
+    :param hist_list: list of CompactHistogram of one label
+    :param k: max number of references to keep
+    :return: new list of CompactHistogram
+    """
+    if len(hist_list) <= k:
+        return list(hist_list)
+
+    weights = numpy.array([hist.reference_weight for hist in hist_list])
+    medoids, assignment = k_medoids(distance_matrix(hist_list), weights, k)
+
+    compacted = []
+    for cluster, index in enumerate(medoids):
+        hist = hist_list[index]
+        compacted.append(
+            CompactHistogram(
+                hist.ids,
+                hist.weights,
+                hist.scale,
+                hist.error,
+                hist.num_bins,
+                float(weights[assignment == cluster].sum()),
+            )
+        )
+    return compacted
+
+
+def load_validation_images(directory, label_from):
+    images = []
+    for root, _, files in os.walk(directory):
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            if os.path.splitext(file)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is not None:
+                images.append((label_from_path(path, directory, label_from), image))
+    return images
+
+
+def agreement(labels, other_labels):
+    return float(numpy.mean([a == b for a, b in zip(labels, other_labels)]))
+
+
+def classify_all(classifier, images):
+    """
+    :return: (labels, mean seconds per classify)
+    """
+    labels = []
+    start = time.perf_counter()
+    for _, image in images:
+        labels.append(classifier.classify(image))
+    return labels, (time.perf_counter() - start) / max(1, len(images))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="replace the references of each label by k weighted medoids"
+    )
+    parser.add_argument("model", help="classifier .mat file")
+    parser.add_argument("--k", type=int, default=8, help="references kept per label")
+    parser.add_argument("--validation", help="folder of labelled images to compare the models on")
+    parser.add_argument("--label-from", choices=("filename", "folder"), default="folder")
+    parser.add_argument("--output", help="compacted model path, defaults to <model>.compact.mat")
+    args = parser.parse_args()
+
+    original = HistogramClassifier()
+    original.deserialize(args.model)
+    compacted = HistogramClassifier()
+    compacted.deserialize(args.model)
+    for label, (before, after) in sorted(compacted.compact(args.k).items()):
+        print(f"{label}: {before} -> {after} references")
+
+    if args.validation:
+        images = load_validation_images(args.validation, args.label_from)
+        if not images:
+            sys.stderr.write("no validation images found\n")
+        else:
+            original_labels, original_time = classify_all(original, images)
+            compacted_labels, compacted_time = classify_all(compacted, images)
+            expected = [label for label, _ in images]
+            print(
+                f"classify: {1000.0 * original_time:.1f} ms -> {1000.0 * compacted_time:.1f} ms "
+                f"({original_time / compacted_time:.1f}x) over {len(images)} images"
+            )
+            print(
+                "agreement with the uncompacted model: "
+                f"{agreement(original_labels, compacted_labels):.1%}"
+            )
+            print(
+                f"accuracy: {agreement(original_labels, expected):.1%} -> "
+                f"{agreement(compacted_labels, expected):.1%}"
+            )
+
+    output = args.output or os.path.splitext(args.model)[0] + ".compact.mat"
+    compacted.serialize(output)
+    print(f"compacted model written to {output}")
+
+
+if __name__ == "__main__":
+    main()
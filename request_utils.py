@@ -2,10 +2,8 @@ import sys
 
 import cv2
 import numpy
-import requests
-from dotenv import load_dotenv
 
-load_dotenv()
+import image_preprocessing
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0"
@@ -14,6 +12,22 @@ HEADERS = {
 }
 
 
+_environment_loaded = False
+
+
+def load_environment():
+    """
+    loads the .env file (BING_SEARCH_KEY) on first use instead of at import, dotenv is only imported then
+    :return: None
+    """
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _environment_loaded = True
+
+
 def validate_response(response):
     """
     this method is used validate response
@@ -27,22 +41,53 @@ def validate_response(response):
     return False
 
 
-def getcvImageFromUrl(url):
+def decode_image(data, reduction=1):
+    """
+    decodes encoded image bytes (jpeg, png, ...) into an opencv color image
+    :param data: bytes
+    :param reduction: 1, 2, 4 or 8, decodes at 1/reduction of the size
+    :return: image array or None
+    """
+    image_data = numpy.frombuffer(data, numpy.uint8)
+    image = cv2.imdecode(image_data, image_preprocessing.REDUCED_DECODE_FLAGS[reduction])
+    if image is None:
+        sys.stderr.write("Failed")
+    return image
+
+
+def getcvImageFromUrl(url, reduction=1, timeout=None):
     """
     this method is to efficiently read image from internet
     :param url: image url
+    :param reduction: 1, 2, 4 or 8, decodes at 1/reduction of the size
+    :param timeout: seconds to wait for the connection and for each read, None waits forever
     :return: image array
     """
-    response = requests.get(url, headers=HEADERS)
+    import requests
+
+    response = requests.get(url, headers=HEADERS, timeout=timeout)
     if not validate_response(response):
         sys.stderr.write("Image not found")
         return None
-    image_data = numpy.frombuffer(response.content, numpy.uint8)
-    image = cv2.imdecode(image_data, cv2.IMREAD_COLOR)
-    if image is None:
-        sys.stderr.write("Failed")
+    return decode_image(response.content, reduction)
 
-    return image
+
+def tryGetcvImageFromUrl(url, timeout=10.0):
+    """
+    like getcvImageFromUrl, but a failed request (unreachable host, timeout, bad url) gives None instead of
+    raising, for callers which skip images they cannot read
+    :param url: image url, None gives None
+    :return: image array or None
+    """
+    import requests
+
+    if not url:
+        return None
+    try:
+        return getcvImageFromUrl(url, timeout=timeout)
+    except requests.RequestException as e:
+        sys.stderr.write(f"Error as here: {e}")
+        return None
 
 
 def main():
@@ -0,0 +1,150 @@
+import concurrent.futures
+import sys
+
+import cv2
+import numpy
+
+import request_utils
+
+
+def result_json(result):
+    """
+    raw bing json of a py_ms_cognitive result (or of a plain dict)
+    """
+    if isinstance(result, dict):
+        return result
+    return getattr(result, "json", None) or {}
+
+
+def exact_keys(result):
+    """
+    keys which identify the same image file: the content url and the bing image id. The encoding format, byte
+    size and dimensions are no key, different photos can share them, copies of the same file on other hosts
+    are left to the thumbnail hash
+    """
+    json = result_json(result)
+    keys = []
+    url = json.get("contentUrl")
+    if url:
+        keys.append(("url", url.split("://", 1)[-1].lower()))
+    if json.get("imageId"):
+        keys.append(("id", json["imageId"]))
+    return keys
+
+
+def perceptual_hash(image):
+    """
+    64 bit DCT hash of the image, close images (resized, recompressed) get hashes a few bits apart
+    :param image: image in opencv format
+    :return: int
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (32, 32), interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(numpy.float32(small))[:8, :8].flatten()
+    # the DC term only carries the brightness
+    bits = dct[1:] > numpy.median(dct[1:])
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class DedupState:
+    """
+    keys and hashes of the images already kept, so that later result pages of the same query are deduplicated
+    against the earlier ones too
+    """
+
+    def __init__(self):
+        self.keys = set()
+        self.hashes = []
+
+    @property
+    def nbytes(self):
+        # approximate, the keys are small tuples of strings and ints
+        return (
+            sys.getsizeof(self.keys)
+            + sum(sys.getsizeof(key) + sum(sys.getsizeof(part) for part in key) for key in self.keys)
+            + sys.getsizeof(self.hashes)
+            + sum(sys.getsizeof(value) for value in self.hashes)
+        )
+
+
+def dedup_exact(results, state):
+    """
+    drops the results whose content url or image id matches a result kept before
+    :return: list of the remaining results, in order
+    """
+    unique = []
+    for result in results:
+        keys = exact_keys(result)
+        if any(key in state.keys for key in keys):
+            continue
+        state.keys.update(keys)
+        unique.append(result)
+    return unique
+
+
+def near_unique_indices(thumbnails, state, max_distance=6):
+    """
+    indices of the thumbnails whose hash is not within max_distance of a result kept before, the hashes of the
+    kept thumbnails are added to state
+    :param thumbnails: decoded thumbnails, None is always kept
+    :return: list of indices, in order
+    """
+    kept = []
+    for index, thumbnail in enumerate(thumbnails):
+        if thumbnail is None:
+            # keep images whose thumbnail cannot be read
+            kept.append(index)
+            continue
+        value = perceptual_hash(thumbnail)
+        if any(hamming_distance(value, other) <= max_distance for other in state.hashes):
+            continue
+        state.hashes.append(value)
+        kept.append(index)
+    return kept
+
+
+def dedup_near(results, thumbnails, state, max_distance=6):
+    """
+    drops the results whose thumbnail hash is within max_distance of a result kept before
+    :param thumbnails: decoded thumbnail of each result, None keeps the result
+    :return: list of the remaining results, in order
+    """
+    return [results[index] for index in near_unique_indices(thumbnails, state, max_distance)]
+
+
+def dedup_results(results, state=None, max_distance=6, max_workers=8):
+    """
+    drops exact duplicates (same content url or image id), then near duplicates by the perceptual hash of their
+    thumbnails (fetched in parallel). Only thumbnails are fetched, the full size images are left to the caller
+    :param results: py_ms_cognitive results (or bing json dicts) in ranking order
+    :param state: DedupState shared by the pages of a query, a new one is used if None
+    :param max_distance: max hamming distance of the hashes of near duplicates, None or negative disables
+        hashing
+    :param max_workers: number of thumbnails fetched concurrently, a thumbnail which cannot be fetched keeps its
+        result
+    :return: (list of unique results, number of skipped duplicates, decoded thumbnail of each unique result or
+        None where it was not fetched or could not be read)
+    """
+    if state is None:
+        state = DedupState()
+
+    unique = dedup_exact(results, state)
+    thumbnails = [None] * len(unique)
+
+    if max_distance is not None and max_distance >= 0 and unique:
+        urls = [result_json(result).get("thumbnailUrl") for result in unique]
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            thumbnails = list(executor.map(request_utils.tryGetcvImageFromUrl, urls))
+        kept = near_unique_indices(thumbnails, state, max_distance)
+        unique = [unique[index] for index in kept]
+        thumbnails = [thumbnails[index] for index in kept]
+
+    return unique, len(results) - len(unique), thumbnails
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+import argparse
+import os
+import threading
+import time
+
+import bing_stand_in
+from image_search_session import ImageSearchSession
+from latency_stats import LatencyRecorder
+
+OPERATIONS = ("search", "searchNext", "image fetch")
+
+
+class LoadReport:
+    def __init__(self):
+        self.latency = {name: LatencyRecorder() for name in OPERATIONS}
+        self.errors = {name: 0 for name in OPERATIONS}
+        self._lock = threading.Lock()
+
+    def timed(self, name, function, *args):
+        """
+        runs function and records its latency
+        """
+        start = time.perf_counter()
+        result = function(*args)
+        self.latency[name].record(time.perf_counter() - start)
+        return result
+
+    def error(self, name):
+        with self._lock:
+            self.errors[name] += 1
+
+
+def run_session(report, query, pages, images_per_page, dedup=False):
+    """
+    drives one ImageSearchSession through a search, pages more result pages and fetches images of each page
+    :param dedup: deduplicate the results, the search then fetches and hashes every thumbnail of the page
+    """
+    session = ImageSearchSession()
+    session.dedup = dedup
+    for page in range(pages + 1):
+        if page == 0:
+            report.timed("search", session.search, query)
+            name = "search"
+        else:
+            report.timed("searchNext", session.searchNext)
+            name = "searchNext"
+        if session.searchError is not None or (
+            session.numResultsReceived + session.numDuplicatesSkipped == 0
+        ):
+            report.error(name)
+            return
+
+        for index in range(min(images_per_page, session.numResultsReceived)):
+            image, _ = report.timed("image fetch", session.get_cv_image_and_url, index)
+            if image is None:
+                report.error("image fetch")
+
+
+def run_load(sessions, query, pages, images_per_page, dedup=False):
+    """
+    runs the sessions concurrently, one thread each
+    :return: (LoadReport, wall time in seconds)
+    """
+    report = LoadReport()
+    threads = [
+        threading.Thread(target=run_session, args=(report, query, pages, images_per_page, dedup))
+        for _ in range(sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return report, time.perf_counter() - start
+
+
+def print_report(report, elapsed):
+    print(f"{'operation':<12} {'count':>7} {'errors':>7} {'per s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    total = 0
+    for name in OPERATIONS:
+        recorder = report.latency[name]
+        total += recorder.count
+        p = recorder.percentiles((50, 95, 99))
+        cells = [f"{p[key]:>8.1f}" if p[key] is not None else f"{'-':>8}" for key in p]
+        print(
+            f"{name:<12} {recorder.count:>7d} {report.errors[name]:>7d} "
+            f"{recorder.count / elapsed:>8.1f} {' '.join(cells)}"
+        )
+    print(f"{total} requests in {elapsed:.2f} s, {total / elapsed:.1f} requests/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="drive many concurrent ImageSearchSession objects and report throughput and tail latency"
+    )
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--pages", type=int, default=3, help="searchNext calls after the first search")
+    parser.add_argument("--images-per-page", type=int, default=5)
+    parser.add_argument("--query", default="luxury condo sales")
+    parser.add_argument(
+        "--endpoint", help="search endpoint to load, by default a local stand-in server is started"
+    )
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="stand-in latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="stand-in jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stand-in error rate")
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="deduplicate the results, the search then fetches and hashes every thumbnail",
+    )
+    args = parser.parse_args()
+
+    server = None
+    if args.endpoint:
+        os.environ["BING_SEARCH_ENDPOINT"] = args.endpoint
+    else:
+        server = bing_stand_in.create_server(
+            latency=args.latency_ms / 1000.0,
+            jitter=args.jitter_ms / 1000.0,
+            error_rate=args.error_rate,
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["BING_SEARCH_ENDPOINT"] = server.search_url
+        os.environ.setdefault("BING_SEARCH_KEY", "stand-in")
+
+    try:
+        report, elapsed = run_load(
+            args.sessions, args.query, args.pages, args.images_per_page, args.dedup
+        )
+        print_report(report, elapsed)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
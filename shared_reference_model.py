@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+import argparse
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import weakref
+
+import cv2
+import numpy
+
+from compact_histogram import CompactHistogram, narrowest_uint
+
+MAGIC = b"HISTREF1"
+ALIGNMENT = 64
+
+
+def _default_path():
+    # /dev/shm keeps the pages in memory only, fall back to the temp folder elsewhere
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    fd, path = tempfile.mkstemp(prefix="histogram_references_", suffix=".bin", dir=directory)
+    os.close(fd)
+    return path
+
+
+def _remove_file(path, owner_pid):
+    # forked children inherit the owner object, only the owner process may remove the file
+    if os.getpid() == owner_pid and os.path.exists(path):
+        os.remove(path)
+
+
+def write_packed_references(references, path):
+    """
+    packs the references of every label into one flat file: a small json header followed by the ids, weights,
+    reference offsets, scales, errors and reference weights of all references as contiguous arrays
+    :param references: dict of label -> list of CompactHistogram
+    :param path: output file, written to a temporary file first and renamed
+    :return: None
+    """
+    labels = [(label, len(hist_list)) for label, hist_list in references.items()]
+    hists = [hist for hist_list in references.values() for hist in hist_list]
+    num_bins = max((hist.num_bins for hist in hists), default=0)
+    # references built with different weight types are stored dequantized as float32
+    mixed = len({hist.weights.dtype for hist in hists}) > 1
+    weight_dtype = numpy.float32 if mixed or not hists else hists[0].weights.dtype
+
+    lengths = numpy.array([len(hist.ids) for hist in hists], numpy.int64)
+    offsets = numpy.zeros(len(hists) + 1, numpy.int64)
+    numpy.cumsum(lengths, out=offsets[1:])
+    arrays = {
+        "ids": (narrowest_uint(max(num_bins - 1, 0)), [hist.ids for hist in hists]),
+        "weights": (
+            weight_dtype,
+            [hist.dequantized() if mixed else hist.weights for hist in hists],
+        ),
+        "offsets": (numpy.int64, [offsets]),
+        "scales": (
+            numpy.float64,
+            [numpy.array([1.0 if mixed else hist.scale for hist in hists], numpy.float64)],
+        ),
+        "errors": (
+            numpy.float64,
+            [numpy.array([hist.error for hist in hists], numpy.float64)],
+        ),
+        "reference_weights": (
+            numpy.float64,
+            [numpy.array([hist.reference_weight for hist in hists], numpy.float64)],
+        ),
+    }
+
+    layout = {}
+    position = 0
+    for name, (dtype, parts) in arrays.items():
+        count = sum(len(part) for part in parts)
+        layout[name] = [numpy.dtype(dtype).str, position, count]
+        position += -(-count * numpy.dtype(dtype).itemsize // ALIGNMENT) * ALIGNMENT
+
+    meta = json.dumps({"labels": labels, "num_bins": num_bins, "arrays": layout}).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(meta)) // ALIGNMENT) * ALIGNMENT
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(MAGIC + struct.pack("<Q", len(meta)) + meta)
+            for name, (dtype, parts) in arrays.items():
+                file.seek(data_start + layout[name][1])
+                for part in parts:
+                    file.write(numpy.ascontiguousarray(part, dtype).tobytes())
+            file.truncate(data_start + position)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class SharedReferenceModel:
+    """
+    Reference histograms packed into one read only memory mapped file.
+
+    The owner process packs the model once with create(), any number of worker processes attach() to the
+    same file and classify against it without copying it: the operating system shares the mapped pages, so
+    the model takes the same memory whatever the number of workers. The file lives in /dev/shm when available
+    and is removed when the owner closes the model or exits.
+    """
+
+    def __init__(self, path, owner=False):
+        self._path = path
+        self._finalizer = None
+        if owner:
+            self._finalizer = weakref.finalize(self, _remove_file, path, os.getpid())
+
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a packed reference model")
+        (meta_length,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        meta_start = len(MAGIC) + 8
+        meta = json.loads(self._mmap[meta_start : meta_start + meta_length].decode("utf-8"))
+        data_start = -(-(meta_start + meta_length) // ALIGNMENT) * ALIGNMENT
+
+        arrays = {}
+        for name, (dtype, position, count) in meta["arrays"].items():
+            arrays[name] = numpy.frombuffer(
+                self._mmap, numpy.dtype(dtype), count, data_start + position
+            )
+
+        # CompactHistogram views on the mapped arrays, nothing is copied
+        self.references = {}
+        offsets = arrays["offsets"]
+        index = 0
+        for label, count in meta["labels"]:
+            hist_list = []
+            for i in range(index, index + count):
+                start, end = offsets[i], offsets[i + 1]
+                hist_list.append(
+                    CompactHistogram(
+                        arrays["ids"][start:end],
+                        arrays["weights"][start:end],
+                        float(arrays["scales"][i]),
+                        float(arrays["errors"][i]),
+                        meta["num_bins"],
+                        float(arrays["reference_weights"][i]),
+                    )
+                )
+            self.references[label] = hist_list
+            index += count
+
+    @classmethod
+    def create(cls, references, path=None):
+        """
+        packs the references and maps them, the returned model owns the file
+        :param references: dict of label -> list of CompactHistogram
+        :param path: file to write, defaults to a new file in /dev/shm
+        """
+        path = path or _default_path()
+        write_packed_references(references, path)
+        return cls(path, owner=True)
+
+    @classmethod
+    def attach(cls, path):
+        """
+        maps a model packed by another process, the model file stays owned by that process
+        """
+        return cls(path, owner=False)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def nbytes(self):
+        return len(self._mmap)
+
+    def close(self):
+        """
+        unmaps the model, the owner also removes the file. Classifiers still using the references must be
+        detached first
+        """
+        self.references = {}
+        if not self._mmap.closed:
+            try:
+                self._mmap.close()
+            except BufferError:
+                sys.stderr.write("shared references are still in use, leaving them mapped\n")
+        if self._finalizer is not None:
+            self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_worker_classifier = None
+
+
+def _attach_worker(path):
+    global _worker_classifier
+    from histogram_classifier import HistogramClassifier
+
+    _worker_classifier = HistogramClassifier()
+    _worker_classifier.attach_shared_references(path)
+
+
+def _classify_worker(image_path):
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is None:
+        return image_path, None
+    return image_path, _worker_classifier.classify(image, image_path)
+
+
+def main():
+    from histogram_classifier import HistogramClassifier
+
+    parser = argparse.ArgumentParser(
+        description="load a model once into shared memory and classify images in several worker processes"
+    )
+    parser.add_argument("model", help="classifier .mat file")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    classifier = HistogramClassifier()
+    classifier.deserialize(args.model)
+    with classifier.share_references() as model:
+        print(f"shared {model.nbytes} bytes of references at {model.path}")
+        with multiprocessing.Pool(args.workers, _attach_worker, (model.path,)) as pool:
+            for image_path, label in pool.imap(_classify_worker, args.images):
+                print(f"{image_path}: {label}")
+        classifier.detach_shared_references()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy
+
+import detection_utils
+
+DEFAULT_CASCADES = [
+    "cascades/haarcascade_frontalface_alt.xml",
+    "cascades/lbpcascade_frontalcatface.xml",
+]
+
+
+def parse_floats(value):
+    return [float(v) for v in value.split(",")]
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(",")]
+
+
+def load_labelled_images(image_dir, annotations_path):
+    """
+    reads the labelled images, the annotations file maps image file names to lists of [x, y, w, h] faces.
+    Images without an entry are treated as images without faces (to count false positives)
+    :return: list of (name, equalized gray image, int array of shape (n, 4))
+    """
+    with open(annotations_path) as file:
+        annotations = json.load(file)
+
+    images = []
+    for name in sorted(os.listdir(image_dir)):
+        image = cv2.imread(os.path.join(image_dir, name), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            continue
+        faces = numpy.asarray(annotations.get(name, []), numpy.int32).reshape(-1, 4)
+        images.append((name, cv2.equalizeHist(image), faces))
+    return images
+
+
+def match_detections(detections, faces, min_iou):
+    """
+    greedily matches detections to the labelled faces
+    :return: (number of faces found, number of false positives)
+    """
+    unmatched = list(range(len(faces)))
+    false_positives = 0
+    for rect in detections:
+        best, best_iou = None, min_iou
+        for i in unmatched:
+            iou = detection_utils.intersection_over_union(rect, faces[i])
+            if iou >= best_iou:
+                best, best_iou = i, iou
+        if best is None:
+            false_positives += 1
+        else:
+            unmatched.remove(best)
+    return len(faces) - len(unmatched), false_positives
+
+
+def evaluate_setting(detector, images, scale_factor, min_neighbors, min_size_proportion, detection_scale, min_iou):
+    """
+    runs one parameter setting over every image
+    :return: dict with ms per frame, recall and false positives per frame
+    """
+    total_faces = 0
+    found = 0
+    false_positives = 0
+    elapsed = 0.0
+    for _, image, faces in images:
+        h, w = image.shape[:2]
+        min_size = detection_utils.min_size_from_proportion(
+            (w, h), (min_size_proportion, min_size_proportion)
+        )
+        start = time.perf_counter()
+        detections = detection_utils.detect(
+            detector, image, scale_factor, min_neighbors, min_size, detection_scale
+        )
+        elapsed += time.perf_counter() - start
+
+        hits, misses = match_detections(detections, faces, min_iou)
+        total_faces += len(faces)
+        found += hits
+        false_positives += misses
+
+    return {
+        "scale_factor": scale_factor,
+        "min_neighbors": min_neighbors,
+        "min_size_proportion": min_size_proportion,
+        "detection_scale": detection_scale,
+        "ms_per_frame": 1000.0 * elapsed / len(images),
+        "recall": found / total_faces if total_faces else 0.0,
+        "false_positives_per_frame": false_positives / len(images),
+    }
+
+
+def pareto_front(results):
+    """
+    keeps the settings which no other setting beats on speed, recall and false positives at once
+    """
+
+    def dominates(a, b):
+        no_worse = (
+            a["ms_per_frame"] <= b["ms_per_frame"]
+            and a["recall"] >= b["recall"]
+            and a["false_positives_per_frame"] <= b["false_positives_per_frame"]
+        )
+        better = (
+            a["ms_per_frame"] < b["ms_per_frame"]
+            or a["recall"] > b["recall"]
+            or a["false_positives_per_frame"] < b["false_positives_per_frame"]
+        )
+        return no_worse and better
+
+    front = [r for r in results if not any(dominates(o, r) for o in results)]
+    return sorted(front, key=lambda r: r["ms_per_frame"])
+
+
+def print_table(results):
+    print(
+        f"{'scale':>6} {'neigh':>6} {'minsz':>6} {'detsc':>6} {'ms/frame':>9} {'recall':>7} {'fp/frame':>9}"
+    )
+    for r in results:
+        print(
+            f"{r['scale_factor']:>6.2f} {r['min_neighbors']:>6d} {r['min_size_proportion']:>6.2f} "
+            f"{r['detection_scale']:>6.2f} {r['ms_per_frame']:>9.2f} {r['recall']:>7.1%} "
+            f"{r['false_positives_per_frame']:>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="sweep cascade detection parameters and report speed against recall and false positives"
+    )
+    parser.add_argument("images", help="folder of labelled images")
+    parser.add_argument("annotations", help="json file mapping image names to [[x, y, w, h], ...]")
+    parser.add_argument("--cascades", nargs="+", default=DEFAULT_CASCADES)
+    parser.add_argument("--scale-factors", type=parse_floats, default=[1.05, 1.1, 1.2, 1.3, 1.4])
+    parser.add_argument("--min-neighbors", type=parse_ints, default=[2, 3, 4, 5, 6])
+    parser.add_argument("--min-size-proportions", type=parse_floats, default=[0.1, 0.15, 0.25])
+    parser.add_argument("--detection-scales", type=parse_floats, default=[1.0, 0.75, 0.5])
+    parser.add_argument("--min-iou", type=float, default=0.5)
+    parser.add_argument("--json", help="write every result to this json file")
+    args = parser.parse_args()
+
+    images = load_labelled_images(args.images, args.annotations)
+    if not images:
+        sys.stderr.write("no readable images found\n")
+        return 1
+
+    all_results = {}
+    for cascade_path in args.cascades:
+        detector = cv2.CascadeClassifier(cascade_path)
+        if detector.empty():
+            sys.stderr.write(f"could not load cascade {cascade_path}\n")
+            continue
+
+        results = [
+            evaluate_setting(detector, images, *setting, args.min_iou)
+            for setting in itertools.product(
+                args.scale_factors,
+                args.min_neighbors,
+                args.min_size_proportions,
+                args.detection_scales,
+            )
+        ]
+        all_results[cascade_path] = results
+
+        print(f"\n{cascade_path}: {len(results)} settings over {len(images)} images")
+        print("pareto optimal settings:")
+        print_table(pareto_front(results))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(all_results, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
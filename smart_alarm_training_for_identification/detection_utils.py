@@ -0,0 +1,65 @@
+import cv2
+import numpy
+
+
+def min_size_from_proportion(image_size, min_size_proportion):
+    """
+    utility method to convert the min face size given as proportion of the image into pixels
+    :param image_size: (width, height) of the image
+    :param min_size_proportion: (w, h) proportion of the smaller image side
+    :return: (w, h) in pixels
+    """
+    min_image_size = min(image_size)
+    return (
+        int(min_image_size * min_size_proportion[0]),
+        int(min_image_size * min_size_proportion[1]),
+    )
+
+
+def detect(
+    detector, equalized_gray_image, scale_factor, min_neighbors, min_size, detection_scale=1.0
+):
+    """
+    runs detectMultiScale on the image, optionally on a downscaled copy for speed
+    :param detector: cv2.CascadeClassifier
+    :param equalized_gray_image: equalized gray scale image
+    :param scale_factor: scale step of the detection pyramid
+    :param min_neighbors: neighbours needed to keep a detection
+    :param min_size: min face size in pixels of the full size image
+    :param detection_scale: factor (<= 1) the image is resized by before the search
+    :return: int array of shape (n, 4) with (x, y, w, h) in full size image coordinates
+    """
+    image = equalized_gray_image
+    if detection_scale != 1.0:
+        image = cv2.resize(
+            image, None, fx=detection_scale, fy=detection_scale, interpolation=cv2.INTER_AREA
+        )
+        min_size = (
+            max(1, int(min_size[0] * detection_scale)),
+            max(1, int(min_size[1] * detection_scale)),
+        )
+
+    rects = detector.detectMultiScale(
+        image, scaleFactor=scale_factor, minNeighbors=min_neighbors, minSize=min_size
+    )
+    if len(rects) == 0:
+        return numpy.zeros((0, 4), numpy.int32)
+
+    rects = numpy.asarray(rects, numpy.float64)
+    if detection_scale != 1.0:
+        rects /= detection_scale
+    return numpy.round(rects).astype(numpy.int32)
+
+
+def intersection_over_union(a, b):
+    """
+    overlap ratio of two (x, y, w, h) rectangles
+    """
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    intersection = float(iw * ih)
+    return intersection / (aw * ah + bw * bh - intersection)
@@ -0,0 +1,195 @@
+import sys
+import time
+
+import numpy
+
+import detection_utils
+
+
+class FaceTracker:
+    """
+    Face detection with region of interest tracking.
+
+    After a detection, the following frames only search a region around each last face, expanded by
+    roi_margin of the face size on every side. A full frame scan runs every full_scan_interval frames, when
+    nothing is tracked, and on the frame after a tracked face was lost.
+    """
+
+    def __init__(
+        self,
+        detector,
+        scale_factor,
+        min_neighbors,
+        min_size,
+        tracking=True,
+        full_scan_interval=10,
+        roi_margin=0.5,
+        detection_scale=1.0,
+    ):
+        self._detector = detector
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.tracking = tracking
+        self.full_scan_interval = full_scan_interval
+        self.roi_margin = roi_margin
+        self.detection_scale = detection_scale
+
+        self._rects = numpy.zeros((0, 4), numpy.int32)
+        self._frames_since_full_scan = 0
+        self._lost = False
+        self.last_scan_was_full = True
+
+        self.full_scans = 0
+        self.roi_scans = 0
+        self.full_scan_seconds = 0.0
+        self.roi_scan_seconds = 0.0
+
+    @property
+    def rects(self):
+        return self._rects
+
+    def detect(self, equalized_gray_image):
+        """
+        :param equalized_gray_image: equalized gray scale frame
+        :return: int array of shape (n, 4) with the (x, y, w, h) faces
+        """
+        full_scan = (
+            not self.tracking
+            or self._lost
+            or len(self._rects) == 0
+            or self._frames_since_full_scan >= self.full_scan_interval
+        )
+        start = time.perf_counter()
+        if full_scan:
+            self._rects = detection_utils.detect(
+                self._detector,
+                equalized_gray_image,
+                self.scale_factor,
+                self.min_neighbors,
+                self.min_size,
+                self.detection_scale,
+            )
+            self._frames_since_full_scan = 0
+            self._lost = False
+            self.full_scans += 1
+            self.full_scan_seconds += time.perf_counter() - start
+        else:
+            self._rects = self._track(equalized_gray_image)
+            self._frames_since_full_scan += 1
+            self.roi_scans += 1
+            self.roi_scan_seconds += time.perf_counter() - start
+        self.last_scan_was_full = full_scan
+        return self._rects
+
+    def _track(self, image):
+        image_h, image_w = image.shape[:2]
+        tracked = []
+        for x, y, w, h in self._rects:
+            margin_x = int(w * self.roi_margin)
+            margin_y = int(h * self.roi_margin)
+            x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+            x1, y1 = min(image_w, x + w + margin_x), min(image_h, y + h + margin_y)
+
+            found = detection_utils.detect(
+                self._detector,
+                image[y0:y1, x0:x1],
+                self.scale_factor,
+                self.min_neighbors,
+                self.min_size,
+            )
+            if len(found) == 0:
+                # rescan the full frame next time, the face moved out or is gone
+                self._lost = True
+                continue
+
+            found = found + numpy.array([x0, y0, 0, 0], numpy.int32)
+            overlaps = [
+                detection_utils.intersection_over_union(rect, (x, y, w, h)) for rect in found
+            ]
+            tracked.append(found[int(numpy.argmax(overlaps))])
+
+        if not tracked:
+            return numpy.zeros((0, 4), numpy.int32)
+        return numpy.asarray(tracked, numpy.int32)
+
+    def stats(self):
+        """
+        :return: dict with the scan counts, mean scan times and the speedup against scanning every full frame
+        """
+        frames = self.full_scans + self.roi_scans
+        full_ms = 1000.0 * self.full_scan_seconds / self.full_scans if self.full_scans else 0.0
+        frame_ms = (
+            1000.0 * (self.full_scan_seconds + self.roi_scan_seconds) / frames if frames else 0.0
+        )
+        return {
+            "frames": frames,
+            "full_scans": self.full_scans,
+            "roi_scans": self.roi_scans,
+            "full_scan_ms": full_ms,
+            "detection_ms_per_frame": frame_ms,
+            "speedup": full_ms / frame_ms if frame_ms else 1.0,
+        }
+
+
+def _nbytes(value):
+    """
+    size of a number or of a list or tuple and everything it holds
+    :param value:
+    :return: bytes
+    """
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class RecognitionCache:
+    """
+    reuses the recognition of a face while it stays in place: a result is reused for a rectangle overlapping
+    the recognized one by at least min_iou, for at most max_age frames. clear starts a new model generation, a
+    result predicted by an older generation of the model is not stored
+    """
+
+    def __init__(self, min_iou=0.7, max_age=15):
+        self.min_iou = min_iou
+        self.max_age = max_age
+        self._entries = []  # [rect, result, age]
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self):
+        # the entry lists with their rectangle and (label, distance) tuples, numbers included, small ints shared
+        # with the interpreter are counted too
+        return _nbytes(self._entries)
+
+    def next_frame(self):
+        for entry in self._entries:
+            entry[2] += 1
+        self._entries = [entry for entry in self._entries if entry[2] <= self.max_age]
+
+    def lookup(self, rect):
+        for cached_rect, result, _ in self._entries:
+            if detection_utils.intersection_over_union(rect, cached_rect) >= self.min_iou:
+                self.hits += 1
+                return result
+        self.misses += 1
+        return None
+
+    def store(self, rect, result, generation=None):
+        """
+        :param generation: value of generation when the prediction was made, None stores unconditionally
+        """
+        if generation is not None and generation != self.generation:
+            return
+        self._entries = [
+            entry
+            for entry in self._entries
+            if detection_utils.intersection_over_union(rect, entry[0]) < self.min_iou
+        ]
+        self._entries.append([tuple(rect), result, 0])
+
+    def clear(self):
+        self.generation += 1
+        self._entries = []
@@ -0,0 +1,71 @@
+import threading
+
+
+class TripleBuffer:
+    """
+    Hands frames from a producer thread to a consumer without either waiting on the other.
+
+    The producer owns the back buffer, the consumer owns the front buffer and the middle buffer holds the newest
+    finished frame. publish and acquire_front only swap references under the lock, the frames are written and
+    converted outside of it. A frame published before the consumer took the previous one replaces it (a dropped
+    frame), and only the first publish after the consumer was notified asks for a new notification, so the
+    consumer converts only the newest frame however many arrived in between.
+    """
+
+    def __init__(self):
+        self._middle = None
+        self._front = None
+        self._fresh = False  # the middle buffer holds a frame the consumer has not taken yet
+        self._notified = False  # the consumer was notified and has not called acquire_front since
+        self._lock = threading.Lock()
+
+        self.published = 0
+        self.shown = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def publish(self, frame):
+        """
+        called by the producer once frame is complete, frame must not be written afterwards
+        :param frame: finished frame
+        :return: (buffer to write the next frame into, None until all three buffers exist,
+            True if the consumer has to be notified)
+        """
+        with self._lock:
+            if self._fresh:
+                self.dropped += 1
+            frame, self._middle = self._middle, frame
+            self._fresh = True
+            self.published += 1
+            notify = not self._notified
+            if notify:
+                self._notified = True
+            else:
+                self.coalesced += 1
+        return frame, notify
+
+    def acquire_front(self):
+        """
+        called by the consumer, the returned frame stays valid until the next call
+        :return: (newest frame or None before the first publish, True if it was not returned before)
+        """
+        with self._lock:
+            self._notified = False
+            if not self._fresh:
+                return self._front, False
+            self._front, self._middle = self._middle, self._front
+            self._fresh = False
+            self.shown += 1
+            return self._front, True
+
+    def stats(self):
+        """
+        :return: dict with the published, shown and dropped frames and the coalesced notifications
+        """
+        with self._lock:
+            return {
+                "published": self.published,
+                "shown": self.shown,
+                "dropped": self.dropped,
+                "coalesced": self.coalesced,
+            }
@@ -1,12 +1,79 @@
 #!usr/bin/env python
+import argparse
+import os
+import sys
+import tempfile
+
 import wx
 
 import pyinstaller_utils
 from interactive_recognizer import InteractiveRecognizer
+from recognition_loop import RecognitionLoop
+
+# memory_monitor.py is shared with luxocator.py and lives in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import memory_monitor  # noqa: E402
+
+
+def run_soak(recognizer_path, cascade_path, source, duration, max_growth, monitor, train_every=0):
+    """
+    runs the per-frame work of the window headless, through the same RecognitionLoop: detection, the
+    recognition pool, the triple buffer and, when training, the background checkpoints. The model is
+    checkpointed to a temporary directory so the soak test leaves recognizer_path untouched
+    :param source: camera device id or video file, a video file starts over at its end
+    :param train_every: add the face of every n-th frame showing one to the model (as the "Add to model"
+    button does), 0 never
+    :return: soak test report, see memory_monitor.soak_test
+    """
+    with tempfile.TemporaryDirectory() as checkpoint_dir:
+        loop = RecognitionLoop(
+            recognizer_path,
+            cascade_path,
+            camera_device_id=source,
+            checkpoint_path=os.path.join(checkpoint_dir, "lbph_human_faces.xml.gz"),
+            monitor=monitor,
+        )
+        faces = 0
+
+        def step():
+            nonlocal faces
+            if not loop.process_frame():
+                loop.rewind()
+                return
+            # the paint handler of the window takes every frame
+            loop.frame_buffers.acquire_front()
+            if loop.has_face:
+                faces += 1
+                if train_every and faces % train_every == 0:
+                    loop.add_sample(faces // train_every % 16)
+
+        try:
+            return memory_monitor.soak_test(
+                step, duration, max_growth, monitor=monitor, sample_interval=monitor.interval
+            )
+        finally:
+            loop.close()
+            loop.print_report()
+            loop.join()
 
 
 def main():
-    app = wx.App()
+    parser = argparse.ArgumentParser(description="interactive human face recognizer")
+    parser.add_argument("--camera", type=int, default=0)
+    parser.add_argument("--target-fps", type=float, help="lower the detection quality to hold this frame rate")
+    parser.add_argument("--memory-interval", type=float, help="log the memory every n seconds")
+    parser.add_argument(
+        "--memory-trace", type=int, default=0, help="frames traced per allocation, 0 disables tracemalloc"
+    )
+    parser.add_argument("--rss-budget-mb", type=float, help="shed the caches above this RSS")
+    parser.add_argument("--soak", type=float, help="run the loop headless for n seconds and check the RSS")
+    parser.add_argument("--soak-video", help="video file the headless loop reads instead of the camera")
+    parser.add_argument("--soak-max-growth-mb", type=float, default=50.0)
+    parser.add_argument("--soak-train-every", type=int, default=0, help="add every n-th face to the model")
+    args = parser.parse_args()
+    if args.soak is not None and args.soak <= memory_monitor.SOAK_WARMUP:
+        parser.error(f"--soak must be longer than the {memory_monitor.SOAK_WARMUP:g} s warmup")
+
     recognizer_path = pyinstaller_utils.resource_path_resolver(
         "recognizers/lbph_human_faces.xml"
     )
@@ -15,12 +82,42 @@ def main():
     )
     # cascade_path = pyinstaller_utils.resource_path_resolver('cascades/lbpcascades_frontalface.xml')
 
+    monitor = None
+    if args.memory_interval or args.soak:
+        monitor = memory_monitor.MemoryMonitor(
+            args.memory_interval or 10.0,
+            args.rss_budget_mb * 2**20 if args.rss_budget_mb else None,
+            "shed" if args.rss_budget_mb else "log",
+            args.memory_trace,
+        )
+
+    if args.soak:
+        max_growth = args.soak_max_growth_mb * 2**20
+        report = run_soak(
+            recognizer_path,
+            cascade_path,
+            args.soak_video or args.camera,
+            args.soak,
+            max_growth,
+            monitor,
+            args.soak_train_every,
+        )
+        memory_monitor.print_soak_report(report, max_growth)
+        return 0 if report["passed"] else 1
+
+    app = wx.App()
     interactive_recognizer = InteractiveRecognizer(
-        recognizer_path, cascade_path, title="human recognizer app"
+        recognizer_path,
+        cascade_path,
+        camera_device_id=args.camera,
+        title="human recognizer app",
+        target_fps=args.target_fps,
+        monitor=monitor,
     )
     interactive_recognizer.Show()
     app.MainLoop()
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
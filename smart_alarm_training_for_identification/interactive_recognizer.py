@@ -1,14 +1,10 @@
-import os
-import sys
 import threading
 
-import cv2
-import numpy
 import wx
 
 import binascii_utils
-import resize_utils
 import wx_utils
+from recognition_loop import RecognitionLoop
 
 
 class InteractiveRecognizer(wx.Frame):
@@ -30,6 +26,17 @@ class InteractiveRecognizer(wx.Frame):
         camera_device_id=0,
         image_size=(1280, 720),
         title="interactive recognizer",
+        checkpoint_every_samples=10,
+        checkpoint_interval=60.0,
+        compressed_model=True,
+        tracking=True,
+        full_scan_interval=10,
+        roi_margin=0.5,
+        recognition_reuse_frames=15,
+        recognition_threads=4,
+        target_fps=None,
+        quality_bounds=None,
+        monitor=None,
     ):
         """
 
@@ -43,49 +50,55 @@ class InteractiveRecognizer(wx.Frame):
         :param camera_device_id: device ID
         :param image_size: preffered image resolution
         :param title: app name
+        :param checkpoint_every_samples: samples added to the model which trigger a background checkpoint
+        :param checkpoint_interval: seconds after which added samples are checkpointed anyway
+        :param compressed_model: checkpoint to "<recognizer_path>.gz" with base64 histograms, which loads much
+        faster than the plain xml model
+        :param tracking: after a detection only search around the last faces, see FaceTracker
+        :param full_scan_interval: frames after which the whole frame is scanned again while tracking
+        :param roi_margin: margin around the last face searched while tracking, as proportion of the face size
+        :param recognition_reuse_frames: frames for which the recognition of a face staying in place is reused
+        :param recognition_threads: threads predicting the detected faces of a frame in parallel
+        :param target_fps: if given, the detection settings are lowered (and raised again) to hold this frame rate,
+        see QualityController
+        :param quality_bounds: dict with the limits of the lowest quality, see quality_controller.DEFAULT_BOUNDS
+        :param monitor: MemoryMonitor the model and caches are registered with, None for no memory instrumentation
         """
 
-        self.mirrored = True  # defaulted to true as camera feeds of image as intuitive
         self._running = True  # to track the app is running or closing, helpful for cleaning background thread
-        self._capture = cv2.VideoCapture(camera_device_id)
 
-        # resize to preferred dim or capture actual dim
-        size = resize_utils.resize_capture_image(self._capture, image_size)
-        self._image_width, self._image_height = size
-
-        # capture and processing in two separate threads using thread locking (mutex)
-        self._image = None
-        self._gray_image = None
-        self._equalized_gray_image = None
-
-        self._image_from_buffer = None
-        self._image_front_buffer_lock = threading.Lock()
-
-        # detection and recognizer models related variables
-        self._curr_detected_obj = None
-
-        # for older recognizer model file path
-        self._recognizer_path = recognizer_path
-
-        # invoke recognizer model class
-        self._recognizer = cv2.face.LBPHFaceRecognizer_create()
-
-        # read the model file (if exists) into model class
-        if os.path.isfile(self._recognizer_path):
-            self._recognizer.read(self._recognizer_path)
-            self._recognizerTrained = True
-        else:
-            self._recognizerTrained = False
-
-        self._detector = cv2.CascadeClassifier(cascade_path)
-        self._scaleFactor = scale_factor
-        self._minNeighbors = min_neighbor
-        min_image_size = min(self._image_width, self._image_height)
-        self._minSize = (
-            int(min_image_size * min_size_proportion[0]),
-            int(min_image_size * min_size_proportion[1]),
+        # capture and processing run in the background thread, the frames are handed to the paint handler
+        # through the triple buffer of the loop so neither waits for the other
+        self._loop = RecognitionLoop(
+            recognizer_path,
+            cascade_path,
+            scale_factor,
+            min_neighbor,
+            min_size_proportion,
+            rect_color,
+            camera_device_id,
+            image_size,
+            checkpoint_every_samples,
+            checkpoint_interval,
+            compressed_model,
+            tracking=tracking,
+            full_scan_interval=full_scan_interval,
+            roi_margin=roi_margin,
+            recognition_reuse_frames=recognition_reuse_frames,
+            recognition_threads=recognition_threads,
+            target_fps=target_fps,
+            quality_bounds=quality_bounds,
+            monitor=monitor,
+            on_frame=lambda: wx.CallAfter(self._videoPanel.Refresh),
+            on_message=self._show_message,
+            on_detection=lambda detected: wx.CallAfter(self._enable_or_disable_update_model_button),
+            on_model_cleared=lambda: wx.CallAfter(self._clearModelButton.Disable),
         )
-        self._rectColor = rect_color
+        size = self._loop.size
+
+        self._monitor = monitor
+        if monitor is not None:
+            monitor.start()
 
         # setting the GUI widgets (video panel, buttons, label, text field) and set their callbacks
         self._videoPanel = wx.Panel(self, size=size)
@@ -144,7 +157,7 @@ class InteractiveRecognizer(wx.Frame):
         self._clearModelButton = wx.Button(self, label="Clear Model")
         self._clearModelButton.Bind(wx.EVT_BUTTON, self._clear_model)
         if (
-            not self._recognizerTrained
+            not self._loop.trained
         ):  # if model doesnot exist , disable the clear model buttton
             self._clearModelButton.Disable()
 
@@ -178,15 +191,25 @@ class InteractiveRecognizer(wx.Frame):
         :param event:
         :return:
         """
+        # the window disappears right away, it is destroyed once the model is written
+        self.Hide()
         self._running = False
         self._captureThread.join()
-        if self._recognizerTrained:
-            model_dir = os.path.dirname(self._recognizer_path)
-            if not os.path.isdir(self._recognizer_path):
-                os.makedirs(model_dir)
-            self._recognizer.write(self._recognizer_path)
+        # the checkpointer thread rewrites the whole model once more if samples were added since its last
+        # checkpoint, while the report is printed
+        self._loop.close()
+        if self._monitor is not None:
+            self._monitor.stop()
+        self._loop.print_report()
+        self._loop.join()
         self.Destroy()
 
+    def quality_state(self):
+        """
+        :return: current decisions and achieved frame rate of the quality controller, None without target_fps
+        """
+        return self._loop.quality_state()
+
     def _on_quit_command(self, event):
         """
         callback method to close the window and attaches the Esc
@@ -215,125 +238,32 @@ class InteractiveRecognizer(wx.Frame):
         # get label from
         label_as_str = self._referenceTextCtrl.GetValue()
         label_as_int = binascii_utils.four_char_to_int(label_as_str)
-        src = [self._curr_detected_obj]
-        labels = numpy.array([label_as_int])
-
-        # check if model exist using the trained model flag
-        if self._recognizerTrained:
-            self._recognizer.update(src, labels)
-        else:
-            self._recognizer.train(src, labels)
-            self._recognizerTrained = True
+        if self._loop.add_sample(label_as_int):
             # enable clear model here
-            self._clearModelButton.Disable()
+            self._clearModelButton.Enable()
 
     def _clear_model(self, event=None):
         """
         the callback method will delete the existing model and creates a new one and disable the delete button
         :return:
         """
-        self._recognizerTrained = False
-        self._clearModelButton.Disable()
-        if os.path.isfile(self._recognizer_path):
-            os.remove(self._recognizer_path)
-        self._recognizer = (
-            cv2.face.LBPHFaceRecognizer_create()
-        )  # create the new untrained model
+        self._loop.clear_model()
 
     def run_capture_loop(self):
         """
         this method is used to run async loop in the background which capture the image and detect & recognize
-        the image and present to the GUI.
-        then swapping of old buffer and new buffer image happens by acquiring mutex
+        the image and present to the GUI, see RecognitionLoop.process_frame
         :return:
         """
         while self._running:
-            success, self._image = self._capture.read(self._image)
-            if self._image is not None:
-                self._detect_and_recognize()
-                if self.mirrored:
-                    # flip the image i.e. mirror the image
-                    self._image[:] = numpy.fliplr(self._image)
-
-                    # swapping the image captured to front buffer and front to back buffer
-                    self._image_front_buffer_lock.acquire()
-                    self._image, self._image_from_buffer = (
-                        self._image_from_buffer,
-                        self._image,
-                    )
-
-                    # release the lock
-                    self._image_front_buffer_lock.release()
-
-                    # the image is drawn from the video into the front buffer
-                    # send a refresh event to the video panel
-                    self._videoPanel.Refresh()
-
-    def _detect_and_recognize(self):
-        """
-        helper method which runs in the background thread and helps in detecting face
-        using grayscale to create uniformity of image by removing the colored into gray scale
-        :return:
-        """
-        self._gray_image = cv2.cvtColor(
-            self._image, cv2.COLOR_BGR2GRAY, self._gray_image
-        )
-        self._equalized_gray_image = cv2.equalizeHist(
-            self._gray_image, self._equalized_gray_image
-        )
-
-        # using Multiscale method to detect face and use green rectangle as boundary
-        # return a list of rectangles which shows the bound of face
-        detct = self._detector.detectMultiScale(
-            self._equalized_gray_image,
-            scaleFactor=self._scaleFactor,
-            min_neighbor=self._minNeighbors,
-            minSize=self._minSize,
-        )
-
-        for x, y, w, h in detct:
-            cv2.rectangle(self._image, (x, y), (x + w, y + h), self._rectColor, 1)
-
-        if len(detct) > 0:
-            x, y, w, h = detct[0]
-            # if atleast one face is detected, store detected face in equalized gray scale
-            # equalized image is based on the cropped image for better avg local contrast instead of whole image
-            self._curr_detected_obj = cv2.equalizeHist(
-                self._gray_image[y : y + h, x : x + w]
-            )
-
-            # if model exist even for 1 image trained, then model will return 2 integer name and distance (confidence value)
-            if self._recognizerTrained:
-                try:
-                    label_as_int, distance = self._recognizer.predict(
-                        self._curr_detected_obj
-                    )
-                    label_as_str = binascii_utils.int_to_four_char(label_as_int)
-                    self._show_message(
-                        f"Looks similar to the image :{label_as_str} and distance is : {distance}"
-                    )
-                except cv2.error:
-                    print >> sys.stderr, "recreating model due to err"
-                    self._clear_model()
-
-            else:
-                self._show_instructions()
-        else:
-            self._curr_detected_obj = None  # set current object detected to None
-            if self._recognizerTrained:  # if model exist then print message on screen
-                self._clear_message()
-            else:  # show instructions
-                self._show_instructions()
-
-        # adding the enable/disable add to model button
-        self._enable_or_disable_update_model_button()
+            self._loop.process_frame()
 
     def _enable_or_disable_update_model_button(self):
         """this method is implemented based on the image is detected, if detected and text box is not empty
         then show enable the button
         """
         label_as_str = self._referenceTextCtrl.GetValue()
-        if len(label_as_str) < 1 or self._curr_detected_obj is None:
+        if len(label_as_str) < 1 or not self._loop.has_face:
             self._updateModelButton.Disable()  # implemented all button in the app initiation
         else:
             self._updateModelButton.Enable()
@@ -344,33 +274,20 @@ class InteractiveRecognizer(wx.Frame):
 
     def _on_video_panel_paint(self, event):
         """
-        In thread safe manner - use the front image buffer and convert it into bitmap and finally show it to GUI
+        take the newest frame from the triple buffer and convert it into bitmap and finally show it to GUI, a paint
+        without a new frame redraws the last bitmap
         """
-        self._image_front_buffer_lock.acquire()
-        if self._image_from_buffer is None:
-            self._image_front_buffer_lock.release()
+        frame, is_new = self._loop.frame_buffers.acquire_front()
+        if frame is None:
             return
-        # Convert the image into wxPython bitmap
-        self._videoBitmap = wx_utils.convert_color_fromcv2_towx(self._image_from_buffer)
-
-        self._image_front_buffer_lock.release()
+        if is_new or self._videoBitmap is None:
+            # Convert the image into wxPython bitmap, the capture thread never writes the front buffer
+            self._videoBitmap = wx_utils.convert_color_fromcv2_towx(frame)
 
         # Show the bitmap
         dc = wx.BufferedPaintDC(self._videoPanel)
         dc.DrawBitmap(self._videoBitmap, 0, 0)
 
-    # helper methods to show message
-    def _show_instructions(self):
-        """"""
-        self._show_message(
-            "when object is highlighted, input the name max four chars \n"
-            "and click add to model"
-        )
-
-    def _clear_message(self):
-        """"""
-        self._show_message("\n")
-
     def _show_message(self, message):
         """"""
-        wx.CallAfter(self._predictionStaticText, message)
+        wx.CallAfter(self._predictionStaticText.SetLabel, message)
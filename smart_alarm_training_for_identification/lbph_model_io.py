@@ -0,0 +1,135 @@
+import os
+import tempfile
+
+import cv2
+import numpy
+
+# top level node name used by cv2.face.LBPHFaceRecognizer when it writes the model file
+LBPH_NODE_NAME = "opencv_lbphfaces"
+
+
+def get_model_params(recognizer):
+    """
+    utility method to read the LBPH parameters which have to be kept when the model is rebuilt
+    :param recognizer: cv2.face.LBPHFaceRecognizer
+    :return: dict of radius, neighbors, grid_x, grid_y and threshold
+    """
+    return {
+        "radius": recognizer.getRadius(),
+        "neighbors": recognizer.getNeighbors(),
+        "grid_x": recognizer.getGridX(),
+        "grid_y": recognizer.getGridY(),
+        "threshold": recognizer.getThreshold(),
+    }
+
+
+def get_model_samples(recognizer):
+    """
+    utility method to copy the stored LBP histograms and their labels out of the trained model
+    :param recognizer: trained cv2.face.LBPHFaceRecognizer
+    :return: (histograms as float32 array of shape (n, d), labels as int32 array of shape (n,))
+    """
+    histograms = recognizer.getHistograms()
+    labels = numpy.asarray(recognizer.getLabels(), numpy.int32).reshape(-1)
+    if len(histograms) == 0:
+        return numpy.zeros((0, 0), numpy.float32), labels
+    histograms = numpy.vstack(
+        [numpy.asarray(hist, numpy.float32).reshape(1, -1) for hist in histograms]
+    )
+    return histograms, labels
+
+
+def model_nbytes(recognizer):
+    """
+    bytes of the float32 LBP histograms held by a trained model, computed from its parameters and sample count
+    without copying the histograms
+    :param recognizer: trained cv2.face.LBPHFaceRecognizer
+    :return: int
+    """
+    samples = len(recognizer.getLabels())
+    bins = 2 ** recognizer.getNeighbors()
+    return samples * recognizer.getGridX() * recognizer.getGridY() * bins * 4
+
+
+def write_model(path, params, histograms, labels, binary=False):
+    """
+    writes the LBPH model in the same layout as LBPHFaceRecognizer.write, so it can be read back with
+    LBPHFaceRecognizer.read
+    :param path: output path, a ".gz" suffix makes opencv compress the file
+    :param params: dict as returned by get_model_params
+    :param histograms: float32 array of shape (n, d)
+    :param labels: int array of shape (n,)
+    :param binary: store the histograms base64 encoded, which is much faster to parse than text floats
+    :return: None
+    """
+    flags = cv2.FILE_STORAGE_WRITE
+    if binary:
+        flags |= cv2.FILE_STORAGE_BASE64
+    fs = cv2.FileStorage(path, flags)
+    fs.startWriteStruct(LBPH_NODE_NAME, cv2.FILE_NODE_MAP)
+    fs.write("threshold", float(params["threshold"]))
+    fs.write("radius", int(params["radius"]))
+    fs.write("neighbors", int(params["neighbors"]))
+    fs.write("grid_x", int(params["grid_x"]))
+    fs.write("grid_y", int(params["grid_y"]))
+
+    fs.startWriteStruct("histograms", cv2.FILE_NODE_SEQ)
+    for hist in histograms:
+        fs.write("", numpy.asarray(hist, numpy.float32).reshape(1, -1))
+    fs.endWriteStruct()
+
+    fs.write("labels", numpy.asarray(labels, numpy.int32).reshape(-1, 1))
+    fs.startWriteStruct("labelsInfo", cv2.FILE_NODE_SEQ)
+    fs.endWriteStruct()
+    fs.endWriteStruct()
+    fs.release()
+
+
+def storage_suffix(path):
+    """
+    file suffix opencv uses to pick the storage format, including a trailing ".gz" (e.g. ".xml.gz")
+    """
+    root, suffix = os.path.splitext(path)
+    if suffix == ".gz":
+        suffix = os.path.splitext(root)[1] + suffix
+    return suffix
+
+
+def write_model_atomically(path, params, histograms, labels, binary=False):
+    """
+    writes the model to a temporary file next to path and renames it over path, so a crash while writing
+    never leaves a truncated model behind
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix=storage_suffix(path), dir=directory)
+    os.close(fd)
+    try:
+        write_model(tmp_path, params, histograms, labels, binary)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def build_recognizer(params, histograms, labels):
+    """
+    creates a new LBPH recognizer holding exactly the given histograms, without recomputing them from images
+    :return: cv2.face.LBPHFaceRecognizer
+    """
+    recognizer = cv2.face.LBPHFaceRecognizer_create(
+        params["radius"],
+        params["neighbors"],
+        params["grid_x"],
+        params["grid_y"],
+        params["threshold"],
+    )
+    fd, tmp_path = tempfile.mkstemp(suffix=".xml")
+    os.close(fd)
+    try:
+        write_model(tmp_path, params, histograms, labels, binary=True)
+        recognizer.read(tmp_path)
+    finally:
+        os.remove(tmp_path)
+    return recognizer
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy
+
+import binascii_utils
+import lbph_model_io
+
+
+def chi_square_distances(samples, reference):
+    """
+    chi square distance between every row of samples and the reference histogram, the same measure
+    LBPHFaceRecognizer.predict uses to find the nearest sample
+    :param samples: float32 array of shape (n, d)
+    :param reference: float32 array of shape (d,)
+    :return: float array of shape (n,)
+    """
+    diff = (samples - reference) ** 2
+    total = samples + reference
+    ratio = numpy.divide(diff, total, out=numpy.zeros_like(diff), where=total > 0)
+    return 2.0 * ratio.sum(axis=1)
+
+
+def select_prototypes(samples, max_count, outlier_quantile=0.9):
+    """
+    pick at most max_count rows of samples which represent the label well and are different from each other.
+    The first prototype is the sample closest to the label mean, the next ones are picked by farthest point
+    sampling, ignoring samples beyond outlier_quantile of the distance to the mean (bad crops) while possible
+    :param samples: float32 array of shape (n, d) of a single label
+    :param max_count: max number of prototypes to keep
+    :param outlier_quantile: quantile of the distance to the mean above which samples are picked last
+    :return: sorted list of row indices
+    """
+    count = len(samples)
+    if count <= max_count:
+        return list(range(count))
+
+    dist_to_mean = chi_square_distances(samples, samples.mean(axis=0))
+    eligible = dist_to_mean <= numpy.quantile(dist_to_mean, outlier_quantile)
+    if eligible.sum() < max_count:
+        eligible[:] = True
+
+    chosen = [int(numpy.argmin(dist_to_mean))]
+    min_dist = chi_square_distances(samples, samples[chosen[0]])
+    while len(chosen) < max_count:
+        candidates = numpy.where(eligible, min_dist, -1.0)
+        candidates[chosen] = -1.0
+        next_index = int(numpy.argmax(candidates))
+        chosen.append(next_index)
+        min_dist = numpy.minimum(
+            min_dist, chi_square_distances(samples, samples[next_index])
+        )
+    return sorted(chosen)
+
+
+def prune_recognizer(recognizer, max_samples_per_label, outlier_quantile=0.9):
+    """
+    caps the number of stored samples per label so that predict cost stays bounded
+    :param recognizer: trained cv2.face.LBPHFaceRecognizer
+    :param max_samples_per_label: samples kept for each label
+    :param outlier_quantile: see select_prototypes
+    :return: (new pruned recognizer, dict of label -> (samples before, samples after))
+    """
+    params = lbph_model_io.get_model_params(recognizer)
+    histograms, labels = lbph_model_io.get_model_samples(recognizer)
+
+    keep = []
+    summary = {}
+    for label in numpy.unique(labels):
+        rows = numpy.flatnonzero(labels == label)
+        selected = select_prototypes(
+            histograms[rows], max_samples_per_label, outlier_quantile
+        )
+        keep.extend(rows[selected])
+        summary[int(label)] = (len(rows), len(selected))
+
+    keep = numpy.sort(numpy.asarray(keep, numpy.int64))
+    pruned = lbph_model_io.build_recognizer(params, histograms[keep], labels[keep])
+    return pruned, summary
+
+
+def load_crops(directory):
+    """
+    reads the held-out face crops as gray scale images, sub folder names are used as (four char) labels if present
+    :param directory: folder of crops, optionally with one sub folder per label
+    :return: list of (path, image, label or None)
+    """
+    crops = []
+    for root, _, files in os.walk(directory):
+        label = None
+        if os.path.abspath(root) != os.path.abspath(directory):
+            label = os.path.basename(root)
+        for file in sorted(files):
+            path = os.path.join(root, file)
+            image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                continue
+            crops.append((path, cv2.equalizeHist(image), label))
+    return crops
+
+
+def predict_all(recognizer, crops):
+    """
+    runs predict on every crop
+    :return: (list of predicted int labels, list of predict durations in seconds)
+    """
+    predictions = []
+    durations = []
+    for _, image, _ in crops:
+        start = time.perf_counter()
+        label_as_int, _ = recognizer.predict(image)
+        durations.append(time.perf_counter() - start)
+        predictions.append(label_as_int)
+    return predictions, durations
+
+
+def compare_recognizers(original, pruned, crops):
+    """
+    reports the predict latency of both models and how often the pruned model agrees with the original one
+    :return: dict with the report values
+    """
+    original_labels, original_times = predict_all(original, crops)
+    pruned_labels, pruned_times = predict_all(pruned, crops)
+    agreement = numpy.mean(numpy.equal(original_labels, pruned_labels))
+    report = {
+        "crops": len(crops),
+        "original_ms": 1000.0 * numpy.mean(original_times),
+        "pruned_ms": 1000.0 * numpy.mean(pruned_times),
+        "agreement": float(agreement),
+    }
+
+    labelled = [i for i, crop in enumerate(crops) if crop[2] is not None]
+    if labelled:
+        expected = [binascii_utils.four_char_to_int(crops[i][2]) for i in labelled]
+        report["original_accuracy"] = float(
+            numpy.mean(numpy.equal([original_labels[i] for i in labelled], expected))
+        )
+        report["pruned_accuracy"] = float(
+            numpy.mean(numpy.equal([pruned_labels[i] for i in labelled], expected))
+        )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="cap the samples per label of an LBPH model and retrain it from the kept prototypes"
+    )
+    parser.add_argument("model", help="LBPH model file written by the interactive recognizer")
+    parser.add_argument("--max-samples-per-label", type=int, default=20)
+    parser.add_argument("--outlier-quantile", type=float, default=0.9)
+    parser.add_argument("--held-out", help="folder of face crops used to compare the models")
+    parser.add_argument("--output", help="pruned model path, defaults to <model>.pruned.xml")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.model):
+        sys.stderr.write(f"model not found: {args.model}\n")
+        return 1
+
+    original = cv2.face.LBPHFaceRecognizer_create()
+    original.read(args.model)
+    pruned, summary = prune_recognizer(
+        original, args.max_samples_per_label, args.outlier_quantile
+    )
+
+    for label_as_int, (before, after) in sorted(summary.items()):
+        label_as_str = binascii_utils.int_to_four_char(label_as_int)
+        print(f"label {label_as_str}: {before} -> {after} samples")
+
+    if args.held_out:
+        report = compare_recognizers(original, pruned, load_crops(args.held_out))
+        print(
+            f"predict latency: {report['original_ms']:.2f} ms -> {report['pruned_ms']:.2f} ms "
+            f"over {report['crops']} crops"
+        )
+        print(f"label agreement with the original model: {report['agreement']:.1%}")
+        if "original_accuracy" in report:
+            print(
+                f"accuracy: {report['original_accuracy']:.1%} -> {report['pruned_accuracy']:.1%}"
+            )
+
+    output = args.output or os.path.splitext(args.model)[0] + ".pruned.xml"
+    pruned.write(output)
+    print(f"pruned model written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+import time
+
+import lbph_model_io
+
+
+class ModelCheckpointer:
+    """
+    Writes the LBPH model from a background thread, atomically (temporary file renamed over the model).
+
+    A checkpoint is written once every_samples samples were added since the last one, or every interval
+    seconds while samples are pending. Every checkpoint writes the whole model, not only the pending samples.
+    The model is copied by the snapshot callable, so the recognizer is only locked while its histograms are
+    copied, never while the file is written. The final checkpoint of stop is written by the background thread
+    as well.
+    """
+
+    def __init__(self, snapshot, path, every_samples=10, interval=60.0, binary=True):
+        """
+        :param snapshot: callable returning (params, histograms, labels) of the current model or None if untrained
+        :param path: model file, a ".gz" suffix makes it compressed
+        :param every_samples: samples which trigger a checkpoint
+        :param interval: seconds after which pending samples are checkpointed
+        :param binary: store the histograms base64 encoded, which loads much faster than text
+        """
+        self._snapshot = snapshot
+        self._path = path
+        self._every_samples = every_samples
+        self._interval = interval
+        self._binary = binary
+        self._pending = 0
+        self._counter_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = True
+        self._final_checkpoint = False
+        self.checkpoints = 0
+        self.last_checkpoint_seconds = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def path(self):
+        return self._path
+
+    def sample_added(self, count=1):
+        with self._counter_lock:
+            self._pending += count
+            if self._pending >= self._every_samples:
+                self._wakeup.set()
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self._interval)
+            self._wakeup.clear()
+            if self._running and self._pending > 0:
+                self.checkpoint()
+        if self._final_checkpoint and self._pending > 0:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        writes the model now, in the calling thread
+        :return: True if a model was written
+        """
+        with self._write_lock:
+            with self._counter_lock:
+                pending = self._pending
+            model = self._snapshot()
+            if model is None:
+                return False
+
+            start = time.perf_counter()
+            try:
+                lbph_model_io.write_model_atomically(self._path, *model, binary=self._binary)
+            except Exception as e:
+                sys.stderr.write(f"model checkpoint failed: {e}\n")
+                return False
+            self.last_checkpoint_seconds = time.perf_counter() - start
+            self.checkpoints += 1
+
+            with self._counter_lock:
+                self._pending -= pending
+            return True
+
+    def discard(self, paths=()):
+        """
+        forgets the pending samples and removes the model files, waiting for a running checkpoint first so that
+        it cannot write the discarded model back
+        """
+        with self._write_lock:
+            with self._counter_lock:
+                self._pending = 0
+            for path in (self._path,) + tuple(paths):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def stop(self, final_checkpoint=True, wait=True):
+        """
+        stops the background thread, which rewrites the model once more first if final_checkpoint and samples
+        are pending
+        :param wait: wait for the thread to finish, otherwise call join before the process exits
+        """
+        self._final_checkpoint = final_checkpoint
+        self._running = False
+        self._wakeup.set()
+        if wait:
+            self.join()
+
+    def join(self):
+        """
+        waits until the background thread (and its final checkpoint) finished
+        """
+        self._thread.join()
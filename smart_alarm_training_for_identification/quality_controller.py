@@ -0,0 +1,155 @@
+import threading
+
+# limits of the cheapest quality level, each knob degrades from the configured settings towards its limit
+DEFAULT_BOUNDS = {
+    "min_detection_scale": 0.5,
+    "max_scale_factor": 1.5,
+    "max_min_size_scale": 1.5,
+    "max_detect_interval": 3,
+    "max_recognition_reuse_scale": 4,
+}
+
+
+def build_ladder(scale_factor, min_size, recognition_reuse_frames, bounds=None):
+    """
+    builds the quality levels from the configured detection settings down to the bounds. Every level degrades one
+    knob further, the ones costing the least accuracy first: reusing recognitions longer, then a smaller
+    detection image, a coarser pyramid, detecting on fewer frames and finally ignoring small faces
+    :param scale_factor: configured detectMultiScale scale factor
+    :param min_size: configured min face size in pixels
+    :param recognition_reuse_frames: configured frames a recognition is reused for
+    :param bounds: dict overriding DEFAULT_BOUNDS
+    :return: list of dicts with detection_scale, scale_factor, min_size, detect_interval and
+        recognition_reuse_frames, from the best to the cheapest level
+    """
+    limits = dict(DEFAULT_BOUNDS)
+    limits.update(bounds or {})
+
+    level = {
+        "detection_scale": 1.0,
+        "scale_factor": scale_factor,
+        "min_size": tuple(min_size),
+        "detect_interval": 1,
+        "recognition_reuse_frames": recognition_reuse_frames,
+    }
+    max_scale_factor = max(scale_factor, limits["max_scale_factor"])
+    max_reuse = int(recognition_reuse_frames * limits["max_recognition_reuse_scale"])
+    steps = [
+        ("recognition_reuse_frames", int(recognition_reuse_frames * 2)),
+        ("detection_scale", max(limits["min_detection_scale"], 0.75)),
+        ("scale_factor", round((scale_factor + max_scale_factor) / 2.0, 2)),
+        ("detect_interval", min(2, limits["max_detect_interval"])),
+        ("detection_scale", limits["min_detection_scale"]),
+        ("scale_factor", max_scale_factor),
+        ("recognition_reuse_frames", max_reuse),
+        ("detect_interval", limits["max_detect_interval"]),
+        (
+            "min_size",
+            tuple(int(side * limits["max_min_size_scale"]) for side in min_size),
+        ),
+    ]
+
+    ladder = [dict(level)]
+    for key, value in steps:
+        # a smaller detection image is cheaper, every other knob is cheaper when larger
+        degrades = value < level[key] if key == "detection_scale" else value > level[key]
+        if degrades:
+            level[key] = value
+            ladder.append(dict(level))
+    return ladder
+
+
+class QualityController:
+    """
+    Holds a target frame rate by moving along a ladder of detection settings.
+
+    The loop reports the processing time of every frame to frame_done, which keeps an exponential moving
+    average. When the average exceeds the frame budget (1 / target_fps) for settle_frames frames the next
+    cheaper level is used, when it stays below headroom of the budget for twice as long the next better level is
+    tried again. An upgrade which had to be reverted doubles the wait before the next one, so the level does not
+    oscillate.
+
+    The processing time excludes the wait for the camera: a loop bound by a camera delivering about target_fps
+    frames could never get below headroom of the budget, so its level would only ever go down. The whole frame
+    time, capture included, is only used for the achieved frame rate.
+    """
+
+    def __init__(self, target_fps, ladder, smoothing=0.1, headroom=0.7, settle_frames=15):
+        self.target_fps = target_fps
+        self._ladder = ladder
+        self._smoothing = smoothing
+        self._headroom = headroom
+        self._settle_frames = settle_frames
+        self._level = 0
+        self._average = None
+        self._frame_average = None
+        self._frames_since_change = 0
+        self._upgrade_frames = 2 * settle_frames
+        self._last_change_was_upgrade = False
+        self._lock = threading.Lock()
+        self.changes = 0
+
+    @property
+    def level(self):
+        return self._level
+
+    @property
+    def settings(self):
+        return self._ladder[self._level]
+
+    @property
+    def fps(self):
+        # achieved frame rate, from the average frame time
+        average = self._frame_average
+        return 1.0 / average if average else 0.0
+
+    def _smoothed(self, average, seconds):
+        return seconds if average is None else average + self._smoothing * (seconds - average)
+
+    def frame_done(self, seconds, frame_seconds=None):
+        """
+        :param seconds: time spent processing the frame which just finished, from the end of its capture
+        :param frame_seconds: duration of the whole frame including the capture, defaults to seconds
+        :return: True if the settings changed
+        """
+        with self._lock:
+            self._average = self._smoothed(self._average, seconds)
+            self._frame_average = self._smoothed(
+                self._frame_average, seconds if frame_seconds is None else frame_seconds
+            )
+            self._frames_since_change += 1
+
+            budget = 1.0 / self.target_fps
+            level = self._level
+            if self._frames_since_change >= self._settle_frames and self._average > budget:
+                level = min(len(self._ladder) - 1, level + 1)
+            elif (
+                self._frames_since_change >= self._upgrade_frames
+                and self._average < self._headroom * budget
+            ):
+                level = max(0, level - 1)
+
+            if level == self._level:
+                return False
+            upgrade = level < self._level
+            if not upgrade and self._last_change_was_upgrade:
+                self._upgrade_frames = min(64 * self._settle_frames, 2 * self._upgrade_frames)
+            self._last_change_was_upgrade = upgrade
+            self._level = level
+            self._frames_since_change = 0
+            self.changes += 1
+            return True
+
+    def state(self):
+        """
+        :return: dict with the level, its settings, the achieved and target frame rate and the number of changes
+        """
+        with self._lock:
+            return {
+                "level": self._level,
+                "levels": len(self._ladder),
+                "settings": dict(self._ladder[self._level]),
+                "fps": self.fps,
+                "target_fps": self.target_fps,
+                "changes": self.changes,
+            }
@@ -0,0 +1,445 @@
+import concurrent.futures
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy
+
+import binascii_utils
+import detection_utils
+import lbph_model_io
+import resize_utils
+from face_tracker import FaceTracker, RecognitionCache
+from frame_buffers import TripleBuffer
+from model_checkpointer import ModelCheckpointer
+from quality_controller import QualityController, build_ladder
+
+
+def _ignore(*args):
+    pass
+
+
+class RecognitionLoop:
+    """
+    The per-frame work of the interactive recognizer without its window: capture, detection, recognition of
+    the faces on a thread pool, labels, frame rate control, publishing to a triple buffer and training the
+    model with background checkpoints. The window and the headless soak test both call process_frame for every
+    frame.
+
+    The window is told about the frames and the model through callbacks, they are called on the thread calling
+    process_frame (or clear_model) and must not touch widgets directly
+    """
+
+    def __init__(
+        self,
+        recognizer_path,
+        cascade_path,
+        scale_factor=1.3,
+        min_neighbor=4,
+        min_size_proportion=(0.25, 0.25),
+        rect_color=(0, 255, 0),
+        camera_device_id=0,
+        image_size=(1280, 720),
+        checkpoint_every_samples=10,
+        checkpoint_interval=60.0,
+        compressed_model=True,
+        checkpoint_path=None,
+        tracking=True,
+        full_scan_interval=10,
+        roi_margin=0.5,
+        recognition_reuse_frames=15,
+        recognition_threads=4,
+        target_fps=None,
+        quality_bounds=None,
+        monitor=None,
+        on_frame=_ignore,
+        on_message=_ignore,
+        on_detection=_ignore,
+        on_model_cleared=_ignore,
+    ):
+        """
+        see InteractiveRecognizer for the detection, recognition and checkpoint parameters
+        :param camera_device_id: device ID or video file
+        :param checkpoint_path: file the model is checkpointed to instead of recognizer_path (or
+        "<recognizer_path>.gz"), clearing the model then leaves recognizer_path in place
+        :param monitor: MemoryMonitor the model and caches are registered with, None for no memory
+        instrumentation
+        :param on_frame: called without arguments when a frame was published and the front buffer was taken
+        :param on_message: called with the message to show below the video
+        :param on_detection: called with True if a face can be added to the model, False if not
+        :param on_model_cleared: called without arguments when the model was cleared
+        """
+        self.mirrored = True  # defaulted to true as camera feeds of image as intuitive
+        self._capture = cv2.VideoCapture(camera_device_id)
+
+        # resize to preferred dim or capture actual dim
+        self.size = resize_utils.resize_capture_image(self._capture, image_size)
+
+        # the frames are handed to the window through a triple buffer so neither waits for the other
+        self._image = None
+        self._gray_image = None
+        self._equalized_gray_image = None
+        self.frame_buffers = TripleBuffer()
+
+        self._on_frame = on_frame
+        self._on_message = on_message
+        self._on_detection = on_detection
+        self._on_model_cleared = on_model_cleared
+
+        # detection and recognizer models related variables
+        self._curr_detected_obj = None
+        self._faces = []  # (rect, label as str or None, distance or None) of every face of the last frame
+
+        # for older recognizer model file path
+        self._recognizer_path = recognizer_path
+        self._discarded_paths = (recognizer_path,)
+        if checkpoint_path is None:
+            checkpoint_path = recognizer_path
+            if compressed_model and not recognizer_path.endswith(".gz"):
+                checkpoint_path = recognizer_path + ".gz"
+        else:
+            self._discarded_paths = ()
+
+        # invoke recognizer model class, the lock guards it against the capture and checkpoint threads
+        self._recognizer = cv2.face.LBPHFaceRecognizer_create()
+        self._recognizer_lock = threading.Lock()
+
+        # read the newest model file (if exists) into model class
+        model_paths = [path for path in (checkpoint_path, recognizer_path) if os.path.isfile(path)]
+        if model_paths:
+            self._recognizer.read(max(model_paths, key=os.path.getmtime))
+            self.trained = True
+        else:
+            self.trained = False
+
+        self._checkpointer = ModelCheckpointer(
+            self._snapshot_model,
+            checkpoint_path,
+            checkpoint_every_samples,
+            checkpoint_interval,
+            binary=compressed_model,
+        )
+
+        self._detector = cv2.CascadeClassifier(cascade_path)
+        self._scaleFactor = scale_factor
+        self._minNeighbors = min_neighbor
+        self._minSize = detection_utils.min_size_from_proportion(self.size, min_size_proportion)
+        self._tracker = FaceTracker(
+            self._detector,
+            self._scaleFactor,
+            self._minNeighbors,
+            self._minSize,
+            tracking,
+            full_scan_interval,
+            roi_margin,
+        )
+        self._recognitionCache = RecognitionCache(max_age=recognition_reuse_frames)
+        # cv2 releases the GIL while predicting, so the faces of a frame are recognized in parallel
+        self._recognitionPool = concurrent.futures.ThreadPoolExecutor(recognition_threads)
+        self._rectColor = rect_color
+
+        # optional frame rate control, detection runs on every _detectInterval-th frame
+        self._detectInterval = 1
+        self._frameIndex = 0
+        self._lastFrameEnd = time.perf_counter()
+        self._qualityController = None
+        if target_fps:
+            self._qualityController = QualityController(
+                target_fps,
+                build_ladder(self._scaleFactor, self._minSize, recognition_reuse_frames, quality_bounds),
+            )
+
+        if monitor is not None:
+            monitor.register_cache("lbph_model", self._model_bytes)
+            monitor.register_cache(
+                "recognition_cache",
+                lambda: self._recognitionCache.nbytes,
+                shed=self._recognitionCache.clear,
+            )
+
+    @property
+    def has_face(self):
+        """
+        :return: True if the last frame has a face which add_sample can add to the model
+        """
+        return self._curr_detected_obj is not None
+
+    def close(self):
+        """
+        starts the final checkpoint on the checkpointer thread if the model is trained, and shuts down the
+        recognition pool and the capture. call after the last process_frame, then join
+        :return:
+        """
+        self._checkpointer.stop(final_checkpoint=self.trained, wait=False)
+        self._recognitionPool.shutdown()
+        self._capture.release()
+
+    def join(self):
+        """
+        waits until the final checkpoint is written
+        :return:
+        """
+        self._checkpointer.join()
+
+    def rewind(self):
+        """
+        starts a video file over
+        :return:
+        """
+        self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def print_report(self):
+        """
+        prints how much detection time the tracking saved against scanning every full frame, the reused
+        recognitions, the quality decisions and the frames shown
+        :return:
+        """
+        stats = self._tracker.stats()
+        cache = self._recognitionCache
+        print(
+            f"detection: {stats['frames']} frames, {stats['full_scans']} full scans "
+            f"({stats['full_scan_ms']:.1f} ms each), {stats['roi_scans']} tracked, "
+            f"{stats['detection_ms_per_frame']:.1f} ms per frame, {stats['speedup']:.1f}x faster than full scans"
+        )
+        print(f"recognition: {cache.hits} reused, {cache.misses} predicted")
+        if self._qualityController is not None:
+            quality = self._qualityController.state()
+            print(
+                f"quality: level {quality['level']} of {quality['levels'] - 1}, {quality['fps']:.1f} fps "
+                f"(target {quality['target_fps']}), {quality['changes']} changes, {quality['settings']}"
+            )
+        frames = self.frame_buffers.stats()
+        print(
+            f"display: {frames['published']} frames, {frames['shown']} shown, {frames['dropped']} dropped, "
+            f"{frames['coalesced']} refreshes coalesced"
+        )
+
+    def quality_state(self):
+        """
+        :return: current decisions and achieved frame rate of the quality controller, None without target_fps
+        """
+        if self._qualityController is None:
+            return None
+        return self._qualityController.state()
+
+    def _apply_quality_settings(self):
+        """
+        moves the detection and recognition settings to the current level of the quality controller
+        :return:
+        """
+        settings = self._qualityController.settings
+        self._tracker.detection_scale = settings["detection_scale"]
+        self._tracker.scale_factor = settings["scale_factor"]
+        self._tracker.min_size = settings["min_size"]
+        self._recognitionCache.max_age = settings["recognition_reuse_frames"]
+        self._detectInterval = settings["detect_interval"]
+
+    def _model_bytes(self):
+        """
+        bytes of the LBP histograms stored in the model, it grows with every sample added
+        :return:
+        """
+        with self._recognizer_lock:
+            if not self.trained:
+                return 0
+            return lbph_model_io.model_nbytes(self._recognizer)
+
+    def _snapshot_model(self):
+        """
+        copies the model for the checkpointer, holding the recognizer lock only while copying
+        :return: (params, histograms, labels) or None if the model is not trained
+        """
+        with self._recognizer_lock:
+            if not self.trained:
+                return None
+            params = lbph_model_io.get_model_params(self._recognizer)
+            histograms, labels = lbph_model_io.get_model_samples(self._recognizer)
+        return params, histograms, labels
+
+    def add_sample(self, label_as_int):
+        """
+        trains the model with the first face of the last frame, or updates it if it is trained already
+        :param label_as_int: label of the face
+        :return: False if the last frame has no face
+        """
+        src = self._curr_detected_obj
+        if src is None:
+            return False
+        labels = numpy.array([label_as_int])
+
+        # check if model exist using the trained model flag
+        with self._recognizer_lock:
+            if self.trained:
+                self._recognizer.update([src], labels)
+            else:
+                self._recognizer.train([src], labels)
+                self.trained = True
+            self._recognitionCache.clear()
+        self._checkpointer.sample_added()
+        return True
+
+    def clear_model(self):
+        """
+        deletes the existing model and its files and starts a new untrained one
+        :return:
+        """
+        with self._recognizer_lock:
+            self.trained = False
+            self._recognizer = cv2.face.LBPHFaceRecognizer_create()  # create the new untrained model
+            self._recognitionCache.clear()
+        self._on_model_cleared()
+        self._checkpointer.discard(self._discarded_paths)
+
+    def process_frame(self):
+        """
+        captures a frame, detects & recognizes the faces, draws them and publishes the frame to frame_buffers,
+        which hands back a free buffer for the next one
+        :return: False if no frame could be read
+        """
+        success, self._image = self._capture.read(self._image)
+        # the quality controller only counts the processing, not the wait for the camera
+        frame_start = time.perf_counter()
+        if not success or self._image is None:
+            return False
+
+        self._detect_and_recognize()
+        if self.mirrored:
+            # flip the image i.e. mirror the image, in place to avoid a temporary frame copy
+            cv2.flip(self._image, 1, self._image)
+        # labels are drawn after the flip so that they stay readable
+        self._draw_labels()
+
+        if self._qualityController is not None:
+            now = time.perf_counter()
+            if self._qualityController.frame_done(now - frame_start, now - self._lastFrameEnd):
+                self._apply_quality_settings()
+            self._lastFrameEnd = now
+            cv2.putText(
+                self._image,
+                f"{self._qualityController.fps:.0f} fps, quality level {self._qualityController.level}",
+                (8, 20),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                self._rectColor,
+            )
+
+        # publish the frame, the window is only told if it took the previous frame
+        self._image, notify = self.frame_buffers.publish(self._image)
+        if notify:
+            self._on_frame()
+        return True
+
+    def _detect_and_recognize(self):
+        """
+        helper method which detects and recognizes the faces of the frame
+        using grayscale to create uniformity of image by removing the colored into gray scale
+        :return:
+        """
+        self._gray_image = cv2.cvtColor(self._image, cv2.COLOR_BGR2GRAY, self._gray_image)
+
+        self._frameIndex += 1
+        if self._frameIndex % self._detectInterval == 0:
+            self._equalized_gray_image = cv2.equalizeHist(self._gray_image, self._equalized_gray_image)
+
+            # using Multiscale method to detect face and use green rectangle as boundary
+            # return a list of rectangles which shows the bound of face, while tracking only around the last faces
+            detct = self._tracker.detect(self._equalized_gray_image)
+        else:
+            # the quality controller skips detection on this frame, the faces stay where they were
+            detct = self._tracker.rects
+        self._recognitionCache.next_frame()
+
+        for x, y, w, h in detct:
+            cv2.rectangle(self._image, (x, y), (x + w, y + h), self._rectColor, 1)
+
+        # if atleast one face is detected, store detected faces in equalized gray scale
+        # equalized image is based on the cropped image for better avg local contrast instead of whole image
+        crops = [cv2.equalizeHist(self._gray_image[y : y + h, x : x + w]) for x, y, w, h in detct]
+        self._faces = [(tuple(rect), None, None) for rect in detct]
+
+        if len(detct) > 0:
+            # the first face is the one "Add to model" trains with
+            self._curr_detected_obj = crops[0]
+
+            # if model exist even for 1 image trained, then model will return 2 integer name and distance (confidence value)
+            if self.trained:
+                try:
+                    results = self._recognize_faces(detct, crops)
+                except cv2.error:
+                    sys.stderr.write("recreating model due to err\n")
+                    self.clear_model()
+                    results = None
+
+                if results is not None:
+                    self._faces = [
+                        (tuple(rect), binascii_utils.int_to_four_char(label_as_int), distance)
+                        for rect, (label_as_int, distance) in zip(detct, results)
+                    ]
+                    self._on_message(
+                        "Looks similar to the image : "
+                        + ", ".join(
+                            f"{label_as_str} (distance : {distance:.1f})"
+                            for _, label_as_str, distance in self._faces
+                        )
+                    )
+
+            else:
+                self._show_instructions()
+        else:
+            self._curr_detected_obj = None  # set current object detected to None
+            if self.trained:  # if model exist then print message on screen
+                self._on_message("\n")
+            else:  # show instructions
+                self._show_instructions()
+
+        self._on_detection(self.has_face)
+
+    def _draw_labels(self):
+        """
+        writes the recognized label above each face of the finished frame, the faces were detected before the
+        frame was mirrored so their x is mirrored too
+        :return:
+        """
+        width = self._image.shape[1]
+        for (x, y, w, _), label_as_str, _ in self._faces:
+            if label_as_str is None:
+                continue
+            if self.mirrored:
+                x = width - x - w
+            cv2.putText(
+                self._image,
+                label_as_str,
+                (x, max(0, y - 4)),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.6,
+                self._rectColor,
+            )
+
+    def _recognize_faces(self, rects, crops):
+        """
+        predicts every face, reusing the recognition of faces which stayed in place. The remaining crops are
+        predicted in parallel on the recognition pool
+        :param rects: detected (x, y, w, h) faces
+        :param crops: equalized gray crops of the faces
+        :return: list of (label as int, distance), one per face
+        """
+        # reuse the last recognition while the face stays in place
+        results = [self._recognitionCache.lookup(rect) for rect in rects]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            with self._recognizer_lock:
+                # the model is updated (and the cache cleared) under the same lock
+                generation = self._recognitionCache.generation
+                predictions = list(
+                    self._recognitionPool.map(self._recognizer.predict, [crops[i] for i in missing])
+                )
+            for i, prediction in zip(missing, predictions):
+                results[i] = prediction
+                self._recognitionCache.store(rects[i], prediction, generation)
+        return results
+
+    def _show_instructions(self):
+        """"""
+        self._on_message("when object is highlighted, input the name max four chars \nand click add to model")
@@ -50,5 +50,5 @@ def resize_capture_image(capture, preferred_size):
     # return the actual dimensions
     success, image = capture.read()
     if success and image is not None:
-        h, w = capture.read()
+        h, w = image.shape[:2]
     return (w, h)
@@ -0,0 +1,92 @@
+import asyncio
+import importlib.util
+import os
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEPENDENCIES = ("aiohttp", "cv2", "numpy", "py_ms_cognitive", "requests")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class AsyncImageSearchSessionTest(unittest.TestCase):
+    """
+    pages the same query through ImageSearchSession and AsyncImageSearchSession against a local bing_stand_in
+    server, both must return the same results
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        import bing_stand_in
+
+        cls.server = bing_stand_in.create_server(
+            template_path=os.path.join(HERE, "data.json"), fixtures_dir=HERE, total_matches=60
+        )
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.environ = {
+            name: os.environ.get(name) for name in ("BING_SEARCH_ENDPOINT", "BING_SEARCH_KEY")
+        }
+        os.environ["BING_SEARCH_ENDPOINT"] = cls.server.search_url
+        os.environ["BING_SEARCH_KEY"] = "stand-in"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        for name, value in cls.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    @staticmethod
+    def _page(session):
+        return {
+            "content_urls": [result.content_url for result in session.results],
+            "received": session.numResultsReceived,
+            "available": session.numResultsAvailable,
+            "skipped": session.numDuplicatesSkipped,
+            "next_offset": session.nextOffset,
+            "error": session.searchError,
+        }
+
+    def _sync_pages(self, dedup, pages):
+        from image_search_session import ImageSearchSession
+
+        session = ImageSearchSession()
+        session.dedup = dedup
+        session.search("luxury condo sales", 25, 0)
+        result = [self._page(session)]
+        for _ in range(pages - 1):
+            session.searchNext()
+            result.append(self._page(session))
+        return result
+
+    def _async_pages(self, dedup, pages):
+        from async_image_search import AsyncImageSearchSession
+
+        async def run():
+            async with AsyncImageSearchSession() as session:
+                session.dedup = dedup
+                await session.search("luxury condo sales", 25, 0)
+                result = [self._page(session)]
+                for _ in range(pages - 1):
+                    await session.search_next()
+                    result.append(self._page(session))
+                return result
+
+        return asyncio.run(run())
+
+    def test_same_results_without_dedup(self):
+        self.assertEqual(self._async_pages(False, 3), self._sync_pages(False, 3))
+
+    def test_same_results_with_dedup(self):
+        # the stand-in serves the same few fixture images over and over, so most results are near duplicates
+        sync_pages = self._sync_pages(True, 3)
+        self.assertEqual(self._async_pages(True, 3), sync_pages)
+        self.assertGreater(sum(page["skipped"] for page in sync_pages), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import json
+import os
+import threading
+import unittest
+import urllib.error
+import urllib.request
+
+import bing_stand_in
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class BingStandInTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = bing_stand_in.create_server(
+            template_path=os.path.join(HERE, "data.json"), fixtures_dir=HERE, total_matches=180
+        )
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def _search(self, offset, count=50):
+        request = urllib.request.Request(
+            f"{self.server.search_url}?q=condo&count={count}&offset={offset}",
+            headers={"Ocp-Apim-Subscription-Key": "stand-in"},
+        )
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+
+    def test_paging(self):
+        pages = [self._search(offset) for offset in (0, 50, 100, 150)]
+        self.assertEqual([page["nextOffset"] for page in pages], [50, 100, 150, 180])
+        self.assertEqual([len(page["value"]) for page in pages], [50, 50, 50, 30])
+        self.assertEqual(pages[0]["totalEstimatedMatches"], 180)
+
+    def test_later_pages_are_not_exact_duplicates(self):
+        values = [value for offset in (0, 50, 100, 150) for value in self._search(offset)["value"]]
+        for field in ("imageId", "contentUrl", "thumbnailUrl", "hostPageUrl"):
+            self.assertEqual(len({value[field] for value in values}), len(values), field)
+        metadata = {
+            (value["encodingFormat"], value["contentSize"], value["width"], value["height"])
+            for value in values
+        }
+        self.assertEqual(len(metadata), len(values))
+
+    def test_serves_images(self):
+        url = self._search(0, 1)["value"][0]["thumbnailUrl"]
+        with urllib.request.urlopen(url) as response:
+            self.assertTrue(response.read().startswith(b"\x89PNG"))
+
+    def test_requires_a_key(self):
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            urllib.request.urlopen(f"{self.server.search_url}?q=condo")
+        self.assertEqual(raised.exception.code, 401)
+
+
+if __name__ == "__main__":
+    unittest.main()
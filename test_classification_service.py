@@ -0,0 +1,59 @@
+import importlib.util
+import threading
+import unittest
+
+DEPENDENCIES = ("cv2", "numpy", "scipy")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+class BlockingClassifier:
+    """
+    records the batches it classifies, the first batch blocks until release is set
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def classify_batch(self, images):
+        self.batches.append(list(images))
+        self.started.set()
+        self.release.wait(5.0)
+        return [(image, {}) for image in images]
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class MicroBatcherTest(unittest.TestCase):
+    def setUp(self):
+        from classification_service import MicroBatcher
+
+        self.classifier = BlockingClassifier()
+        self.batcher = MicroBatcher(self.classifier, max_batch_size=4, max_wait=0.05)
+
+    def test_batches_waiting_requests(self):
+        first = self.batcher.submit("a")
+        self.assertTrue(self.classifier.started.wait(5.0))
+        waiting = [self.batcher.submit(image) for image in "bcd"]
+        self.classifier.release.set()
+        for request in [first] + waiting:
+            self.assertTrue(request.done.wait(5.0))
+        self.assertEqual(self.classifier.batches, [["a"], ["b", "c", "d"]])
+        self.assertEqual([request.result[0] for request in waiting], ["b", "c", "d"])
+
+    def test_cancelled_requests_are_dropped(self):
+        first = self.batcher.submit("a")
+        self.assertTrue(self.classifier.started.wait(5.0))
+        cancelled = self.batcher.submit("b")
+        kept = self.batcher.submit("c")
+        self.batcher.cancel(cancelled)
+        self.classifier.release.set()
+        self.assertTrue(first.done.wait(5.0))
+        self.assertTrue(kept.done.wait(5.0))
+        self.assertEqual(self.classifier.batches, [["a"], ["c"]])
+        self.assertFalse(cancelled.done.is_set())
+        self.assertEqual(self.batcher.stats()["dropped"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import importlib.util
+import unittest
+
+import numpy
+
+from compact_histogram import WEIGHT_DTYPES, CompactHistogram, narrowest_uint, sparse_nbytes
+
+NUM_BINS = 256**3
+HAVE_SCIPY = importlib.util.find_spec("scipy") is not None
+
+
+def random_hist(random, non_empty=20000):
+    """
+    normalized dense histogram with non_empty bins of very different weights, like the histogram of a photo
+    """
+    hist = numpy.zeros(NUM_BINS, numpy.float32)
+    ids = random.choice(NUM_BINS, non_empty, replace=False)
+    hist[ids] = random.pareto(1.5, non_empty) + 1e-3
+    hist /= hist.sum()
+    return hist
+
+
+def exact_intersection(reference, query):
+    return float(numpy.minimum(reference.astype(numpy.float64), query).sum())
+
+
+class CompactHistogramTest(unittest.TestCase):
+    def setUp(self):
+        self.random = numpy.random.default_rng(29)
+
+    def test_narrowest_uint(self):
+        self.assertIs(narrowest_uint(255), numpy.uint8)
+        self.assertIs(narrowest_uint(256), numpy.uint16)
+        self.assertIs(narrowest_uint(NUM_BINS - 1), numpy.uint32)
+
+    def test_six_bytes_per_bin(self):
+        hist = CompactHistogram.from_dense(random_hist(self.random))
+        self.assertEqual(hist.ids.dtype, numpy.uint32)
+        self.assertEqual(hist.ids.nbytes + hist.weights.nbytes, 6 * len(hist.ids))
+
+    def test_intersection_within_error(self):
+        reference = random_hist(self.random)
+        query = random_hist(self.random)
+        # queries sharing many bins with the reference, where the quantization matters most
+        similar = 0.5 * (reference + query)
+        for weight_dtype in WEIGHT_DTYPES:
+            hist = CompactHistogram.from_dense(reference, weight_dtype)
+            for q in (query, similar, reference):
+                self.assertLessEqual(
+                    abs(hist.intersection(q) - exact_intersection(reference, q)),
+                    hist.error + 1e-6,
+                    weight_dtype,
+                )
+
+    def test_label_similarity_within_mean_error(self):
+        # HistogramClassifier averages the intersections of the references of a label, the documented
+        # tolerance of the average is the mean error of the references
+        references = [random_hist(self.random) for _ in range(4)]
+        hists = [CompactHistogram.from_dense(reference) for reference in references]
+        query = 0.5 * (references[0] + random_hist(self.random))
+        exact = numpy.mean([exact_intersection(reference, query) for reference in references])
+        compact = numpy.mean([hist.intersection(query) for hist in hists])
+        mean_error = numpy.mean([hist.error for hist in hists])
+        self.assertLessEqual(abs(compact - exact), mean_error + 1e-6)
+        self.assertLess(mean_error, 0.01)
+
+    def test_empty_bins_quantized_to_zero_are_dropped(self):
+        hist = numpy.zeros(16, numpy.float32)
+        hist[[1, 5, 9]] = [1.0, 1e-9, 0.5]
+        compact = CompactHistogram.from_dense(hist)
+        self.assertEqual(compact.ids.tolist(), [1, 9])
+        self.assertEqual(compact.ids.dtype, numpy.uint8)
+
+    @unittest.skipUnless(HAVE_SCIPY, "missing scipy")
+    def test_half_the_memory_of_sparse_matrices(self):
+        hist = CompactHistogram.from_dense(random_hist(self.random))
+        self.assertAlmostEqual(sparse_nbytes(hist) / hist.nbytes, 2.0, delta=0.05)
+
+    @unittest.skipUnless(HAVE_SCIPY, "missing scipy")
+    def test_intersection_batch_matches_intersection(self):
+        from compact_histogram import QueryBatch
+
+        hist = CompactHistogram.from_dense(random_hist(self.random))
+        queries = [random_hist(self.random) for _ in range(3)]
+        batch = hist.intersection_batch(QueryBatch.from_dense(queries))
+        for score, query in zip(batch, queries):
+            self.assertAlmostEqual(score, hist.intersection(query), places=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import importlib.util
+import unittest
+
+DEPENDENCIES = ("cv2", "numpy", "requests")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class ContactSheetTest(unittest.TestCase):
+    def test_grid_shape(self):
+        import contact_sheet
+
+        self.assertEqual(contact_sheet.grid_shape(0, 400), (1, 1, 400))
+        self.assertEqual(contact_sheet.grid_shape(1, 400), (1, 1, 400))
+        self.assertEqual(contact_sheet.grid_shape(10, 400), (4, 3, 100))
+        self.assertEqual(contact_sheet.grid_shape(16, 400), (4, 4, 100))
+        self.assertEqual(contact_sheet.grid_shape(17, 400), (5, 4, 80))
+        # the cells stay taller than the label
+        self.assertEqual(contact_sheet.grid_shape(400, 100, label_height=16), (20, 20, 17))
+
+    def test_cell_at(self):
+        import contact_sheet
+
+        layout = (4, 3, 100)
+        self.assertEqual(contact_sheet.cell_at(layout, 10, 0, 0), 0)
+        self.assertEqual(contact_sheet.cell_at(layout, 10, 399, 99), 3)
+        self.assertEqual(contact_sheet.cell_at(layout, 10, 100, 200), 9)
+        # the empty cells of the last row and positions off the sheet
+        self.assertIsNone(contact_sheet.cell_at(layout, 10, 250, 250))
+        self.assertIsNone(contact_sheet.cell_at(layout, 10, 400, 50))
+        self.assertIsNone(contact_sheet.cell_at(layout, 10, 50, 300))
+        self.assertIsNone(contact_sheet.cell_at(layout, 10, -1, 50))
+
+    def test_build_contact_sheet(self):
+        import numpy
+
+        import contact_sheet
+
+        red = numpy.zeros((60, 120, 3), numpy.uint8)
+        red[:] = (0, 0, 255)
+        tall = numpy.zeros((200, 50, 3), numpy.uint8)
+        images = [red, None, tall]
+        sheet, layout = contact_sheet.build_contact_sheet(images, ["a", "b", "c"], 300)
+        self.assertEqual(layout, (2, 2, 150))
+        self.assertEqual(sheet.shape, (300, 300, 3))
+        self.assertEqual(sheet.dtype, numpy.uint8)
+        # the image is centred in its cell, the cell of a missing image only has its caption
+        self.assertEqual(tuple(sheet[65, 75]), (0, 0, 255))
+        self.assertEqual(tuple(sheet[65, 225]), contact_sheet.BACKGROUND)
+        self.assertEqual(tuple(sheet[140, 225]), contact_sheet.LABEL_BACKGROUND)
+        # the empty fourth cell is background only
+        self.assertEqual(tuple(sheet[290, 290]), contact_sheet.BACKGROUND)
+        self.assertEqual(contact_sheet.cell_at(layout, len(images), 225, 65), 1)
+
+    def test_fetch_images_keeps_the_order(self):
+        import contact_sheet
+
+        self.assertEqual(contact_sheet.fetch_images([]), [])
+        images = contact_sheet.fetch_images([None, "http://127.0.0.1:9/unreachable.jpg"], timeout=1.0)
+        self.assertEqual(images, [None, None])
+
+
+if __name__ == "__main__":
+    unittest.main()
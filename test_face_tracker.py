@@ -0,0 +1,57 @@
+import importlib.util
+import os
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# the recognizer apps import their modules by bare name from their own folder
+sys.path.insert(0, os.path.join(HERE, "smart_alarm_training_for_identification"))
+
+DEPENDENCIES = ("cv2", "numpy")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class RecognitionCacheTest(unittest.TestCase):
+    def setUp(self):
+        from face_tracker import RecognitionCache
+
+        self.cache = RecognitionCache(min_iou=0.7, max_age=2)
+
+    def test_reuses_the_result_of_an_overlapping_face(self):
+        self.cache.store((100, 100, 50, 50), (7, 12.5))
+        self.assertEqual(self.cache.lookup((102, 101, 50, 50)), (7, 12.5))
+        self.assertIsNone(self.cache.lookup((300, 100, 50, 50)))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_results_age_out(self):
+        self.cache.store((100, 100, 50, 50), (7, 12.5))
+        for _ in range(2):
+            self.cache.next_frame()
+        self.assertIsNotNone(self.cache.lookup((100, 100, 50, 50)))
+        self.cache.next_frame()
+        self.assertIsNone(self.cache.lookup((100, 100, 50, 50)))
+
+    def test_prediction_of_an_older_model_is_not_stored(self):
+        generation = self.cache.generation
+        self.cache.clear()
+        self.cache.store((100, 100, 50, 50), (7, 12.5), generation)
+        self.assertIsNone(self.cache.lookup((100, 100, 50, 50)))
+
+    def test_nbytes_counts_the_entries(self):
+        import numpy
+
+        empty = self.cache.nbytes
+        self.cache.store(numpy.array([100, 100, 50, 50], numpy.int32), (7, 12.5))
+        one = self.cache.nbytes
+        self.cache.store((300, 100, 50, 50), (8, 20.0))
+        two = self.cache.nbytes
+        # an entry list, a rectangle, a result tuple and their numbers
+        self.assertGreater(one - empty, sys.getsizeof([]) + sys.getsizeof(()) * 2)
+        self.assertGreater(two, one)
+        self.cache.clear()
+        self.assertEqual(self.cache.nbytes, empty)
+
+
+if __name__ == "__main__":
+    unittest.main()
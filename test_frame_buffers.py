@@ -0,0 +1,91 @@
+import os
+import sys
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# the recognizer apps import their modules by bare name from their own folder
+sys.path.insert(0, os.path.join(HERE, "smart_alarm_training_for_identification"))
+
+from frame_buffers import TripleBuffer  # noqa: E402
+
+
+class TripleBufferTest(unittest.TestCase):
+    def setUp(self):
+        self.buffers = TripleBuffer()
+
+    def test_nothing_before_the_first_publish(self):
+        self.assertEqual(self.buffers.acquire_front(), (None, False))
+
+    def test_buffers_are_recycled(self):
+        frames = [["a"], ["b"], ["c"]]
+        # the first two publishes hand back no buffer yet
+        self.assertEqual(self.buffers.publish(frames[0]), (None, True))
+        self.assertEqual(self.buffers.acquire_front(), (frames[0], True))
+        self.assertEqual(self.buffers.publish(frames[1]), (None, True))
+        self.assertEqual(self.buffers.acquire_front(), (frames[1], True))
+        # from the third publish on the producer gets the buffer the consumer let go of
+        back, _ = self.buffers.publish(frames[2])
+        self.assertIs(back, frames[0])
+        front, is_new = self.buffers.acquire_front()
+        self.assertIs(front, frames[2])
+        self.assertTrue(is_new)
+
+    def test_paint_without_new_frame_returns_the_last_one(self):
+        self.buffers.publish("a")
+        self.buffers.acquire_front()
+        self.assertEqual(self.buffers.acquire_front(), ("a", False))
+        self.assertEqual(self.buffers.stats()["shown"], 1)
+
+    def test_frames_published_in_between_are_dropped_and_coalesced(self):
+        self.assertTrue(self.buffers.publish("a")[1])
+        # the consumer has not taken "a" yet, so no further notifications are sent
+        self.assertFalse(self.buffers.publish("b")[1])
+        self.assertFalse(self.buffers.publish("c")[1])
+        self.assertEqual(self.buffers.acquire_front(), ("c", True))
+        self.assertEqual(
+            self.buffers.stats(), {"published": 3, "shown": 1, "dropped": 2, "coalesced": 2}
+        )
+        # the next publish after the consumer took a frame notifies again
+        self.assertTrue(self.buffers.publish("d")[1])
+
+    def test_producer_and_consumer_never_share_a_buffer(self):
+        # each side writes its name into the buffer it owns and checks it is still there before letting go,
+        # a buffer owned by both would show the other name
+        errors = []
+        done = threading.Event()
+
+        def produce():
+            back = None
+            for _ in range(5000):
+                back = back if back is not None else []
+                back[:] = ["producer"] * 8
+                if back != ["producer"] * 8:
+                    errors.append(("producer", list(back)))
+                back, _ = self.buffers.publish(back)
+            done.set()
+
+        def consume():
+            front = None
+            while not done.is_set():
+                if front is not None and front != ["consumer"] * 8:
+                    errors.append(("consumer", list(front)))
+                front, is_new = self.buffers.acquire_front()
+                if is_new:
+                    front[:] = ["consumer"] * 8
+
+        threads = [threading.Thread(target=produce), threading.Thread(target=consume)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10.0)
+        self.buffers.acquire_front()
+        self.assertEqual(errors, [])
+        stats = self.buffers.stats()
+        self.assertEqual(stats["published"], 5000)
+        # every frame was either shown or replaced before it was shown
+        self.assertEqual(stats["shown"] + stats["dropped"], 5000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import importlib.util
+import unittest
+
+DEPENDENCIES = ("cv2", "numpy", "requests")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class DecodeReductionTest(unittest.TestCase):
+    def test_reduction_keeps_the_longer_side(self):
+        from image_preprocessing import decode_reduction
+
+        self.assertEqual(decode_reduction(6144, 4096, 768), 8)
+        self.assertEqual(decode_reduction(4096, 6143, 768), 4)
+        self.assertEqual(decode_reduction(1600, 1200, 768), 2)
+        self.assertEqual(decode_reduction(1535, 1000, 768), 1)
+        self.assertEqual(decode_reduction(500, 300, 768), 1)
+        # the metadata holds strings as often as ints
+        self.assertEqual(decode_reduction("3072", "2048", 768), 4)
+
+    def test_unknown_size_decodes_at_full_size(self):
+        from image_preprocessing import decode_reduction
+
+        for width, height, max_size in (
+            (None, 2000, 768),
+            (4000, None, 768),
+            (0, 0, 768),
+            (4000, 3000, None),
+        ):
+            self.assertEqual(decode_reduction(width, height, max_size), 1)
+
+    def test_reduced_decode(self):
+        import cv2
+        import numpy
+
+        import request_utils
+        from image_preprocessing import decode_reduction
+
+        image = numpy.random.default_rng(47).integers(0, 256, (1200, 1600, 3), dtype=numpy.uint8)
+        _, jpeg = cv2.imencode(".jpg", image)
+        reduction = decode_reduction(1600, 1200, 300)
+        self.assertEqual(reduction, 4)
+        self.assertEqual(request_utils.decode_image(jpeg.tobytes(), reduction).shape, (300, 400, 3))
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class WorkingImageTest(unittest.TestCase):
+    def test_longer_side_is_max_size(self):
+        import numpy
+
+        from image_preprocessing import working_image
+
+        for shape, expected in (((600, 800, 3), (576, 768, 3)), ((800, 600, 3), (768, 576, 3))):
+            self.assertEqual(working_image(numpy.zeros(shape, numpy.uint8), 768).shape, expected)
+        # small images are scaled up to the display size too
+        self.assertEqual(working_image(numpy.zeros((30, 40, 3), numpy.uint8), 768).shape, (576, 768, 3))
+
+    def test_image_of_the_right_size_is_not_copied(self):
+        import numpy
+
+        from image_preprocessing import working_image
+
+        image = numpy.zeros((576, 768, 3), numpy.uint8)
+        self.assertIs(working_image(image, 768), image)
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class InFlightMemoryTest(unittest.TestCase):
+    def test_views_are_counted_once(self):
+        import numpy
+
+        from image_preprocessing import InFlightMemory
+
+        memory = InFlightMemory()
+        image = numpy.zeros((100, 100, 3), numpy.uint8)
+        self.assertEqual(memory.record(image, image[10:20], None), image.nbytes)
+        self.assertEqual(memory.record(image, image.copy()), 2 * image.nbytes)
+        self.assertEqual(
+            memory.stats(), {"images": 2, "peak_bytes": 2 * image.nbytes, "mean_bytes": 1.5 * image.nbytes}
+        )
+
+    def test_no_images(self):
+        from image_preprocessing import InFlightMemory
+
+        self.assertEqual(InFlightMemory().stats(), {"images": 0, "peak_bytes": 0, "mean_bytes": 0.0})
+
+
+if __name__ == "__main__":
+    unittest.main()
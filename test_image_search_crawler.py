@@ -0,0 +1,119 @@
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEPENDENCIES = ("cv2", "numpy", "py_ms_cognitive", "requests")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class ImageSearchCrawlerTest(unittest.TestCase):
+    """
+    crawls a local bing_stand_in server with 120 results per query
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        import bing_stand_in
+
+        cls.server = bing_stand_in.create_server(
+            template_path=os.path.join(HERE, "data.json"), fixtures_dir=HERE, total_matches=120
+        )
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.environ = {
+            name: os.environ.get(name) for name in ("BING_SEARCH_ENDPOINT", "BING_SEARCH_KEY")
+        }
+        os.environ["BING_SEARCH_ENDPOINT"] = cls.server.search_url
+        os.environ["BING_SEARCH_KEY"] = "stand-in"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        for name, value in cls.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, "results.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _crawler(self):
+        from image_search_crawler import ImageSearchCrawler
+
+        return ImageSearchCrawler(
+            self.output, page_size=50, requests_per_second=1000.0, burst=10, workers=2, max_retries=0
+        )
+
+    def _lines(self):
+        with open(self.output, "rb") as file:
+            data = file.read()
+        self.assertNotIn(b"\0", data)
+        return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+    def test_crawl(self):
+        crawler = self._crawler()
+        progress = crawler.crawl(["condo", "villa"])
+        self.assertTrue(all(state["done"] and not state["failed"] for state in progress.values()))
+        lines = self._lines()
+        self.assertEqual(len(lines), 240)
+        self.assertEqual(len({(line["query"], line["contentUrl"]) for line in lines}), 240)
+        self.assertEqual(crawler.requests, 6)
+
+    def test_resume_drops_the_uncheckpointed_page(self):
+        self._crawler().crawl(["condo"])
+        with open(self.output, "ab") as file:
+            file.write(b'{"query": "condo", "partial')
+
+        crawler = self._crawler()
+        progress = crawler.crawl(["condo", "villa"])
+        # only the new query is searched, the partial line is gone
+        self.assertEqual(crawler.requests, 3)
+        self.assertTrue(progress["villa"]["done"])
+        lines = self._lines()
+        self.assertEqual(len(lines), 240)
+        self.assertEqual(sum(line["query"] == "condo" for line in lines), 120)
+
+    def test_shortened_output_is_crawled_again(self):
+        self._crawler().crawl(["condo"])
+        with open(self.output, "r+b") as file:
+            file.truncate(100)
+
+        crawler = self._crawler()
+        crawler.crawl(["condo"])
+        self.assertEqual(crawler.requests, 3)
+        self.assertEqual(len(self._lines()), 120)
+
+    def test_deleted_output_is_crawled_again(self):
+        self._crawler().crawl(["condo"])
+        os.remove(self.output)
+
+        crawler = self._crawler()
+        crawler.crawl(["condo"])
+        self.assertEqual(len(self._lines()), 120)
+
+    def test_missing_key_is_not_retried(self):
+        from image_search_crawler import ImageSearchCrawler
+
+        key = os.environ.pop("BING_SEARCH_KEY")
+        try:
+            crawler = ImageSearchCrawler(self.output, max_retries=3, requests_per_second=1000.0)
+            progress = crawler.crawl(["condo"])
+        finally:
+            os.environ["BING_SEARCH_KEY"] = key
+        self.assertTrue(progress["condo"]["failed"])
+        self.assertEqual((crawler.requests, crawler.failed_requests), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEPENDENCIES = ("cv2", "numpy", "py_ms_cognitive", "requests")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+# luxocator builds its window with wx
+LUXOCATOR_MISSING = MISSING + [name for name in ("wx",) if importlib.util.find_spec(name) is None]
+PAGE_SIZE = 10
+TOTAL_MATCHES = 30
+
+
+class StandInTestCase(unittest.TestCase):
+    """
+    points ImageSearchSession at a local bing_stand_in server serving distinct generated images, so the
+    duplicate filter keeps every result
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        import cv2
+        import numpy
+
+        import bing_stand_in
+
+        cls.fixtures_dir = tempfile.mkdtemp()
+        random = numpy.random.default_rng(46)
+        for index in range(TOTAL_MATCHES):
+            blocks = random.integers(0, 256, (8, 8, 3), dtype=numpy.uint8)
+            image = cv2.resize(blocks, (96, 64), interpolation=cv2.INTER_NEAREST)
+            cv2.imwrite(os.path.join(cls.fixtures_dir, f"{index:02d}.png"), image)
+
+        cls.server = bing_stand_in.create_server(
+            template_path=os.path.join(HERE, "data.json"),
+            fixtures_dir=cls.fixtures_dir,
+            total_matches=TOTAL_MATCHES,
+        )
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.environ = {
+            name: os.environ.get(name) for name in ("BING_SEARCH_ENDPOINT", "BING_SEARCH_KEY")
+        }
+        os.environ["BING_SEARCH_ENDPOINT"] = cls.server.search_url
+        os.environ["BING_SEARCH_KEY"] = "stand-in"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.fixtures_dir)
+        for name, value in cls.environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    def _images_served(self):
+        return self.server.RequestHandlerClass.counters.get("images", 0)
+
+    def _session(self, dedup=True):
+        from image_search_session import ImageSearchSession
+
+        session = ImageSearchSession()
+        session.dedup = dedup
+        session.search("luxury condo sales", PAGE_SIZE, 0)
+        return session
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class ImageSearchSessionTest(StandInTestCase):
+    @staticmethod
+    def _image_number(session, index):
+        return int(session.results[index].content_url.rsplit("/", 1)[-1].split(".")[0])
+
+    def test_dedup_thumbnails_are_kept_with_the_results(self):
+        served = self._images_served()
+        session = self._session()
+        self.assertEqual(session.numResultsReceived, PAGE_SIZE)
+        self.assertEqual(len(session.thumbnails), PAGE_SIZE)
+        self.assertTrue(all(image is not None for image in session.thumbnails))
+        self.assertEqual(self._images_served() - served, PAGE_SIZE)
+        self.assertEqual(session.thumbnailBytes, sum(image.nbytes for image in session.thumbnails))
+
+        # only the thumbnails of the current page are kept, a page restored by searchPrev has none
+        session.searchNext()
+        session.searchNext()
+        session.searchPrev()
+        self.assertEqual(session._offset, PAGE_SIZE)
+        self.assertEqual(session.thumbnails, [None] * PAGE_SIZE)
+
+        session.searchNext()
+        session.dropThumbnails()
+        self.assertEqual(session.thumbnailBytes, 0)
+
+    def test_without_dedup_no_thumbnails_are_fetched(self):
+        served = self._images_served()
+        session = self._session(dedup=False)
+        self.assertEqual(session.thumbnails, [None] * PAGE_SIZE)
+        self.assertEqual(self._images_served(), served)
+
+    def test_next_after_opening_a_cell_on_page_2(self):
+        import contact_sheet
+
+        session = self._session(dedup=False)
+        session.searchNext()
+        self.assertEqual(session._offset, PAGE_SIZE)
+        _, layout = contact_sheet.build_contact_sheet(
+            [None] * session.numResultsReceived, [""] * session.numResultsReceived, 400
+        )
+        columns, _, cell = layout
+
+        def click(index):
+            x = (index % columns) * cell + cell // 2
+            y = (index // columns) * cell + cell // 2
+            return contact_sheet.cell_at(layout, session.numResultsReceived, x, y)
+
+        # the cell index is the index into the results of the page, next shows the following result
+        index = click(3)
+        self.assertEqual(self._image_number(session, index), 13)
+        index = session.nextResult(index)
+        self.assertEqual(session._offset, PAGE_SIZE)
+        self.assertEqual(self._image_number(session, index), 14)
+
+        # next on the last cell moves to the first result of the following page
+        index = session.nextResult(click(PAGE_SIZE - 1))
+        self.assertEqual((session._offset, index), (2 * PAGE_SIZE, 0))
+        self.assertEqual(self._image_number(session, index), 20)
+
+        # prev on the first result moves back to the last result of the page before
+        index = session.prevResult(index)
+        self.assertEqual((session._offset, index), (PAGE_SIZE, PAGE_SIZE - 1))
+        self.assertEqual(self._image_number(session, index), 19)
+
+    def test_navigation_stops_at_the_ends(self):
+        session = self._session(dedup=False)
+        self.assertFalse(session.hasPrevResult(0))
+        self.assertIsNone(session.prevResult(0))
+        index = 0
+        numbers = [self._image_number(session, index)]
+        while session.hasNextResult(index):
+            index = session.nextResult(index)
+            numbers.append(self._image_number(session, index))
+        self.assertEqual(numbers, list(range(TOTAL_MATCHES)))
+        self.assertIsNone(session.nextResult(index))
+        self.assertEqual(session._offset, TOTAL_MATCHES - PAGE_SIZE)
+
+
+class LabelingClassifier:
+    def __init__(self):
+        self.images = 0
+
+    def classify_batch(self, images):
+        self.images += len(images)
+        return [("Luxury", {}) for _ in images]
+
+
+@unittest.skipIf(LUXOCATOR_MISSING, f"missing {', '.join(LUXOCATOR_MISSING)}")
+class LoadAndClassifyPageTest(StandInTestCase):
+    def test_grid_reuses_the_dedup_thumbnails(self):
+        import luxocator
+
+        session = self._session()
+        served = self._images_served()
+        classifier = LabelingClassifier()
+        sheet, layout, label = luxocator.load_and_classify_page(session, classifier, 400)
+        self.assertIsNotNone(sheet)
+        self.assertEqual(classifier.images, PAGE_SIZE)
+        self.assertEqual(self._images_served(), served)
+        self.assertEqual(label, f"Results 1 - {PAGE_SIZE} of {TOTAL_MATCHES}")
+
+    def test_grid_fetches_only_the_missing_thumbnails(self):
+        import luxocator
+
+        session = self._session()
+        session.thumbnails[2] = None
+        session.thumbnails[5] = None
+        served = self._images_served()
+        luxocator.load_and_classify_page(session, LabelingClassifier(), 400)
+        self.assertEqual(self._images_served() - served, 2)
+        self.assertTrue(all(image is not None for image in session.thumbnails))
+
+
+if __name__ == "__main__":
+    unittest.main()
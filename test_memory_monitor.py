@@ -0,0 +1,81 @@
+import io
+import time
+import unittest
+
+import memory_monitor
+
+
+class SoakTestTest(unittest.TestCase):
+    def setUp(self):
+        self.monitor = memory_monitor.MemoryMonitor(0.02, log=io.StringIO())
+
+    def test_duration_must_be_longer_than_warmup(self):
+        for duration in (0.5, 1.0):
+            with self.assertRaises(ValueError):
+                memory_monitor.soak_test(lambda: None, duration, 2**20, warmup=1.0, monitor=self.monitor)
+
+    def test_passes_without_growth(self):
+        report = memory_monitor.soak_test(
+            lambda: time.sleep(0.005),
+            0.2,
+            50 * 2**20,
+            warmup=0.05,
+            monitor=self.monitor,
+            sample_interval=0.02,
+        )
+        self.assertTrue(report["passed"])
+        self.assertFalse(report["inconclusive"])
+        self.assertGreater(report["iterations"], 1)
+        self.assertGreater(len(report["samples"]), 2)
+
+    def test_fails_on_growth(self):
+        leak = []
+
+        def step():
+            # written, so the pages are resident
+            leak.append(b"x" * 2**20)
+            time.sleep(0.005)
+
+        report = memory_monitor.soak_test(step, 0.3, 2**20, warmup=0.05, monitor=self.monitor)
+        self.assertFalse(report["passed"])
+        self.assertFalse(report["inconclusive"])
+        self.assertGreater(report["growth"], 2**20)
+
+    def test_inconclusive_when_a_step_outlasts_the_warmup(self):
+        report = memory_monitor.soak_test(
+            lambda: time.sleep(0.2), 0.1, 50 * 2**20, warmup=0.05, monitor=self.monitor
+        )
+        self.assertTrue(report["inconclusive"])
+        self.assertFalse(report["passed"])
+        self.assertEqual(report["iterations"], 1)
+
+
+class MemoryMonitorTest(unittest.TestCase):
+    def test_reports_and_sheds_caches(self):
+        cache = {"size": 4096}
+        log = io.StringIO()
+        monitor = memory_monitor.MemoryMonitor(rss_budget=1, on_budget="shed", log=log)
+        monitor.register_cache("cache", lambda: cache["size"], shed=lambda: cache.update(size=0))
+        report = monitor.sample()
+        self.assertEqual(report["caches"], {"cache": 4096})
+        self.assertEqual(report["over_budget"], ["rss"])
+        self.assertEqual(cache["size"], 0)
+        self.assertEqual(monitor.sheds, 1)
+        self.assertIn("shed cache", log.getvalue())
+
+    def test_cache_budget_sheds_only_that_cache(self):
+        sizes = {"small": 10, "large": 10_000}
+        monitor = memory_monitor.MemoryMonitor(on_budget="shed", log=io.StringIO())
+        for name in sizes:
+            monitor.register_cache(
+                name,
+                lambda name=name: sizes[name],
+                budget=1000,
+                shed=lambda name=name: sizes.update({name: 0}),
+            )
+        self.assertEqual(monitor.sample()["over_budget"], ["large"])
+        self.assertEqual(sizes, {"small": 10, "large": 0})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# the recognizer apps import their modules by bare name from their own folder
+sys.path.insert(0, os.path.join(HERE, "smart_alarm_training_for_identification"))
+
+DEPENDENCIES = ("cv2", "numpy")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+if not MISSING and not hasattr(importlib.import_module("cv2"), "face"):
+    MISSING.append("cv2.face (opencv-contrib)")
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class ModelCheckpointerTest(unittest.TestCase):
+    def setUp(self):
+        import cv2
+        import numpy
+
+        import lbph_model_io
+
+        random = numpy.random.default_rng(37)
+        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        faces = [random.integers(0, 256, (64, 64), dtype=numpy.uint8) for _ in range(3)]
+        self.recognizer.train(faces, numpy.array([1, 2, 3]))
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "model.xml.gz")
+        self.snapshot_threads = []
+
+        def snapshot():
+            self.snapshot_threads.append(threading.current_thread())
+            histograms, labels = lbph_model_io.get_model_samples(self.recognizer)
+            return lbph_model_io.get_model_params(self.recognizer), histograms, labels
+
+        self.snapshot = snapshot
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _read_labels(self):
+        import cv2
+
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(self.path)
+        return recognizer.getLabels().reshape(-1).tolist()
+
+    def test_checkpoint_after_every_samples(self):
+        from model_checkpointer import ModelCheckpointer
+
+        checkpointer = ModelCheckpointer(self.snapshot, self.path, every_samples=2, interval=60.0)
+        try:
+            checkpointer.sample_added()
+            checkpointer.sample_added()
+            for _ in range(100):
+                if checkpointer.checkpoints:
+                    break
+                threading.Event().wait(0.05)
+            self.assertEqual(checkpointer.checkpoints, 1)
+            self.assertEqual(self._read_labels(), [1, 2, 3])
+        finally:
+            checkpointer.stop(final_checkpoint=False)
+
+    def test_final_checkpoint_is_written_by_the_background_thread(self):
+        from model_checkpointer import ModelCheckpointer
+
+        checkpointer = ModelCheckpointer(self.snapshot, self.path, every_samples=10, interval=60.0)
+        checkpointer.sample_added()
+        checkpointer.stop(final_checkpoint=True, wait=False)
+        checkpointer.join()
+        self.assertEqual(checkpointer.checkpoints, 1)
+        self.assertEqual(len(self.snapshot_threads), 1)
+        self.assertIsNot(self.snapshot_threads[0], threading.current_thread())
+        self.assertEqual(self._read_labels(), [1, 2, 3])
+
+    def test_stop_without_pending_samples_writes_nothing(self):
+        from model_checkpointer import ModelCheckpointer
+
+        checkpointer = ModelCheckpointer(self.snapshot, self.path, every_samples=10, interval=60.0)
+        checkpointer.stop(final_checkpoint=True)
+        self.assertEqual(checkpointer.checkpoints, 0)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_discard_removes_the_model(self):
+        from model_checkpointer import ModelCheckpointer
+
+        checkpointer = ModelCheckpointer(self.snapshot, self.path, every_samples=10, interval=60.0)
+        checkpointer.sample_added()
+        self.assertTrue(checkpointer.checkpoint())
+        checkpointer.discard()
+        checkpointer.stop(final_checkpoint=True)
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
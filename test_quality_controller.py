@@ -0,0 +1,109 @@
+import os
+import random
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# the recognizer apps import their modules by bare name from their own folder
+sys.path.insert(0, os.path.join(HERE, "smart_alarm_training_for_identification"))
+
+from quality_controller import QualityController, build_ladder  # noqa: E402
+
+TARGET_FPS = 30.0
+BUDGET = 1.0 / TARGET_FPS
+
+
+def ladder():
+    return build_ladder(1.3, (120, 120), 15)
+
+
+class BuildLadderTest(unittest.TestCase):
+    def test_levels_degrade_one_knob_at_a_time(self):
+        levels = ladder()
+        self.assertEqual(
+            levels[0],
+            {
+                "detection_scale": 1.0,
+                "scale_factor": 1.3,
+                "min_size": (120, 120),
+                "detect_interval": 1,
+                "recognition_reuse_frames": 15,
+            },
+        )
+        for better, cheaper in zip(levels, levels[1:]):
+            self.assertEqual(sum(better[key] != cheaper[key] for key in better), 1)
+        self.assertEqual(
+            levels[-1],
+            {
+                "detection_scale": 0.5,
+                "scale_factor": 1.5,
+                "min_size": (180, 180),
+                "detect_interval": 3,
+                "recognition_reuse_frames": 60,
+            },
+        )
+
+    def test_bounds(self):
+        levels = build_ladder(1.3, (120, 120), 15, {"max_detect_interval": 1, "min_detection_scale": 1.0})
+        self.assertTrue(all(level["detect_interval"] == 1 for level in levels))
+        self.assertTrue(all(level["detection_scale"] == 1.0 for level in levels))
+
+
+class QualityControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.random = random.Random(44)
+
+    def _camera_frame(self):
+        # a camera delivering about the target rate, with jitter
+        return BUDGET * self.random.uniform(0.8, 1.3)
+
+    def test_capture_bound_loop_keeps_its_level(self):
+        controller = QualityController(TARGET_FPS, ladder())
+        for _ in range(3000):
+            controller.frame_done(0.3 * BUDGET, self._camera_frame())
+        self.assertEqual(controller.level, 0)
+        self.assertEqual(controller.changes, 0)
+        self.assertAlmostEqual(controller.fps, TARGET_FPS / 1.05, delta=3.0)
+
+    def test_frame_time_alone_would_degrade_a_capture_bound_loop(self):
+        # the failure mode the processing time avoids: the wait for the camera counted as work
+        controller = QualityController(TARGET_FPS, ladder())
+        for _ in range(3000):
+            controller.frame_done(self._camera_frame())
+        self.assertEqual(controller.level, len(ladder()) - 1)
+
+    def test_slow_processing_degrades_and_recovers(self):
+        controller = QualityController(TARGET_FPS, ladder())
+        for _ in range(2000):
+            controller.frame_done(1.5 * BUDGET)
+        self.assertEqual(controller.level, len(ladder()) - 1)
+        self.assertLess(controller.fps, TARGET_FPS)
+
+        for _ in range(5000):
+            controller.frame_done(0.3 * BUDGET, self._camera_frame())
+        self.assertEqual(controller.level, 0)
+
+    def test_level_settles_between_too_slow_and_fast_enough(self):
+        # processing cost falls with every level, level 3 is the best one within the budget
+        costs = [1.6, 1.3, 1.1, 0.9, 0.6, 0.5, 0.4, 0.3, 0.25, 0.2]
+        controller = QualityController(TARGET_FPS, ladder())
+        levels = []
+        for _ in range(20000):
+            controller.frame_done(costs[controller.level] * BUDGET * self.random.uniform(0.95, 1.05))
+            levels.append(controller.level)
+        self.assertEqual(levels[-1], 3)
+        # upgrades to the too slow level 2 are retried less and less often
+        self.assertLess(levels[-5000:].count(2), 200)
+
+    def test_state(self):
+        controller = QualityController(TARGET_FPS, ladder())
+        controller.frame_done(0.01, 0.04)
+        state = controller.state()
+        self.assertEqual(state["level"], 0)
+        self.assertEqual(state["levels"], len(ladder()))
+        self.assertAlmostEqual(state["fps"], 25.0)
+        self.assertEqual(state["settings"], ladder()[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
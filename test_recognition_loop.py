@@ -0,0 +1,117 @@
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# the recognizer apps import their modules by bare name from their own folder
+APP_DIR = os.path.join(HERE, "smart_alarm_training_for_identification")
+sys.path.insert(0, APP_DIR)
+
+CASCADE_PATH = os.path.join(APP_DIR, "cascades", "haarcascade_frontalface_alt.xml")
+FRAMES = 12
+
+DEPENDENCIES = ("cv2", "numpy")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+if not MISSING and not hasattr(importlib.import_module("cv2"), "face"):
+    MISSING.append("cv2.face (opencv-contrib)")
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class RecognitionLoopTest(unittest.TestCase):
+    """
+    runs the headless per-frame work of the recognizer window on a short video without faces
+    """
+
+    def setUp(self):
+        import cv2
+        import numpy
+
+        self.directory = tempfile.mkdtemp()
+        self.video_path = os.path.join(self.directory, "video.avi")
+        writer = cv2.VideoWriter(self.video_path, cv2.VideoWriter_fourcc(*"MJPG"), 20.0, (160, 120))
+        random = numpy.random.default_rng(45)
+        for _ in range(FRAMES):
+            writer.write(random.integers(0, 256, (120, 160, 3), dtype=numpy.uint8))
+        writer.release()
+
+        self.recognizer_path = os.path.join(self.directory, "model.xml")
+        self.checkpoint_path = os.path.join(self.directory, "checkpoint", "model.xml.gz")
+        self.frames = 0
+        self.messages = []
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _loop(self, **kwargs):
+        from recognition_loop import RecognitionLoop
+
+        def on_frame():
+            self.frames += 1
+
+        loop = RecognitionLoop(
+            self.recognizer_path,
+            CASCADE_PATH,
+            camera_device_id=self.video_path,
+            image_size=(160, 120),
+            checkpoint_path=self.checkpoint_path,
+            on_frame=on_frame,
+            on_message=self.messages.append,
+            **kwargs,
+        )
+        self.addCleanup(loop.join)
+        self.addCleanup(loop.close)
+        return loop
+
+    def _write_model(self):
+        import cv2
+        import numpy
+
+        random = numpy.random.default_rng(45)
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        faces = [random.integers(0, 256, (64, 64), dtype=numpy.uint8) for _ in range(2)]
+        recognizer.train(faces, numpy.array([1, 2]))
+        recognizer.write(self.recognizer_path)
+
+    def test_frames_are_published_until_the_video_ends(self):
+        loop = self._loop(target_fps=1000.0)
+        self.assertEqual(loop.size, (160, 120))
+        processed = 0
+        while loop.process_frame():
+            processed += 1
+            frame, is_new = loop.frame_buffers.acquire_front()
+            self.assertTrue(is_new)
+            self.assertEqual(frame.shape, (120, 160, 3))
+        # resize_capture_image reads the first frames
+        self.assertGreater(processed, 0)
+        self.assertEqual(self.frames, processed)
+        self.assertEqual(loop.frame_buffers.stats()["published"], processed)
+        self.assertGreater(loop.quality_state()["fps"], 0.0)
+        self.assertFalse(loop.has_face)
+        # without a model the instructions are shown
+        self.assertIn("add to model", self.messages[-1])
+
+        loop.rewind()
+        self.assertTrue(loop.process_frame())
+
+    def test_adding_needs_a_face(self):
+        loop = self._loop()
+        self.assertTrue(loop.process_frame())
+        self.assertFalse(loop.add_sample(1))
+        self.assertFalse(loop.trained)
+
+    def test_clearing_keeps_the_model_file_with_a_separate_checkpoint(self):
+        self._write_model()
+        cleared = []
+        loop = self._loop(on_model_cleared=lambda: cleared.append(True))
+        self.assertTrue(loop.trained)
+        loop.clear_model()
+        self.assertFalse(loop.trained)
+        self.assertEqual(cleared, [True])
+        self.assertTrue(os.path.isfile(self.recognizer_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
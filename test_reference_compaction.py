@@ -0,0 +1,74 @@
+import importlib.util
+import unittest
+
+import numpy
+
+from compact_histogram import CompactHistogram
+
+DEPENDENCIES = ("cv2", "scipy")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+
+def hist(values):
+    values = numpy.asarray(values, numpy.float64)
+    return CompactHistogram.from_dense(values / values.sum())
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class ReferenceCompactionTest(unittest.TestCase):
+    def test_duplicate_inputs(self):
+        import reference_compaction
+
+        same = [4, 1, 0, 0, 0, 0]
+        hist_list = [hist(same) for _ in range(5)] + [hist([0, 0, 3, 1, 0, 0]), hist([0, 0, 0, 0, 1, 5])]
+        compacted = reference_compaction.compact_references(hist_list, 4)
+
+        weights = [h.reference_weight for h in compacted]
+        self.assertTrue(all(weight > 0 for weight in weights), weights)
+        self.assertEqual(sum(weights), len(hist_list))
+        # no two kept references are the same histogram
+        keys = {(tuple(h.ids.tolist()), tuple(h.weights.tolist())) for h in compacted}
+        self.assertEqual(len(keys), len(compacted))
+        self.assertEqual(len(compacted), 3)
+
+    def test_all_identical(self):
+        import reference_compaction
+
+        compacted = reference_compaction.compact_references([hist([1, 2, 3]) for _ in range(6)], 3)
+        self.assertEqual([h.reference_weight for h in compacted], [6.0])
+
+    def test_k_medoids_clusters(self):
+        import reference_compaction
+
+        points = numpy.array([0.0, 0.1, 0.2, 5.0, 5.1, 9.0, 9.0, 9.0])
+        distances = numpy.abs(points[:, None] - points[None, :])
+        weights = numpy.ones(len(points))
+        medoids, assignment = reference_compaction.k_medoids(distances, weights, 3)
+        self.assertEqual(sorted(points[medoids].tolist()), [0.1, 5.0, 9.0])
+        self.assertEqual(len(set(assignment[5:])), 1)
+
+        # more clusters than distinct points, the three copies of 9.0 share one medoid
+        medoids, assignment = reference_compaction.k_medoids(distances, weights, 8)
+        self.assertEqual(len(medoids), 6)
+        self.assertEqual(len(set(medoids)), 6)
+        for cluster in range(len(medoids)):
+            self.assertTrue(numpy.any(assignment == cluster))
+
+    def test_weighted_mean_similarity_is_kept(self):
+        import reference_compaction
+
+        random = numpy.random.default_rng(35)
+        centers = random.random((3, 64))
+        hist_list = [hist(center + 0.01 * random.random(64)) for center in centers for _ in range(4)]
+        query = random.random(64)
+        query = (query / query.sum()).astype(numpy.float32)
+        compacted = reference_compaction.compact_references(hist_list, 3)
+        exact = numpy.mean([h.intersection(query) for h in hist_list])
+        approximate = sum(h.reference_weight * h.intersection(query) for h in compacted) / sum(
+            h.reference_weight for h in compacted
+        )
+        self.assertAlmostEqual(approximate, exact, delta=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
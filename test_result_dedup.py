@@ -0,0 +1,95 @@
+import importlib.util
+import os
+import unittest
+
+DEPENDENCIES = ("cv2", "numpy", "requests")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def result(url, image_id, size="1000 B", width=640, height=480):
+    return {
+        "contentUrl": url,
+        "imageId": image_id,
+        "thumbnailUrl": None,
+        "encodingFormat": "jpeg",
+        "contentSize": size,
+        "width": width,
+        "height": height,
+    }
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class ResultDedupTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import cv2
+
+        cls.image = cv2.resize(cv2.imread(os.path.join(HERE, "image.png")), (320, 213))
+
+    def test_exact_duplicates_by_url_or_id(self):
+        import result_dedup
+
+        results = [
+            result("https://a.example/1.jpg", "A"),
+            result("http://A.example/1.jpg", "B"),  # same file over http
+            result("https://b.example/2.jpg", "A"),  # same bing image id
+            result("https://c.example/3.jpg", "C"),
+        ]
+        state = result_dedup.DedupState()
+        self.assertEqual(result_dedup.dedup_exact(results, state), [results[0], results[3]])
+        # later pages are deduplicated against the earlier ones
+        self.assertEqual(result_dedup.dedup_exact([result("https://c.example/3.jpg", "D")], state), [])
+        self.assertGreater(state.nbytes, 0)
+
+    def test_same_size_metadata_is_no_duplicate(self):
+        import result_dedup
+
+        results = [result("https://a.example/1.jpg", "A"), result("https://b.example/2.jpg", "B")]
+        self.assertEqual(result_dedup.dedup_exact(results, result_dedup.DedupState()), results)
+
+    def test_perceptual_hash(self):
+        import cv2
+
+        import result_dedup
+
+        value = result_dedup.perceptual_hash(self.image)
+        resized = cv2.resize(self.image, (160, 107), interpolation=cv2.INTER_AREA)
+        _, jpeg = cv2.imencode(".jpg", resized, [cv2.IMWRITE_JPEG_QUALITY, 60])
+        recompressed = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+        distance = result_dedup.hamming_distance(value, result_dedup.perceptual_hash(recompressed))
+        self.assertLessEqual(distance, 6)
+        flipped = cv2.flip(self.image, 0)
+        self.assertGreater(result_dedup.hamming_distance(value, result_dedup.perceptual_hash(flipped)), 6)
+
+    def test_near_duplicates(self):
+        import cv2
+
+        import result_dedup
+
+        results = [result(f"https://a.example/{i}.jpg", str(i)) for i in range(4)]
+        thumbnails = [self.image, cv2.resize(self.image, (200, 133)), None, cv2.flip(self.image, 0)]
+        state = result_dedup.DedupState()
+        unique = result_dedup.dedup_near(results, thumbnails, state, 6)
+        # the resized copy is dropped, a result without thumbnail is kept
+        self.assertEqual(unique, [results[0], results[2], results[3]])
+        self.assertEqual(len(state.hashes), 2)
+
+    def test_dedup_results_without_hashing(self):
+        import result_dedup
+
+        results = [result("https://a.example/1.jpg", "A"), result("https://a.example/1.jpg", "A")]
+        for max_distance in (None, -1):
+            unique, skipped, thumbnails = result_dedup.dedup_results(results, max_distance=max_distance)
+            self.assertEqual((unique, skipped, thumbnails), ([results[0]], 1, [None]))
+
+    def test_unreachable_thumbnail_keeps_result(self):
+        import result_dedup
+
+        results = [result("https://a.example/1.jpg", "A")]
+        results[0]["thumbnailUrl"] = "http://127.0.0.1:9/unreachable.jpg"
+        self.assertEqual(result_dedup.dedup_results(results), (results, 0, [None]))
+
+
+if __name__ == "__main__":
+    unittest.main()
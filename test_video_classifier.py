@@ -0,0 +1,68 @@
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+
+DEPENDENCIES = ("cv2", "numpy")
+MISSING = [name for name in DEPENDENCIES if importlib.util.find_spec(name) is None]
+
+# frames per shot and the color of each shot
+SHOTS = [(40, (0, 0, 200)), (40, (200, 0, 0)), (40, (0, 200, 0))]
+
+
+class ColorClassifier:
+    """
+    labels a frame by its dominant channel and counts the classified frames
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def classify(self, image):
+        self.calls += 1
+        return "bgr"[int(image.reshape(-1, 3).mean(axis=0).argmax())]
+
+
+@unittest.skipIf(MISSING, f"missing {', '.join(MISSING)}")
+class VideoSceneClassifierTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        import cv2
+        import numpy
+
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, "shots.avi")
+        writer = cv2.VideoWriter(cls.path, cv2.VideoWriter_fourcc(*"MJPG"), 20.0, (64, 48))
+        for count, color in SHOTS:
+            frame = numpy.zeros((48, 64, 3), numpy.uint8)
+            frame[:] = color
+            for _ in range(count):
+                writer.write(frame)
+        writer.release()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_one_classification_per_shot(self):
+        from video_classifier import VideoSceneClassifier
+
+        classifier = ColorClassifier()
+        scenes = VideoSceneClassifier(classifier, sample_step=5)
+        segments = scenes.classify(self.path)
+        self.assertEqual([label for _, _, label in segments], ["r", "b", "g"])
+        self.assertEqual(classifier.calls, 3)
+        self.assertEqual([round(start, 2) for start, _, _ in segments], [0.0, 2.0, 4.0])
+        self.assertEqual(scenes.stats["decoded_frames"], 24)
+
+    def test_rejects_sample_step_below_one(self):
+        from video_classifier import VideoSceneClassifier
+
+        for sample_step in (0, -1):
+            with self.assertRaises(ValueError):
+                VideoSceneClassifier(ColorClassifier(), sample_step=sample_step).classify(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
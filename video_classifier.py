@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+import argparse
+import json
+import sys
+import time
+
+import cv2
+
+from histogram_classifier import HistogramClassifier
+
+
+def coarse_hist(frame, bins=8, size=64):
+    """
+    cheap color histogram of a downscaled frame, used to detect shot changes
+    :return: L1 normalized float32 histogram
+    """
+    small = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+    hist = cv2.calcHist([small], [0, 1, 2], None, [bins] * 3, [0, 256] * 3)
+    cv2.normalize(hist, hist, 1.0, 0.0, cv2.NORM_L1)
+    return hist
+
+
+class VideoSceneClassifier:
+    """
+    Classifies a video shot by shot with HistogramClassifier.
+
+    Only every sample_step-th frame is decoded (the others are grabbed without decoding). A shot change is
+    detected when the coarse histograms of consecutive sampled frames intersect less than shot_threshold, and
+    only one representative frame per shot, settle_samples samples after its cut, is fully classified.
+    """
+
+    def __init__(self, classifier, sample_step=5, shot_threshold=0.6, settle_samples=2):
+        self._classifier = classifier
+        self.sample_step = sample_step
+        self.shot_threshold = shot_threshold
+        self.settle_samples = settle_samples
+        self.stats = {}
+
+    def classify(self, path):
+        """
+        :param path: video file
+        :return: list of (start seconds, end seconds, label), consecutive shots with the same label are merged
+        """
+        if self.sample_step < 1:
+            raise ValueError(f"sample_step must be at least 1, got {self.sample_step}")
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise IOError(f"could not open video {path}")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+
+        start = time.perf_counter()
+        shots = []  # (first frame, last frame, label)
+        shot_start = 0
+        shot_samples = 0
+        representative = None
+        prev_hist = None
+        frame_index = -1
+        decoded = 0
+        classified = 0
+
+        while True:
+            frame_index += 1
+            if frame_index % self.sample_step != 0:
+                if not capture.grab():
+                    break
+                continue
+            success, frame = capture.read()
+            if not success:
+                break
+            decoded += 1
+
+            hist = coarse_hist(frame)
+            if prev_hist is not None and (
+                cv2.compareHist(prev_hist, hist, cv2.HISTCMP_INTERSECT) < self.shot_threshold
+            ):
+                label = self._classifier.classify(representative)
+                shots.append((shot_start, frame_index - 1, label))
+                classified += 1
+                shot_start = frame_index
+                shot_samples = 0
+                representative = None
+            prev_hist = hist
+
+            # keep the first frame until a frame settled after the cut arrives
+            if representative is None or shot_samples == self.settle_samples:
+                representative = frame
+            shot_samples += 1
+
+        if representative is not None:
+            label = self._classifier.classify(representative)
+            shots.append((shot_start, max(shot_start, frame_index - 1), label))
+            classified += 1
+        capture.release()
+
+        elapsed = time.perf_counter() - start
+        duration = frame_index / fps
+        self.stats = {
+            "frames": frame_index,
+            "decoded_frames": decoded,
+            "classified_frames": classified,
+            "shots": len(shots),
+            "video_seconds": duration,
+            "processing_seconds": elapsed,
+            "realtime_factor": duration / elapsed if elapsed > 0 else 0.0,
+        }
+
+        segments = []
+        for first, last, label in shots:
+            if segments and segments[-1][2] == label:
+                segments[-1] = (segments[-1][0], (last + 1) / fps, label)
+            else:
+                segments.append((first / fps, (last + 1) / fps, label))
+        return segments
+
+
+def main():
+    parser = argparse.ArgumentParser(description="classify the scenes of a video file")
+    parser.add_argument("model", help="classifier .mat file")
+    parser.add_argument("video")
+    parser.add_argument("--sample-step", type=int, default=5, help="decode every n-th frame")
+    parser.add_argument("--shot-threshold", type=float, default=0.6)
+    parser.add_argument("--settle-samples", type=int, default=2)
+    parser.add_argument("--json", help="write the labelled time ranges to this json file")
+    args = parser.parse_args()
+    if args.sample_step < 1:
+        parser.error("--sample-step must be at least 1")
+
+    classifier = HistogramClassifier()
+    classifier.deserialize(args.model)
+    scenes = VideoSceneClassifier(
+        classifier, args.sample_step, args.shot_threshold, args.settle_samples
+    )
+    try:
+        segments = scenes.classify(args.video)
+    except IOError as e:
+        sys.stderr.write(f"{e}\n")
+        return 1
+
+    for start, end, label in segments:
+        print(f"{start:8.2f}s - {end:8.2f}s  {label}")
+    stats = scenes.stats
+    print(
+        f"{stats['frames']} frames, {stats['decoded_frames']} decoded, {stats['classified_frames']} classified "
+        f"in {stats['processing_seconds']:.1f} s ({stats['realtime_factor']:.1f}x real time)"
+    )
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(
+                {
+                    "segments": [
+                        {"start": start, "end": end, "label": label}
+                        for start, end, label in segments
+                    ],
+                    "stats": stats,
+                },
+                file,
+                indent=2,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,15 +4,14 @@ import wx
 
 wx_major_version = int(wx.__version__.split(".")[0])
 
-print(f"major_version: {wx_major_version}")
-
 # CV2 - sets the colors of the image in BGR
 # wxpython reads in RGB order
 # Convert the color from CV2 to wxpython
 
 
-def convert_color_fromcv2_towx(image):
-    image_colr = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+def convert_color_fromcv2_towx(image, in_place=False):
+    # in_place converts the image itself to RGB instead of allocating a converted copy
+    image_colr = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, image if in_place else None)
 
     h, w = image_colr.shape[:2]
 